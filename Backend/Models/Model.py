@@ -21,6 +21,10 @@ class UpsertResponse(BaseModel):
     dimension: int
     chunk_strategy: str
     analysis: str
+    tokens_embedded: int = 0  # Tokens sent to the embedding model (cache hits excluded)
+    chunks_embedded: int = 0  # New or changed chunks embedded and upserted
+    chunks_skipped: int = 0  # Chunks already indexed with the same content
+    vectors_deleted: int = 0  # Vectors of chunks no longer in the file
 
 class QueryRequest(BaseModel):
     namespace: str = "all"  # Can be "mongodb-files", "postgresql-data", or "all" to search both
@@ -30,8 +34,10 @@ class QueryRequest(BaseModel):
 
 class QueryMatch(BaseModel):
     id: str
-    score: float
+    score: Optional[float] = None  # Dense cosine similarity; None for lexical-only matches
     metadata: Dict[str, Any]
+    bm25: Optional[float] = None
+    fused_score: Optional[float] = None  # RRF of the dense and lexical ranks
 
 class QueryResponse(BaseModel):
     status: str
@@ -41,6 +47,25 @@ class QueryResponse(BaseModel):
     postgres_data: Optional[Dict[str, Any]] = None  # PostgreSQL context
     postgres_data: Optional[Dict[str, Any]] = None  # PostgreSQL context
 
+class QueryBatchRequest(BaseModel):
+    queries: List[str]  # Up to 64 query texts, searched with the same namespace, filter and top_k
+    namespace: str = "all"
+    top_k: int = 5
+    filter: Optional[Dict[str, Any]] = None
+    synthesize: bool = False  # One LLM answer over the merged context of all queries
+
+class QueryBatchResult(BaseModel):
+    text: str
+    matches: List[QueryMatch]
+    total_results: int
+    retrieval: str  # "dense", "lexical" (identifier fast path) or "cache"
+
+class QueryBatchResponse(BaseModel):
+    status: str
+    results: List[QueryBatchResult]  # One per query, in request order
+    answer: Optional[str] = None  # Only with synthesize=true
+    postgres_data: Optional[Dict[str, Any]] = None
+
 class JiraFetch(BaseModel): 
     Key: str = Field(..., example="AATA-12")
     Summary: str = Field(..., example="Flight booking should work")
@@ -105,8 +130,17 @@ class PostgresIndexResponse(BaseModel):
     total_chunks: int
     total_vectors: int
     namespace: str
+    total_tokens_embedded: int = 0
     table_results: Optional[List[Dict[str, Any]]] = None
 
+class MigrationRequest(BaseModel):
+    namespace: str  # Logical namespace to re-embed
+    model: str
+    dimension: int
+    target_index: Optional[str] = None  # Defaults to a "<index>-<dimension>" index when the dimension changes
+    max_vectors_per_sec: Optional[float] = None  # Defaults to MIGRATION_MAX_VECTORS_PER_SEC
+    auto_cutover: bool = True  # Switch the namespace over as soon as the backfill finishes
+
 class FetchJiraRequest(BaseModel):
     label: str
 
@@ -6,6 +6,7 @@ from langchain_openai import ChatOpenAI
 from pinecone import Pinecone
 import openai
 from langgraph.graph import StateGraph, END
+from utils.embedding_provider import get_provider
 
 
 load_dotenv()
@@ -19,7 +20,6 @@ client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # state.py
 
 
-
 def run_cmd(cmd, cwd=None):
     result = subprocess.run(
         cmd,
@@ -35,16 +35,12 @@ def embed_and_store_readme(
     metadata_line: str,
     index
 ):
-    embedding = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=content,
-        dimensions=1024
-    ).data[0].embedding
+    embedding = get_provider().embed([content], namespace="github-repos-test-1")[0]
 
     index.upsert(
         vectors=[{
             "id": metadata_line[:50],   # safe ID
-            "values": embedding,
+            "values": embedding.tolist(),
             "metadata": {
                 "source": "README.md",
                 "branch_context": metadata_line
@@ -117,17 +113,14 @@ def embed_and_upload(content: str, branch: str):
     chunks = chunk_text(content)
     vectors = []
 
-    for i, chunk in enumerate(chunks):
+    # One batched call for chunks not already in the embedding cache
+    embeddings = get_provider().embed(chunks, namespace="github-repos-test-2")
 
-        embedding = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=chunk,
-            dimensions=1024
-        ).data[0].embedding
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
 
         vectors.append({
             "id": f"{branch}-{i}",
-            "values": embedding,
+            "values": embedding.tolist(),
             "metadata": {
                 "branch": branch,
                 "source": "README.md",
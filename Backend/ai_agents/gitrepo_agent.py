@@ -7,6 +7,7 @@ import openai
 from langchain_openai import ChatOpenAI
 import pandas as pd
 import json
+from utils.embedding_provider import get_provider
 
  # Import the analysis graph builder from app.py
 load_dotenv()
@@ -54,15 +55,15 @@ def project_analysis_agent_node(state: RepoState) -> RepoState:
     llm = state["llm"]
     client = state["openai_client"]
 
-    embedding = client.embeddings.create(
-        model="text-embedding-3-large",
-        input="project architecture build dependencies",
-        dimensions=1024
-    ).data[0].embedding
+    embedding = get_provider().embed(
+        ["project architecture build dependencies"],
+        namespace="github-repos-test-2",
+        input_type="query",
+    )[0]
 
     results = index.query(
         namespace="github-repos-test-2",
-        vector=embedding,
+        vector=embedding.tolist(),
         top_k=5,
         include_metadata=True
     )
@@ -1,6 +1,8 @@
 
 # backend/main.py
 import os
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
@@ -34,9 +36,24 @@ def get_token(authorization: str = Header(None)):
 from utils.MangoDB import upload_file, list_files, download_file, delete_file
 from utils.parse_text import extract_text, ParseError
 from utils.embedding import embed_texts, get_model_info
-from utils.pinecone_store import ensure_index, upsert_chunks, query
+from utils.embedding_cache import cache_stats
+from utils.embedding_batcher import get_query_batcher
+from utils.embedding_provider import get_provider
+from utils.rate_limiter import call_with_retries, limiter_stats
+from utils.coarse_index import coarse_index_stats
+from utils.chunk_store import chunk_store_stats, hydrate
+from utils.context_expansion import expand_context
+from utils.lexical_index import get_lexical_index, lexical_index_stats, rrf_fuse
+from utils.namespace_stats import namespace_stats
+from utils.query_cache import get_query_cache, normalise_text, query_cache_stats
+from utils.embedding_migration import start_migration, get_migration, list_migrations
+from utils.namespace_aliases import aliases as namespace_aliases
+from utils.pinecone_store import (
+    ensure_index, upsert_chunks, delete_vectors, query, UpsertError, NamespaceQuery, aquery_namespaces
+)
+from utils.chunk_manifest import get_manifest
 from Models.Model import ListQuery, EmbedUpsertRequest, QueryRequest, UpsertResponse, QueryResponse, QueryMatch, JiraStory, JiraStoriesResponse, PostgresTableListResponse, PostgresQueryRequest, PostgresQueryResponse, PostgresIndexRequest, PostgresIndexResponse
-from Models.Model import FetchJiraRequest, FetchJiraResponse
+from Models.Model import FetchJiraRequest, FetchJiraResponse, MigrationRequest, QueryBatchRequest, QueryBatchResult, QueryBatchResponse
 from tools.jira_fetch_tool import filter_jira
 from tools.pinecone_tool import pinecone_retrieval_tool
 from states.base_state import GenerateTestCasesRequest
@@ -65,6 +82,89 @@ app.add_middleware(
 def health():
     return {"status": "ok"}
 
+# ---- Embedding cache savings ----
+@app.get("/embeddings/cache/stats")
+def embedding_cache_stats():
+    return cache_stats()
+
+@app.get("/embeddings/batcher/stats")
+def embedding_batcher_stats():
+    return get_query_batcher().stats()
+
+@app.get("/embeddings/provider/stats")
+def embedding_provider_stats():
+    return get_provider().stats()
+
+@app.get("/rate-limits/stats")
+def rate_limit_stats():
+    return limiter_stats()
+
+@app.get("/pinecone/coarse-index/stats")
+def pinecone_coarse_index_stats():
+    return coarse_index_stats()
+
+@app.get("/pinecone/chunk-store/stats")
+def pinecone_chunk_store_stats():
+    return chunk_store_stats()
+
+@app.get("/pinecone/lexical-index/stats")
+def pinecone_lexical_index_stats():
+    return lexical_index_stats()
+
+@app.get("/pinecone/namespace-stats")
+def pinecone_namespace_stats():
+    return namespace_stats()
+
+@app.get("/pinecone/query-cache/stats")
+def pinecone_query_cache_stats():
+    return query_cache_stats()
+
+# ---- Embedding model migrations (shadow namespace + cutover) ----
+@app.post("/pinecone/migrations")
+def start_embedding_migration(req: MigrationRequest, _auth: bool = Depends(get_token)):
+    try:
+        job = start_migration(
+            namespace=req.namespace,
+            model=req.model,
+            dimension=req.dimension,
+            target_index=req.target_index,
+            max_vectors_per_sec=req.max_vectors_per_sec,
+            auto_cutover=req.auto_cutover,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.progress()
+
+@app.get("/pinecone/migrations")
+def list_embedding_migrations(_auth: bool = Depends(get_token)):
+    return {"migrations": list_migrations(), "aliases": namespace_aliases()}
+
+@app.get("/pinecone/migrations/{job_id}")
+def get_embedding_migration(job_id: str, _auth: bool = Depends(get_token)):
+    job = get_migration(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    return job.progress()
+
+@app.post("/pinecone/migrations/{job_id}/cutover")
+def cutover_embedding_migration(job_id: str, _auth: bool = Depends(get_token)):
+    job = get_migration(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    try:
+        job.cutover()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.progress()
+
+@app.post("/pinecone/migrations/{job_id}/cancel")
+def cancel_embedding_migration(job_id: str, _auth: bool = Depends(get_token)):
+    job = get_migration(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    job.cancel()
+    return job.progress()
+
 # ---- Upload to MongoDB ----
 
 # backend/main.py
@@ -146,7 +246,8 @@ async def embed_upsert_endpoint(req:EmbedUpsertRequest, _auth: bool = Depends(ge
         document_text=text,
         filename=info["filename"],
         file_id=req.file_id,
-        metadata=req.metadata
+        metadata=req.metadata,
+        namespace=req.namespace
     )
     
     # Check for errors
@@ -154,37 +255,50 @@ async def embed_upsert_endpoint(req:EmbedUpsertRequest, _auth: bool = Depends(ge
         raise HTTPException(status_code=500, detail=agent_state["error"])
     
     chunks = agent_state["chunks"]
-    vectors = agent_state["embeddings"]
+    vectors = agent_state["embeddings"]  # Rows for the pending (new or changed) chunks only
+    vector_ids = agent_state["vector_ids"]
+    pending = agent_state["pending"]
     
-    if not chunks or not vectors:
+    if not chunks or vectors is None:
         raise HTTPException(status_code=400, detail="No chunks or embeddings produced.")
 
     # Get model info
-    model_name, dim = get_model_info()
+    model_name, dim = get_model_info(req.namespace)
     
-    # Ensure index (matching dimension)
-    ensure_index(dimension=len(vectors[0]))
+    # Ensure index (matching dimension); an unchanged re-upload has nothing to write
+    if pending:
+        ensure_index(dimension=vectors.shape[1], namespace=req.namespace)
 
     # Build payload
     ts = __import__("datetime").datetime.now(__import__("datetime").timezone.utc).isoformat()
     payload = []
-    for i, (chunk, vec) in enumerate(zip(chunks, vectors)):
+    for i, vec in zip(pending, vectors):
+        chunk = chunks[i]
         md = {
             "file_id": req.file_id,
             "filename": info["filename"],
             "chunk_id": i,
-            "text": chunk,  # Store full chunk text
+            "text": chunk,  # Full chunk text; kept in the chunk side store, not Pinecone
             "text_preview": chunk[:300],  # Keep preview for display
             "uploaded_at": ts,
             "source": "mongodb",
             "chunk_strategy": agent_state["chunk_strategy"],  # Agent's decision
         }
+        if agent_state.get("chunk_sections") and agent_state["chunk_sections"][i]:
+            md["section_path"] = agent_state["chunk_sections"][i]  # Heading trail, e.g. "Setup > Install"
         if req.metadata:
             md.update(req.metadata)
-        payload.append((f"{req.file_id}-{i}", vec, md))
+        payload.append((vector_ids[i][0], vec, md))  # vec is a row view, no copy
 
-    # Upsert
-    n = upsert_chunks(payload, namespace=req.namespace)
+    # Upsert new/changed chunks, then drop the ones no longer in the file;
+    # the manifest only moves forward once both have landed. Both skip empty
+    # input, so an unchanged file leaves the namespace's query cache alone
+    try:
+        n = upsert_chunks(payload, namespace=req.namespace) if payload else 0
+        deleted = delete_vectors(agent_state["vanished"], namespace=req.namespace)
+    except UpsertError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    get_manifest().replace(req.namespace, req.file_id, vector_ids)
     # Return count, model info, and agent analysis
     return UpsertResponse(
         status="success",
@@ -192,74 +306,74 @@ async def embed_upsert_endpoint(req:EmbedUpsertRequest, _auth: bool = Depends(ge
         model=model_name,
         dimension=dim,
         chunk_strategy=agent_state["chunk_strategy"],
-        analysis=agent_state["analysis"]
+        analysis=agent_state["analysis"],
+        tokens_embedded=agent_state.get("tokens_embedded", 0),
+        chunks_embedded=len(pending),
+        chunks_skipped=len(chunks) - len(pending),
+        vectors_deleted=deleted
     )
 
 
 
 
-@app.post("/pinecone/query", response_model=QueryResponse)
-async def query_endpoint(req: QueryRequest, _auth: bool = Depends(get_token)):
-    from Backend.utils.embedding import embed_texts
-    from Backend.utils.pinecone_store import query as pinecone_query
-    from openai import AzureOpenAI
-    
-    # Embed the query
-    qvec = embed_texts([req.text])[0]
-    
+# Matches passed to the LLM as context (and hydrated with their chunk text)
+ANSWER_CONTEXT_MATCHES = 10
+# Query texts accepted by one /pinecone/query-batch request
+QUERY_BATCH_MAX_QUERIES = 64
+
+
+def _query_targets(namespace: str, filter: Optional[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
     # Query Pinecone - this now includes BOTH documents and PostgreSQL data
     # Documents are in namespace "mongodb-files"
     # PostgreSQL data is in namespace "postgresql-data"
-    
-    all_matches = []
+    targets = []
     
     # Search in document namespace
-    if req.namespace == "mongodb-files" or req.namespace == "all":
-        doc_result = pinecone_query(
-            vector=qvec,
-            top_k=req.top_k,
-            namespace="mongodb-files",
-            filter=req.filter or {}
-        )
-        all_matches.extend(doc_result.get("matches", []))
+    if namespace == "mongodb-files" or namespace == "all":
+        targets.append(("mongodb-files", filter or {}))
     
     # Search in PostgreSQL namespace (RAG layer)
-    if req.namespace == "postgresql-data" or req.namespace == "all":
-        pg_result = pinecone_query(
-            vector=qvec,
-            top_k=req.top_k,
-            namespace="postgresql-data",
-            filter={"source": {"$eq": "postgresql"}}
-        )
-        all_matches.extend(pg_result.get("matches", []))
+    if namespace == "postgresql-data" or namespace == "all":
+        targets.append(("postgresql-data", {"source": {"$eq": "postgresql"}}))
     
     # If namespace is not specified as "all", use the provided namespace
-    if req.namespace not in ["mongodb-files", "postgresql-data", "all"]:
-        result = pinecone_query(
-            vector=qvec,
-            top_k=req.top_k,
-            namespace=req.namespace,
-            filter=req.filter or {}
-        )
-        all_matches = result.get("matches", [])
-    
-    # Sort by score and limit to top_k
-    all_matches.sort(key=lambda x: x.get("score", 0), reverse=True)
-    all_matches = all_matches[:req.top_k * 2]  # Get more for better context
-    
-    # Convert matches to QueryMatch models
-    matches = [
+    if namespace not in ["mongodb-files", "postgresql-data", "all"]:
+        targets.append((namespace, filter or {}))
+    return targets
+
+
+async def _dense_search(text: str, qvec, targets, top_k: int, limit: int) -> List[Dict[str, Any]]:
+    # All namespaces at once; merged by score into the top matches
+    result = await aquery_namespaces(
+        [NamespaceQuery(ns, qvec, f) for ns, f in targets], top_k=top_k, limit=limit
+    )
+    all_matches = result["matches"]
+    lexical = get_lexical_index()
+    if lexical is not None:
+        # Reciprocal rank fusion with the BM25 ranking
+        all_matches = lexical.fuse(all_matches, text, targets, limit)
+    return all_matches
+
+
+def _to_query_matches(all_matches: List[Dict[str, Any]]) -> List[QueryMatch]:
+    return [
         QueryMatch(
             id=match["id"],
-            score=match["score"],
-            metadata=match.get("metadata", {})
+            score=match.get("score"),
+            metadata=match.get("metadata", {}),
+            bm25=match.get("bm25"),
+            fused_score=match.get("fused_score")
         )
         for match in all_matches
     ]
-    
-    # Generate contextual answer using LLM with context from Pinecone (unified RAG)
-    answer = "No relevant information found."
-    
+
+
+def _build_context(all_matches: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    (LLM context from the matches, postgres_data summary); hydrated matches
+    expected. Blocking (neighbour lookups may fetch from Pinecone); async
+    endpoints call it via asyncio.to_thread.
+    """
     # Combine contexts from all sources retrieved from Pinecone
     all_contexts = []
     postgres_data = None
@@ -268,9 +382,10 @@ async def query_endpoint(req: QueryRequest, _auth: bool = Depends(get_token)):
     doc_contexts = []
     db_contexts = []
     
-    for i, match in enumerate(matches[:10], 1):
-        full_text = match.metadata.get("text", "") or match.metadata.get("text_preview", "")
-        source = match.metadata.get("source", "unknown")
+    # Top hits widened to their neighbouring chunks, overlapping spans merged, within the token budget
+    for context in expand_context(all_matches):
+        full_text = context.text
+        source = context.metadata.get("source", "unknown")
         
         if source == "postgresql":
             db_contexts.append(f"Database Record {len(db_contexts)+1}: {full_text}")
@@ -292,37 +407,161 @@ async def query_endpoint(req: QueryRequest, _auth: bool = Depends(get_token)):
             "message": "Retrieved from Pinecone vector database (PostgreSQL data indexed)"
         }
     
-    if all_contexts:
-        combined_context = "\n\n".join(all_contexts)
+    return ("\n\n".join(all_contexts) if all_contexts else None), postgres_data
+
+
+def _generate_answer(combined_context: Optional[str], question: str) -> Tuple[str, bool]:
+    """
+    (answer, failed) from Azure OpenAI over the retrieved context. Blocking
+    (rate-limit backoff sleeps); async endpoints call it via asyncio.to_thread.
+    """
+    from openai import AzureOpenAI
+    
+    if not combined_context:
+        return "No relevant information found.", False
+    
+    # Call Azure OpenAI to generate answer
+    try:
+        client = AzureOpenAI(
+            api_key=os.getenv("API_KEY"),
+            api_version=os.getenv("API_VERSION"),
+            azure_endpoint=os.getenv("API_BASE"),
+            max_retries=0
+        )
         
-        # Call Azure OpenAI to generate answer
-        try:
-            client = AzureOpenAI(
-                api_key=os.getenv("API_KEY"),
-                api_version=os.getenv("API_VERSION"),
-                azure_endpoint=os.getenv("API_BASE")
-            )
-            
-            response = client.chat.completions.create(
-                model=os.getenv("ENGINE", "gpt-4-32k"),
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context from multiple sources (documents and database). All data has been retrieved through semantic search. Synthesize information from all sources to provide a comprehensive answer."},
-                    {"role": "user", "content": f"Context from semantic search:\n{combined_context}\n\nQuestion: {req.text}\n\nProvide a clear, comprehensive answer based on the context above."}
-                ],
-                temperature=0.3,
-                max_tokens=800
-            )
-            answer = response.choices[0].message.content
-        except Exception as e:
-            answer = f"Error generating answer: {str(e)}"
+        response = call_with_retries(
+            "azure-openai-chat",
+            client.chat.completions.create,
+            model=os.getenv("ENGINE", "gpt-4-32k"),
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context from multiple sources (documents and database). All data has been retrieved through semantic search. Synthesize information from all sources to provide a comprehensive answer."},
+                {"role": "user", "content": f"Context from semantic search:\n{combined_context}\n\nQuestion: {question}\n\nProvide a clear, comprehensive answer based on the context above."}
+            ],
+            temperature=0.3,
+            max_tokens=800
+        )
+        return response.choices[0].message.content, False
+    except Exception as e:
+        return f"Error generating answer: {str(e)}", True
+
+
+@app.post("/pinecone/query", response_model=QueryResponse)
+async def query_endpoint(req: QueryRequest, _auth: bool = Depends(get_token)):
+    targets = _query_targets(req.namespace, req.filter)
     
-    return QueryResponse(
+    # Repeated queries are answered from the cache until one of their namespaces changes
+    cache = get_query_cache()
+    namespaces = [ns for ns, _ in targets]
+    if cache is not None:
+        cache_key = cache.key(req.text, targets, req.top_k)
+        cached = cache.get(cache_key, namespaces)
+        if cached is not None:
+            return QueryResponse(**cached)
+        # Taken before querying, so a write that lands meanwhile leaves the entry stale
+        generations = cache.generations(namespaces)
+    
+    limit = req.top_k  # Neighbouring chunks of the best hits are added to the context instead of over-fetching
+    lexical = get_lexical_index()
+    
+    # Identifier lookups ("AATA-9 health check", a table name) are answered lexically, no embedding call
+    all_matches = lexical.fast_path(req.text, targets, limit) if lexical is not None else None
+    
+    if all_matches is None:
+        # Embed the query, batched with concurrent requests
+        # ("all" spans the default-model namespaces)
+        qvec = await get_query_batcher().embed(req.text, namespace=None if req.namespace == "all" else req.namespace)
+        all_matches = await _dense_search(req.text, qvec, targets, req.top_k, limit)
+    
+    # Chunk bodies live in the side store; fetch them only for the matches the answer uses.
+    # SQLite reads, Pinecone fetches and the LLM call all block (retries sleep), so they run off the event loop
+    await asyncio.to_thread(hydrate, all_matches[:ANSWER_CONTEXT_MATCHES])
+    
+    # Generate contextual answer using LLM with context from Pinecone (unified RAG)
+    combined_context, postgres_data = await asyncio.to_thread(_build_context, all_matches[:ANSWER_CONTEXT_MATCHES])
+    answer, answer_failed = await asyncio.to_thread(_generate_answer, combined_context, req.text)
+    
+    matches = _to_query_matches(all_matches)
+    response = QueryResponse(
         status="success",
         matches=matches,
         total_results=len(matches),
         answer=answer,
         postgres_data=postgres_data
     )
+    if cache is not None and not answer_failed:
+        cache.put(cache_key, generations, response.model_dump())
+    return response
+
+
+@app.post("/pinecone/query-batch", response_model=QueryBatchResponse)
+async def query_batch_endpoint(req: QueryBatchRequest, _auth: bool = Depends(get_token)):
+    """
+    Many queries in one request: identifier lookups go to the lexical index,
+    the rest are embedded in one call and searched concurrently. With
+    synthesize=true one LLM answer covers all queries over their merged context.
+    """
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(req.queries) > QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX_QUERIES} queries per batch")
+    
+    targets = _query_targets(req.namespace, req.filter)
+    namespaces = [ns for ns, _ in targets]
+    limit = req.top_k
+    cache = get_query_cache()
+    lexical = get_lexical_index()
+    
+    # Repeated texts in the batch are searched once
+    texts = list(dict.fromkeys(normalise_text(t) for t in req.queries))
+    found: Dict[str, List[Dict[str, Any]]] = {}
+    retrieval: Dict[str, str] = {}
+    generations = cache.generations(namespaces) if cache is not None else None
+    for text in texts:
+        cached = cache.get(cache.key(text, targets, req.top_k, matches_only=True), namespaces) if cache is not None else None
+        if cached is not None:
+            found[text], retrieval[text] = cached, "cache"
+            continue
+        matches = lexical.fast_path(text, targets, limit) if lexical is not None else None
+        if matches is not None:
+            found[text], retrieval[text] = matches, "lexical"
+    
+    # One embedding call for every remaining text, then all searches at once
+    pending = [t for t in texts if t not in found]
+    if pending:
+        vectors = await get_provider().aembed(
+            pending,
+            namespace=None if req.namespace == "all" else req.namespace,
+            input_type=get_query_batcher().input_type,
+        )
+        searched = await asyncio.gather(*[
+            _dense_search(text, qvec, targets, req.top_k, limit) for text, qvec in zip(pending, vectors)
+        ])
+        for text, matches in zip(pending, searched):
+            found[text], retrieval[text] = matches, "dense"
+    
+    # One chunk-store lookup per namespace for the whole batch
+    await asyncio.to_thread(
+        hydrate, [m for text in texts if retrieval[text] != "cache" for m in found[text][:ANSWER_CONTEXT_MATCHES]]
+    )
+    if cache is not None:
+        for text in texts:
+            if retrieval[text] != "cache":
+                cache.put(cache.key(text, targets, req.top_k, matches_only=True), generations, found[text])
+    
+    answer, postgres_data = None, None
+    if req.synthesize:
+        # Each query's matches ranked on its own path (dense, lexical, fused), so merge by rank, not score
+        top = [found[text][:ANSWER_CONTEXT_MATCHES] for text in texts]
+        combined_context, postgres_data = await asyncio.to_thread(_build_context, rrf_fuse(top, sum(len(t) for t in top)))
+        questions = "\n".join(f"{i}. {t}" for i, t in enumerate(texts, 1))
+        answer, _ = await asyncio.to_thread(_generate_answer, combined_context, questions)
+    
+    results = []
+    for query in req.queries:
+        text = normalise_text(query)
+        matches = _to_query_matches(found[text])
+        results.append(QueryBatchResult(text=query, matches=matches, total_results=len(matches), retrieval=retrieval[text]))
+    return QueryBatchResponse(status="success", results=results, answer=answer, postgres_data=postgres_data)
 
 
 # ---- Jira Integration ----
@@ -446,6 +685,7 @@ async def index_postgres_to_pinecone(req: PostgresIndexRequest, _auth: bool = De
                     total_chunks=result['chunks_created'],
                     total_vectors=result['vectors_upserted'],
                     namespace=req.namespace,
+                    total_tokens_embedded=result.get('tokens_embedded', 0),
                     table_results=[result]
                 )
             else:
@@ -467,6 +707,7 @@ async def index_postgres_to_pinecone(req: PostgresIndexRequest, _auth: bool = De
                     total_chunks=result['total_chunks'],
                     total_vectors=result['total_vectors'],
                     namespace=result['namespace'],
+                    total_tokens_embedded=result.get('total_tokens_embedded', 0),
                     table_results=result.get('table_results')
                 )
             else:
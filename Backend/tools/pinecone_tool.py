@@ -1,19 +1,15 @@
 from typing import List, Dict, Any
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.tools import tool
-from pinecone import Pinecone
 from states.base_state import AgentState, RetrievedChunk
+from utils.chunk_store import hydrate
+from utils.embedding_provider import get_provider
+from utils.namespace_stats import get_namespace_stats
+from utils.pinecone_store import NamespaceQuery, get_index, query_namespaces
  
 from dotenv import load_dotenv
 import os 
 load_dotenv()
 
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-large",
-    dimensions=1024,
-    openai_api_key=os.environ["OPENAI_API_KEY"],
-)
-
 # -----------------------------
 # Pinecone Retrieval Tool
 # -----------------------------
@@ -86,36 +82,40 @@ def pinecone_retrieval_tool(
     # 1️⃣ Build query text
     query_text = " ".join(state.jira_story.labels) + " " + state.jira_story.description
 
-    # 2️⃣ Embed query
-    query_vector = embedding_model.embed_query(query_text)
-
-    pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
-    index = pc.Index(os.environ["PINECONE_INDEX_NAME"])
-    stats = index.describe_index_stats()
-    namespaces = stats.get("namespaces", {}).keys()
-    all_matches: List[Dict[str, Any]] = []
-
+    # 2️⃣ Non-empty namespaces from the background-refreshed stats cache
+    provider = get_provider()
+    ns_stats = get_namespace_stats()
+    if ns_stats is not None:
+        snapshot = ns_stats.snapshot()
+        namespaces = []
+        for ns in ns_stats.namespaces():
+            dimension = snapshot[ns].dimension
+            if dimension and dimension != provider.spec_for(ns).dimension:
+                # Indexed with another model's dimension; querying it would only fail
+                print(f"⚠️ Skipping namespace '{ns}': index dimension {dimension} != query model dimension")
+                continue
+            namespaces.append(ns)
+    else:
+        stats = get_index().describe_index_stats()
+        namespaces = list(stats.get("namespaces", {}).keys())
+
+    # 3️⃣ Embed query once per model, using the model each namespace was indexed with
+    query_vectors = {}
     for ns in namespaces:
-        try:
-            res = index.query(
-                vector=query_vector,
-                namespace=ns,
-                top_k=top_k, 
-                include_metadata=True,
-            )
-            print('res :', res)
-
-            for match in res.get("matches", []):
-                match["namespace"] = ns  # 🔥 keep provenance
-                all_matches.append(match)
-        except Exception as e:
-            print(f"⚠️ Namespace '{ns}' failed: {e}")
-
-    all_matches.sort(key=lambda x: x.get("score", 0), reverse=True)
+        spec = provider.spec_for(ns)
+        if spec not in query_vectors:
+            query_vectors[spec] = provider.embed([query_text], namespace=ns, input_type="query")[0]
+
+    # 4️⃣ Query every namespace at once and keep the global top_k
+    result = query_namespaces(
+        [NamespaceQuery(ns, query_vectors[provider.spec_for(ns)]) for ns in namespaces],
+        top_k=top_k,
+    )
+    all_matches: List[Dict[str, Any]] = hydrate(result["matches"])  # 🔥 each keeps its namespace
     
     retrieved_chunks: List[RetrievedChunk] = []
 
-    # 4️⃣ Normalize results
+    # 5️⃣ Normalize results
     retrieved_chunks:List[Dict[str, Any]] = []
     for match in all_matches:
         metadata = match.get("metadata", {})
@@ -136,7 +136,7 @@ def pinecone_retrieval_tool(
             }
         )
 
-    # 5️⃣ Update state (important)
+    # 6️⃣ Update state (important)
     # state.retrieved_chunks = retrieved_chunks
 
     return {
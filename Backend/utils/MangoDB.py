@@ -72,6 +72,11 @@ def list_files(
         })
     return out
 
+def list_file_ids() -> List[str]:
+    """Ids of every stored file (no limit), e.g. to find vectors of deleted files."""
+    db = get_client()[MONGODB_DB]
+    return [str(f["_id"]) for f in db["fs.files"].find({}, {"_id": 1})]
+
 def download_file(file_id: str) -> Tuple[bytes, Dict[str, Any]]:
 
     fs = get_fs()
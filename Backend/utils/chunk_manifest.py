@@ -0,0 +1,141 @@
+# utils/chunk_manifest.py
+"""
+Per-file manifest of indexed chunks, for incremental re-indexing.
+
+Chunk vector ids are derived from content: f"{file_id}-{sha256(text + salt)[:16]}",
+with a "-2", "-3", ... suffix for repeated chunks. The salt covers whatever else
+goes into a vector's metadata (filename, request metadata), so an id names one
+exact payload. The manifest records, per (namespace, file_id), each current
+vector id with its chunk hash and position in the document. Re-indexing a file
+then embeds only ids that are not in the manifest, deletes ids that vanished,
+and leaves the rest untouched. Positions are rewritten on every re-index, so the
+manifest (not the "chunk_id" metadata of older vectors) has the current order.
+"""
+import os
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from utils.settings import connect_sqlite
+
+
+CHUNK_MANIFEST_PATH = os.getenv("CHUNK_MANIFEST_PATH", os.path.join(".cache", "manifests.sqlite3"))
+
+# Hex digits of the content hash kept in vector ids
+_ID_HASH_CHARS = 16
+
+
+def chunk_hash(text: str, salt: str = "") -> str:
+    return hashlib.sha256(f"{salt}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def chunk_ids(file_id: str, chunks: Sequence[str], salt: str = "") -> List[Tuple[str, str]]:
+    """(vector id, chunk hash) per chunk, in order; repeats of a chunk get -2, -3, ..."""
+    seen: Dict[str, int] = {}
+    out = []
+    for text in chunks:
+        h = chunk_hash(text, salt)
+        seen[h] = seen.get(h, 0) + 1
+        vid = f"{file_id}-{h[:_ID_HASH_CHARS]}"
+        if seen[h] > 1:
+            vid += f"-{seen[h]}"
+        out.append((vid, h))
+    return out
+
+
+class ReindexPlan(NamedTuple):
+    ids: List[Tuple[str, str]]  # (vector id, chunk hash) per chunk, in document order
+    pending: List[int]  # positions of chunks to embed and upsert
+    unchanged: List[int]  # positions already indexed
+    vanished: List[str]  # vector ids to delete
+
+
+class ChunkManifest:
+    """SQLite table of (namespace, file_id) -> vector ids, hashes and positions."""
+
+    def __init__(self, path: str = CHUNK_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                namespace TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                vector_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (namespace, file_id, vector_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_vector ON manifest(namespace, vector_id)")
+        self._conn.commit()
+
+    def entries(self, namespace: str, file_id: str) -> Dict[str, int]:
+        """vector id -> position for the file's current chunks."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_id, position FROM manifest WHERE namespace = ? AND file_id = ?", (namespace, file_id)
+            ).fetchall()
+        return dict(rows)
+
+    def has_file(self, namespace: str, file_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM manifest WHERE namespace = ? AND file_id = ? LIMIT 1", (namespace, file_id)
+            ).fetchone() is not None
+
+    def files(self, namespace: str) -> List[str]:
+        """file_ids with a manifest in `namespace`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT file_id FROM manifest WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def plan(self, namespace: str, file_id: str, ids: List[Tuple[str, str]], indexed: Sequence[str]) -> ReindexPlan:
+        """
+        Compare a file's new (vector id, hash) list with the ids `indexed` now
+        (the manifest entries, or for files indexed before manifests, the ids
+        listed from the vector store by prefix).
+        """
+        indexed = set(indexed)
+        current = {vid for vid, _ in ids}
+        pending = [i for i, (vid, _) in enumerate(ids) if vid not in indexed]
+        unchanged = [i for i, (vid, _) in enumerate(ids) if vid in indexed]
+        return ReindexPlan(ids, pending, unchanged, sorted(indexed - current))
+
+    def replace(self, namespace: str, file_id: str, ids: List[Tuple[str, str]]) -> None:
+        """Record `ids` (in document order) as the file's current chunks."""
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest WHERE namespace = ? AND file_id = ?", (namespace, file_id))
+            self._conn.executemany(
+                "INSERT INTO manifest (namespace, file_id, vector_id, chunk_hash, position) VALUES (?, ?, ?, ?, ?)",
+                [(namespace, file_id, vid, h, pos) for pos, (vid, h) in enumerate(ids)],
+            )
+            self._conn.commit()
+
+    def delete(self, namespace: str, file_id: str | None = None) -> None:
+        """Forget one file, or the whole namespace when file_id is None."""
+        with self._lock:
+            if file_id is None:
+                self._conn.execute("DELETE FROM manifest WHERE namespace = ?", (namespace,))
+            else:
+                self._conn.execute("DELETE FROM manifest WHERE namespace = ? AND file_id = ?", (namespace, file_id))
+            self._conn.commit()
+
+
+_manifest: ChunkManifest | None = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> ChunkManifest:
+    """Process-wide manifest instance."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = ChunkManifest()
+    return _manifest
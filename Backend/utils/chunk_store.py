@@ -0,0 +1,180 @@
+# utils/chunk_store.py
+"""
+Local side store for chunk bodies.
+
+Pinecone metadata only keeps compact fields (ids, source, filename, a short
+preview); the full chunk text lives in SQLite keyed by (namespace, vector id).
+upsert_chunks moves each vector's "text" metadata here before sending, and
+readers hydrate just the matches they use with one bulk lookup per namespace.
+Namespaces are logical names, so bodies survive an embedding migration.
+
+Set CHUNK_STORE_ENABLED=false to keep text in Pinecone metadata (e.g. when
+several API replicas do not share a disk).
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from utils.settings import env_flag, SQLITE_MAX_PARAMS, connect_sqlite
+
+
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(".cache", "chunks.sqlite3"))
+CHUNK_STORE_ENABLED = env_flag("CHUNK_STORE_ENABLED")
+
+
+class ChunkStore:
+    """SQLite table of chunk text keyed by (namespace, vector id)."""
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        self.lookups = 0
+        self.hydrated = 0
+        self.missing = 0
+        self._lock = threading.Lock()
+
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (namespace, id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def put(self, namespace: str, rows: Iterable[Tuple[str, str]]) -> None:
+        """Insert or replace (id, text) rows."""
+        rows = [(namespace, vid, text) for vid, text in rows]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (namespace, id, text) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def get_many(self, namespace: str, ids: Sequence[str]) -> Dict[str, str]:
+        """Bodies for whichever of `ids` are stored."""
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(unique), SQLITE_MAX_PARAMS):
+                part = unique[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT id, text FROM chunks WHERE namespace = ? AND id IN ({placeholders})",
+                    (namespace, *part),
+                ).fetchall()
+                found.update(rows)
+        self.lookups += 1
+        return found
+
+    def delete(self, namespace: str, ids: Sequence[str] | None = None) -> None:
+        """Drop the given ids, or the whole namespace when ids is None."""
+        with self._lock:
+            if ids is None:
+                self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+            else:
+                self._conn.executemany(
+                    "DELETE FROM chunks WHERE namespace = ? AND id = ?", [(namespace, vid) for vid in ids]
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM chunks").fetchone()
+        return {
+            "enabled": True,
+            "path": self.path,
+            "chunks": rows,
+            "text_mb": round(size / 1e6, 2),
+            "lookups": self.lookups,
+            "hydrated": self.hydrated,
+            "missing": self.missing,
+        }
+
+
+_store: ChunkStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_store() -> ChunkStore | None:
+    """Process-wide store, or None when CHUNK_STORE_ENABLED is off."""
+    global _store
+    if not CHUNK_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChunkStore()
+    return _store
+
+
+def split_bodies(vectors: List[tuple]) -> Tuple[List[tuple], List[Tuple[str, str]]]:
+    """
+    (payload, bodies): the (id, values, metadata) rows with "text" removed from
+    their metadata, and the (id, text) pairs removed. Unchanged when disabled.
+    """
+    if get_chunk_store() is None:
+        return vectors, []
+    payload, bodies = [], []
+    for vid, values, md in vectors:
+        if md and "text" in md:
+            bodies.append((vid, md["text"]))
+            md = {k: v for k, v in md.items() if k != "text"}
+        payload.append((vid, values, md))
+    return payload, bodies
+
+
+def texts_for(namespace: str, ids: Sequence[str]) -> Dict[str, str]:
+    store = get_chunk_store()
+    return store.get_many(namespace, ids) if store is not None else {}
+
+
+def _metadata_of(match) -> Dict[str, Any]:
+    if isinstance(match, dict):
+        return match.get("metadata") or {}
+    return getattr(match, "metadata", None) or {}
+
+
+def hydrate(matches: List[Any], namespace: str | None = None) -> List[Any]:
+    """
+    Put the stored body into metadata["text"] of each match that lacks one, with
+    one lookup per namespace (a match's own "namespace" key wins over `namespace`).
+    Accepts SDK ScoredVectors and plain dicts; metadata is copied, not mutated,
+    since coarse-index matches share their metadata dicts.
+    """
+    store = get_chunk_store()
+    if store is None or not matches:
+        return matches
+
+    wanted: Dict[str, List[Any]] = {}
+    for m in matches:
+        if _metadata_of(m).get("text"):
+            continue
+        ns = (m.get("namespace") if isinstance(m, dict) else None) or namespace
+        if ns is not None:
+            wanted.setdefault(ns, []).append(m)
+
+    for ns, group in wanted.items():
+        bodies = store.get_many(ns, [m["id"] if isinstance(m, dict) else m.id for m in group])
+        for m in group:
+            body = bodies.get(m["id"] if isinstance(m, dict) else m.id)
+            if body is None:
+                store.missing += 1
+                continue
+            md = {**_metadata_of(m), "text": body}
+            if isinstance(m, dict):
+                m["metadata"] = md
+            else:
+                m.metadata = md
+            store.hydrated += 1
+    return matches
+
+
+def chunk_store_stats() -> Dict[str, Any]:
+    store = get_chunk_store()
+    if store is None:
+        return {"enabled": False}
+    return store.stats()
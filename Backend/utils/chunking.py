@@ -1,59 +1,227 @@
-
-from typing import List
+from typing import Iterator, List, NamedTuple, Optional, Tuple
 import textwrap
 import re
 
-def naive_chunks(text: str, chunk_chars: int = 1200, overlap: int = 150) -> List[str]:
+# Word boundaries a chunk may end after, and the whitespace a chunk may start after
+_BOUNDARY = r'[\s\n.!?,;:)\]}\-]'
+# Greedy prefix: match(text, pos, endpos).end() is just past the last boundary in [pos, endpos)
+_UP_TO_LAST_BOUNDARY = re.compile(r'.*' + _BOUNDARY, re.S)
+_WHITESPACE = re.compile(r'[\s\n]+')
+_FIRST_TEXT = re.compile(r'\S')
+_UP_TO_LAST_TEXT = re.compile(r'.*\S', re.S)
+
+
+def chunk_spans(text: str, chunk_chars: int = 1200, overlap: int = 150) -> Iterator[Tuple[int, int]]:
     """
-    Split text into chunks at word boundaries to avoid breaking words.
+    (start, end) offsets of the chunks of `text`, such that text[start:end] is
+    exactly what naive_chunks returns. Boundaries are found with anchored
+    searches inside the text (pos/endpos), so nothing is sliced or copied until
+    a caller asks for a chunk's text.
     """
-    if not text:
-        return []
-    
-    chunks = []
-    start = 0
     n = len(text)
-    
+    start = 0
     while start < n:
         # Calculate the initial end position
         end = min(start + chunk_chars, n)
         
-        # If we're not at the end of the text, find the last word boundary
+        # If we're not at the end of the text, back off to just after the last
+        # word boundary (space, newline, punctuation) in the last 100 chars
         if end < n:
-            # Look backwards from 'end' to find a word boundary (space, newline, punctuation)
-            # Search within a reasonable range (up to 100 chars back)
-            search_start = max(start, end - 100)
-            chunk_text = text[search_start:end]
-            
-            # Find the last word boundary (space, newline, or punctuation followed by space)
-            matches = list(re.finditer(r'[\s\n.!?,;:)\]}\-]+', chunk_text))
-            
-            if matches:
-                # Get the last match position
-                last_boundary = matches[-1].end()
-                # Adjust end to the word boundary
-                end = search_start + last_boundary
+            match = _UP_TO_LAST_BOUNDARY.match(text, max(start, end - 100), end)
+            if match:
+                end = match.end()
             # If no boundary found, keep original end (rare case)
         
-        # Extract chunk
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
+        # The chunk is text[start:end] without surrounding whitespace
+        first = _FIRST_TEXT.search(text, start, end)
+        if first:
+            yield first.start(), _UP_TO_LAST_TEXT.match(text, first.start(), end).end()
         
         # Move start position with overlap, but ensure we don't break words
         if end < n:
-            # Calculate overlap start
+            # Calculate overlap start, then skip past the next whitespace run (within 100 chars)
             overlap_start = max(end - overlap, start + 1)
-            
-            # Find the next word boundary after overlap_start
-            remaining_text = text[overlap_start:min(overlap_start + 100, n)]
-            match = re.search(r'[\s\n]+', remaining_text)
-            
-            if match:
-                start = overlap_start + match.end()
-            else:
-                start = end
+            match = _WHITESPACE.search(text, overlap_start, min(overlap_start + 100, n))
+            start = match.end() if match else end
         else:
             start = end
-    
+
+
+def iter_chunks(text: str, chunk_chars: int = 1200, overlap: int = 150) -> Iterator[str]:
+    """naive_chunks as a generator: each chunk's text is sliced only when it is reached."""
+    for start, end in chunk_spans(text, chunk_chars, overlap):
+        yield text[start:end]
+
+
+def naive_chunks(text: str, chunk_chars: int = 1200, overlap: int = 150) -> List[str]:
+    """
+    Split text into chunks at word boundaries to avoid breaking words.
+    """
+    if not text:
+        return []
+    return list(iter_chunks(text, chunk_chars, overlap))
+
+
+# Structure of plain or markdown text, line by line
+_LINE = re.compile(r'[^\n]*\n?')
+_ATX_HEADING = re.compile(r'\s{0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+_SETEXT_UNDERLINE = re.compile(r'\s{0,3}(=+|-+)\s*$')
+_LIST_ITEM = re.compile(r'\s*(?:[-*+•]|\d{1,3}[.)])\s+\S')
+_FENCE = re.compile(r'\s{0,3}(`{3,}|~{3,})')
+
+
+class _Block(NamedTuple):
+    start: int
+    end: int
+    kind: str  # "heading", "list", "code" or "paragraph"
+    level: int  # heading level, 0 otherwise
+    title: str
+
+
+def _blocks(text: str) -> Iterator[_Block]:
+    """
+    Headings, paragraphs (runs of non-blank lines), lists (consecutive list
+    paragraphs) and fenced code of `text`, as offsets into it.
+    """
+    lines: List[Tuple[int, int]] = []  # (start, end) of the current run of non-blank lines
+    pending_list: Optional[_Block] = None
+    fence: Optional[Tuple[str, int]] = None  # (marker, start) of the open code fence
+
+    def paragraph() -> Iterator[_Block]:
+        nonlocal pending_list
+        if not lines:
+            return
+        start, end = lines[0][0], lines[-1][1]
+        first = text[lines[0][0]:lines[0][1]]
+        if len(lines) == 2 and _SETEXT_UNDERLINE.match(text, lines[1][0], lines[1][1]) and first.strip():
+            block = _Block(start, end, "heading", 1 if "=" in text[lines[1][0]:lines[1][1]] else 2, first.strip())
+        elif _LIST_ITEM.match(first):
+            if pending_list is not None:
+                pending_list = pending_list._replace(end=end)
+            else:
+                pending_list = _Block(start, end, "list", 0, "")
+            lines.clear()
+            return
+        else:
+            block = _Block(start, end, "paragraph", 0, "")
+        lines.clear()
+        if pending_list is not None:
+            yield pending_list
+            pending_list = None
+        yield block
+
+    for m in _LINE.finditer(text):
+        start, end = m.start(), m.end()
+        if start == end:
+            break
+        line_end = end - 1 if text[end - 1] == "\n" else end
+        marker = _FENCE.match(text, start, line_end)
+        if fence is not None:
+            # Inside fenced code nothing is a heading or a paragraph break
+            if marker and marker.group(1).startswith(fence[0]):
+                yield _Block(fence[1], line_end, "code", 0, "")
+                fence = None
+            continue
+        if marker:
+            yield from paragraph()
+            if pending_list is not None:
+                yield pending_list
+                pending_list = None
+            fence = (marker.group(1), start)
+            continue
+        heading = _ATX_HEADING.fullmatch(text, start, line_end)
+        if heading:
+            yield from paragraph()
+            if pending_list is not None:
+                yield pending_list
+                pending_list = None
+            yield _Block(start, line_end, "heading", len(heading.group(1)), heading.group(2))
+        elif text[start:line_end].strip():
+            lines.append((start, line_end))
+        else:
+            yield from paragraph()
+    yield from paragraph()
+    if pending_list is not None:
+        yield pending_list
+    if fence is not None:
+        yield _Block(fence[1], len(text), "code", 0, "")
+
+
+def _common_path(paths: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+    common = paths[0]
+    for path in paths[1:]:
+        n = 0
+        while n < min(len(common), len(path)) and common[n] == path[n]:
+            n += 1
+        common = common[:n]
+    return common
+
+
+def section_chunks(
+    text: str, chunk_chars: int = 1500, overlap: int = 200, separator: str = " > "
+) -> List[Tuple[str, str]]:
+    """
+    Split text along its structure: (chunk text, section path) per chunk.
+
+    Headings (markdown "#" or setext underlines), paragraphs, list blocks and
+    fenced code are never cut while they fit; adjacent blocks, including small
+    sections, are packed into one chunk up to chunk_chars. A heading always
+    lands in the same chunk as its first block, so it is never left dangling
+    at the end of a chunk without its content. A block longer than chunk_chars
+    is split like naive_chunks (with overlap), its first piece topping up the
+    chunk before it and its last one packed with what follows.
+
+    The section path is the heading trail, e.g. "Setup > Install". A chunk
+    that packs several sections gets the path they have in common, e.g.
+    "Setup" for the tail of "Setup > Install" followed by "Setup > Usage",
+    and "" when they share no heading.
+    """
+    if not text:
+        return []
+
+    chunks: List[Tuple[str, str]] = []
+    stack: List[Tuple[int, str]] = []  # (level, title) of the enclosing headings
+    current: List[Tuple[int, int, Tuple[str, ...]]] = []  # packed units: (start, end, path)
+    unit_start: Optional[int] = None  # start of headings waiting for their first block
+
+    def flush():
+        if current:
+            body = text[current[0][0]:current[-1][1]].strip()
+            if body:
+                chunks.append((body, separator.join(_common_path([path for _, _, path in current]))))
+            current.clear()
+
+    def add(start: int, end: int):
+        path = tuple(title for _, title in stack)
+        if current and end - current[0][0] <= chunk_chars:
+            current.append((start, end, path))
+            return
+        if end - start <= chunk_chars:
+            flush()
+            current.append((start, end, path))
+            return
+        # A block over budget on its own is cut anyway: cut it so its head fills
+        # the chunk being packed, and leave its tail open for the next blocks
+        first_path = _common_path([p for _, _, p in current] + [path])
+        base = current[0][0] if current else start
+        current.clear()
+        spans = list(chunk_spans(text[base:end], chunk_chars, overlap))
+        for n, (s, e) in enumerate(spans[:-1]):
+            chunks.append((text[base + s:base + e], separator.join(first_path if n == 0 else path)))
+        s, e = spans[-1]
+        current.append((base + s, base + e, first_path if len(spans) == 1 else path))
+
+    for block in _blocks(text):
+        if block.kind == "heading":
+            while stack and stack[-1][0] >= block.level:
+                stack.pop()
+            stack.append((block.level, block.title))
+            if unit_start is None:
+                unit_start = block.start
+            continue
+        add(block.start if unit_start is None else unit_start, block.end)
+        unit_start = None
+    if unit_start is not None:
+        add(unit_start, len(text))
+    flush()
     return chunks
@@ -0,0 +1,309 @@
+# utils/coarse_index.py
+"""
+In-process coarse index for hot namespaces (two-stage Matryoshka retrieval).
+
+Embeddings are truncated to their first COARSE_INDEX_DIM dimensions and
+renormalised; for Matryoshka-trained models the prefix keeps most of the
+ranking quality at a fraction of the size. A namespace listed in
+COARSE_INDEX_NAMESPACES is loaded from Pinecone once (list + fetch), kept in
+sync by upsert_chunks/delete_namespace, and searched as one NumPy matrix.
+
+Queries are answered in up to three steps:
+  1. the coarse ranking is decisive (the k-th score beats the (k+1)-th by at
+     least COARSE_INDEX_MARGIN): the top k are chosen locally and only their
+     full-dimension vectors are fetched, to score them exactly;
+  2. the k-th score beats everything past the top COARSE_INDEX_SHORTLIST
+     by the margin: fetch that shortlist at full dimension and rerank it;
+  3. otherwise (or while the namespace is still loading): a normal
+     full-dimension Pinecone query.
+
+Returned scores are always full-dimension cosines, never the truncated ones,
+so coarse matches merge with plain Pinecone matches from other namespaces.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.filter import metadata_matches
+from utils.rate_limiter import call_with_retries
+from utils.settings import env_int, env_float, FETCH_BATCH_SIZE
+
+
+COARSE_INDEX_NAMESPACES = {
+    ns.strip() for ns in os.getenv("COARSE_INDEX_NAMESPACES", "").split(",") if ns.strip()
+}
+COARSE_INDEX_DIM = env_int("COARSE_INDEX_DIM", 256)
+COARSE_INDEX_MARGIN = env_float("COARSE_INDEX_MARGIN", 0.02)
+# Shortlist size as a multiple of top_k
+COARSE_INDEX_SHORTLIST = env_int("COARSE_INDEX_SHORTLIST", 4, minimum=1)
+
+
+def truncate_normalize(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """First `dim` components of each row, L2-normalised, as float32."""
+    block = np.array(np.atleast_2d(vectors)[:, :dim], dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    block /= norms
+    return block
+
+
+class CoarseIndex:
+    """Truncated, renormalised vectors and metadata for one namespace."""
+
+    def __init__(
+        self,
+        namespace: str,
+        dim: int = COARSE_INDEX_DIM,
+        margin: float = COARSE_INDEX_MARGIN,
+        shortlist: int = COARSE_INDEX_SHORTLIST,
+    ):
+        self.namespace = namespace
+        self.dim = dim
+        self.margin = margin
+        self.shortlist = shortlist
+
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+        self.ready = False
+        self._loading = False
+        # Bumped by reset() so a load already in flight drops its stale pages
+        self._generation = 0
+        self.load_error: Optional[str] = None
+
+        self.local_hits = 0
+        self.reranked = 0
+        self.ambiguous = 0
+        self.not_ready = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ---- Maintenance ----
+
+    def add(self, ids: Sequence[str], vectors, metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Insert or replace rows; vectors may be full-dimension arrays or lists."""
+        if not ids:
+            return
+        block = truncate_normalize(np.asarray(vectors, dtype=np.float32), self.dim)
+        with self._lock:
+            for vid, row, md in zip(ids, block, metadatas):
+                pos = self._positions.get(vid)
+                if pos is None:
+                    pos = self._size
+                    self._grow(pos + 1)
+                    self._ids.append(vid)
+                    self._metadata.append(md or {})
+                    self._positions[vid] = pos
+                    self._size += 1
+                else:
+                    self._metadata[pos] = md or {}
+                self._matrix[pos] = row
+
+    def _grow(self, needed: int) -> None:
+        if needed <= len(self._matrix):
+            return
+        capacity = max(needed, 2 * len(self._matrix), 1024)
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def remove(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            for vid in ids:
+                pos = self._positions.pop(vid, None)
+                if pos is None:
+                    continue
+                # Move the last row into the hole
+                last = self._size - 1
+                if pos != last:
+                    self._matrix[pos] = self._matrix[last]
+                    self._ids[pos] = self._ids[last]
+                    self._metadata[pos] = self._metadata[last]
+                    self._positions[self._ids[pos]] = pos
+                self._ids.pop()
+                self._metadata.pop()
+                self._size -= 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = np.empty((0, self.dim), dtype=np.float32)
+            self._size = 0
+            self._ids, self._metadata, self._positions = [], [], {}
+
+    def reset(self) -> None:
+        """Drop everything and reload on next use (e.g. after the namespace is re-embedded)."""
+        with self._lock:
+            self.clear()
+            self.ready = False
+            self._generation += 1
+
+    def load(self, index, physical_namespace: str | None = None) -> None:
+        """
+        Page through every id in the namespace and fetch vectors + metadata.
+        Stops without marking the index ready if reset() is called meanwhile;
+        the next query starts a fresh load.
+        """
+        namespace = physical_namespace or self.namespace
+        generation = self._generation
+        for id_page in index.list(namespace=namespace):
+            ids = list(id_page)
+            for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                res = call_with_retries(
+                    "pinecone-fetch", index.fetch, ids=ids[start:start + FETCH_BATCH_SIZE], namespace=namespace
+                )
+                records = list(res.vectors.values())
+                with self._lock:
+                    if self._generation != generation:
+                        return
+                    self.add(
+                        [r.id for r in records],
+                        [r.values for r in records],
+                        [dict(r.metadata or {}) for r in records],
+                    )
+        with self._lock:
+            if self._generation == generation:
+                self.ready = True
+
+    def start_loading(self, get_index: Callable[[], Any], physical_namespace: str | None = None) -> None:
+        """Load in a background thread; queries go to Pinecone until it finishes."""
+        with self._lock:
+            if self.ready or self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load(get_index(), physical_namespace)
+                self.load_error = None
+                if self.ready:
+                    print(f"✅ Coarse index for '{self.namespace}' loaded: {len(self)} vectors x {self.dim} dims")
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"⚠️ Coarse index load for '{self.namespace}' failed: {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name=f"coarse-{self.namespace}", daemon=True).start()
+
+    # ---- Search ----
+
+    def search(
+        self,
+        vector,
+        top_k: int,
+        filter: Dict[str, Any] | None = None,
+        fetch_full: Callable[[List[str]], Dict[str, Sequence[float]]] | None = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Pinecone-shaped {"matches": [...], "namespace": ...} with exact scores,
+        or None when the caller should run a full Pinecone query.
+        fetch_full(ids) -> {id: values} supplies the full-dimension vectors;
+        without it every query goes to Pinecone.
+        """
+        if not self.ready:
+            self.not_ready += 1
+            return None
+
+        full_q = np.asarray(vector, dtype=np.float32).ravel()
+        q = truncate_normalize(full_q, self.dim)[0]
+        with self._lock:
+            scores = self._matrix[:self._size] @ q
+            if filter:
+                keep = np.fromiter(
+                    (metadata_matches(md, filter) for md in self._metadata), dtype=bool, count=self._size
+                )
+                scores[~keep] = -np.inf
+                candidates = int(keep.sum())
+            else:
+                candidates = self._size
+
+            k = min(top_k, candidates)
+            if k == 0:
+                self.local_hits += 1
+                return {"matches": [], "namespace": self.namespace}
+
+            # Best rows up to one past the shortlist, sorted, to check the gaps
+            n = min(max(k, self.shortlist * k) + 1, candidates)
+            top = np.argpartition(-scores, n - 1)[:n]
+            top = top[np.argsort(-scores[top])]
+            kth = scores[top[k - 1]]
+
+            if n == k or kth - scores[top[k]] >= self.margin:
+                # The top k are settled; only their exact scores are missing
+                shortlist, decisive, local = top[:k], True, True
+            else:
+                shortlist = top if n == candidates else top[:-1]
+                decisive, local = n == candidates or kth - scores[top[-1]] >= self.margin, False
+            ids = [self._ids[i] for i in shortlist]
+            metadata = {self._ids[i]: self._metadata[i] for i in shortlist}
+
+        if not decisive or fetch_full is None:
+            self.ambiguous += 1
+            return None
+
+        # Score the candidates with full-dimension vectors (cosine, as the index metric)
+        full = fetch_full(ids)
+        if len(full) < len(ids):
+            self.ambiguous += 1
+            return None
+        block = np.asarray([full[vid] for vid in ids], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1) * (np.linalg.norm(full_q) or 1.0)
+        norms[norms == 0] = 1.0
+        exact = (block @ full_q) / norms
+        order = np.argsort(-exact)[:k]
+        if local:
+            self.local_hits += 1
+        else:
+            self.reranked += 1
+        return {
+            "matches": [
+                {"id": ids[i], "score": float(exact[i]), "metadata": metadata[ids[i]]} for i in order
+            ],
+            "namespace": self.namespace,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        answered = self.local_hits + self.reranked + self.ambiguous + self.not_ready
+        return {
+            "ready": self.ready,
+            "loading": self._loading,
+            "load_error": self.load_error,
+            "vectors": self._size,
+            "dimension": self.dim,
+            "memory_mb": round(self._matrix.nbytes / 1e6, 2),
+            "local_hits": self.local_hits,
+            "reranked": self.reranked,
+            "ambiguous": self.ambiguous,
+            "not_ready": self.not_ready,
+            "local_rate": round(self.local_hits / answered, 4) if answered else 0.0,
+            "remote_query_rate": round((self.ambiguous + self.not_ready) / answered, 4) if answered else 0.0,
+        }
+
+
+_indexes: Dict[str, CoarseIndex] = {}
+_lock = threading.Lock()
+
+
+def get_coarse_index(namespace: str) -> Optional[CoarseIndex]:
+    """Coarse index for `namespace`, or None if it is not listed in COARSE_INDEX_NAMESPACES."""
+    if namespace not in COARSE_INDEX_NAMESPACES:
+        return None
+    index = _indexes.get(namespace)
+    if index is None:
+        with _lock:
+            index = _indexes.get(namespace)
+            if index is None:
+                index = CoarseIndex(namespace)
+                _indexes[namespace] = index
+    return index
+
+
+def coarse_index_stats() -> Dict[str, Dict[str, Any]]:
+    return {ns: index.stats() for ns, index in list(_indexes.items())}
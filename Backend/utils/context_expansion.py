@@ -0,0 +1,159 @@
+# utils/context_expansion.py
+"""
+Answer context built from the top hits plus their neighbouring chunks.
+
+Instead of over-fetching matches, /pinecone/query takes top_k and widens the
+strongest CONTEXT_EXPAND_HITS document hits to CONTEXT_NEIGHBOURS chunks on
+either side. A chunk's position comes from the file's chunk manifest
+(content-hash ids) or from the id itself for positional "{file_id}-{i}" ids.
+Windows of hits in the same file that touch are merged into one span, the
+texts of all neighbours are read in one lookup per namespace (chunk side
+store, or one batched fetch when it is off), and the overlap that the chunker
+repeats between consecutive chunks is dropped when stitching a span. Contexts
+are kept in the order of their best hit until CONTEXT_MAX_TOKENS is reached;
+matches are ranked by position, since a hybrid search ranks by fused rank and
+lexical-only hits have no dense score.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils import pinecone_store
+from utils.chunk_manifest import get_manifest
+from utils.chunk_store import texts_for
+from utils.token_budget import count_tokens
+from utils.settings import env_int
+
+
+CONTEXT_NEIGHBOURS = env_int("CONTEXT_NEIGHBOURS", 1, minimum=0)
+CONTEXT_EXPAND_HITS = env_int("CONTEXT_EXPAND_HITS", 3, minimum=0)
+CONTEXT_MAX_TOKENS = env_int("CONTEXT_MAX_TOKENS", 6000)
+
+_POSITIONAL_ID = re.compile(r"^(?P<file_id>.+)-(?P<position>\d+)$")
+# Shorter common runs between chunks are coincidence, not chunker overlap
+_MIN_OVERLAP = 20
+_MAX_OVERLAP = 600
+
+
+class Context(NamedTuple):
+    text: str
+    rank: int  # position of the best hit in the matches
+    metadata: Dict[str, Any]  # of the best hit in the span
+    ids: List[str]  # chunks in the span, in document order
+
+
+def _stitch(a: str, b: str) -> str:
+    """Join consecutive chunks, dropping the text the chunker repeated at the start of `b`."""
+    for k in range(min(len(a), len(b), _MAX_OVERLAP), _MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return a + b[k:]
+    return a + "\n" + b
+
+
+def _locate(
+    match: Dict[str, Any], neighbours: int, manifests: Dict[Tuple[str, str], Dict[str, int]]
+) -> Optional[Tuple[int, Dict[int, str]]]:
+    """(position, position -> vector id) for a document hit, or None if it has no known neighbours."""
+    namespace, file_id = match.get("namespace"), (match.get("metadata") or {}).get("file_id")
+    if not namespace or not file_id:
+        return None
+    key = (namespace, file_id)
+    if key not in manifests:
+        manifests[key] = get_manifest().entries(namespace, file_id)
+    entries = manifests[key]
+    if match["id"] in entries:
+        return entries[match["id"]], {pos: vid for vid, pos in entries.items()}
+    m = _POSITIONAL_ID.match(match["id"])
+    if m and m.group("file_id") == file_id:
+        pos = int(m.group("position"))
+        window = range(max(0, pos - neighbours), pos + neighbours + 1)
+        return pos, {p: f"{file_id}-{p}" for p in window}
+    return None
+
+
+def _texts(namespace: str, ids: Sequence[str]) -> Dict[str, str]:
+    texts = texts_for(namespace, ids)
+    missing = [vid for vid in ids if vid not in texts]
+    if missing:
+        # Chunk store off (or vectors written before it): one batched fetch for the rest
+        for vid, md in pinecone_store.fetch_metadata(missing, namespace).items():
+            if md.get("text"):
+                texts[vid] = md["text"]
+    return texts
+
+
+def expand_context(
+    matches: List[Dict[str, Any]],
+    neighbours: int = CONTEXT_NEIGHBOURS,
+    expand_hits: int = CONTEXT_EXPAND_HITS,
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+) -> List[Context]:
+    """
+    Contexts for hydrated, ranked matches: merged neighbour spans for the top
+    document hits, the match's own text for everything else.
+    """
+    rank = {id(m): i for i, m in enumerate(matches)}
+    manifests: Dict[Tuple[str, str], Dict[str, int]] = {}
+    windows: Dict[Tuple[str, str], List[Tuple[int, int, Dict[str, Any]]]] = {}
+    positions: Dict[Tuple[str, str], Dict[int, str]] = {}
+    expanded: Dict[str, Tuple[str, str]] = {}  # hit id -> file it was expanded in
+
+    if neighbours > 0:
+        for match in matches[:expand_hits]:
+            located = _locate(match, neighbours, manifests)
+            if located is None:
+                continue
+            pos, by_position = located
+            key = (match["namespace"], match["metadata"]["file_id"])
+            positions.setdefault(key, {}).update(by_position)
+            windows.setdefault(key, []).append((pos - neighbours, pos + neighbours, match))
+            expanded[match["id"]] = key
+
+    # Merge touching windows per file, then read every chunk they cover at once per namespace
+    spans: List[Tuple[Tuple[str, str], List[int], List[Dict[str, Any]]]] = []
+    for key, file_windows in windows.items():
+        file_windows.sort(key=lambda w: w[0])
+        merged: List[List[Any]] = []
+        for start, end, match in file_windows:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+                merged[-1][2].append(match)
+            else:
+                merged.append([start, end, [match]])
+        for start, end, hits in merged:
+            spans.append((key, [p for p in range(start, end + 1) if p in positions[key]], hits))
+
+    wanted: Dict[str, set] = {}
+    for key, span_positions, _ in spans:
+        wanted.setdefault(key[0], set()).update(positions[key][p] for p in span_positions)
+    texts = {ns: _texts(ns, sorted(ids)) for ns, ids in wanted.items()}
+
+    contexts: List[Context] = []
+    for key, span_positions, hits in spans:
+        namespace = key[0]
+        ids, text = [], ""
+        for p in span_positions:
+            vid = positions[key][p]
+            body = texts[namespace].get(vid)
+            if body is None:
+                continue
+            ids.append(vid)
+            text = _stitch(text, body) if text else body
+        best = min(hits, key=lambda m: rank[id(m)])
+        contexts.append(Context(text or best["metadata"].get("text", ""), rank[id(best)], best["metadata"], ids))
+
+    covered = {vid for c in contexts for vid in c.ids}
+    for match in matches:
+        if match["id"] in expanded or match["id"] in covered:
+            continue
+        md = match.get("metadata") or {}
+        contexts.append(Context(md.get("text", "") or md.get("text_preview", ""), rank[id(match)], md, [match["id"]]))
+
+    contexts.sort(key=lambda c: c.rank)
+    kept, used = [], 0
+    for context in contexts:
+        tokens = count_tokens(context.text)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(context)
+        used += tokens
+    return kept
@@ -1,63 +1,41 @@
 
 # utils/embedding.py
-import os
-import requests
-from typing import List, Tuple
+"""
+Function-style facade over utils.embedding_provider for the default model
+(PINECONE_EMBED_MODEL / PINECONE_EMBED_DIM) or a namespace's registered model.
+"""
+from typing import List, Optional, Tuple
 
+import numpy as np
 
+from utils.embedding_provider import get_provider, default_spec
 
-def get_model_info() -> Tuple[str, int]:
 
-    model = os.getenv("PINECONE_EMBED_MODEL", "llama-text-embed-v2")
-    try:
-        dim = int(os.getenv("PINECONE_EMBED_DIM", "1024"))
-    except ValueError:
-        dim = 1024
-    return model, dim
+def get_model_info(namespace: Optional[str] = None) -> Tuple[str, int]:
 
+    spec = get_provider().spec_for(namespace) if namespace is not None else default_spec()
+    return spec.model, spec.dimension
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
 
-    if not texts:
-        return []
+def embed_texts_with_usage(
+    texts: List[str], input_type: str = "passage", namespace: Optional[str] = None
+) -> Tuple[np.ndarray, int]:
+    """
+    Embed texts and report usage. Returns (vectors, tokens): a contiguous
+    (len(texts), dimension) float32 array in input order, and the number of
+    tokens sent to the model (cache hits are free).
+    """
+    return get_provider().embed_with_usage(texts, namespace, input_type)
 
-    api_key = os.getenv("PINECONE_API_KEY")
-    if not api_key:
-        raise RuntimeError("PINECONE_API_KEY not set")
 
-    model, dim = get_model_info()
-    api_ver = os.getenv("PINECONE_API_VERSION", "2025-10")  # recent version supporting inference
+def embed_texts(texts: List[str], input_type: str = "passage", namespace: Optional[str] = None) -> np.ndarray:
+    """
+    Embed texts as a (len(texts), dimension) float32 array; convert to lists
+    only at the wire boundary.
+    """
+    return get_provider().embed(texts, namespace, input_type)
 
-    headers = {
-        "Api-Key": api_key,
-        "Content-Type": "application/json",
-        "X-Pinecone-API-Version": api_ver,
-    }
 
-
-    payload = {
-        "model": model,
-        "parameters": {
-            "input_type": "passage",
-            "truncate": "END",
-
-            "dimension": dim
-        },
-        "inputs": [{"text": t} for t in texts],
-    }
-
-    r = requests.post("https://api.pinecone.io/embed", headers=headers, json=payload, timeout=60)
-    r.raise_for_status()
-    data = r.json().get("data", [])
-    vectors = [row["values"] for row in data]
-
-    # Sanity check
-    if not vectors:
-        raise RuntimeError("No embeddings returned from Pinecone Inference")
-    actual_dim = len(vectors[0])
-    if actual_dim != dim:
-        raise RuntimeError(
-            f"Embedding dimension mismatch: requested {dim}, got {actual_dim}. "
-            f"Ensure X-Pinecone-API-Version is >= 2025-04 for custom dimensions."
-        )
-    return vectors
+async def aembed_texts(texts: List[str], input_type: str = "passage", namespace: Optional[str] = None) -> np.ndarray:
+    """Async counterpart of embed_texts; returns the same result without blocking the event loop."""
+    return await get_provider().aembed(texts, namespace, input_type)
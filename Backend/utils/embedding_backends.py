@@ -0,0 +1,207 @@
+# utils/embedding_backends.py
+"""
+Embedding backends behind utils.embedding.
+
+The backend is chosen from the model name: "local-hash" selects the offline
+feature-hashing embedder, OpenAI "text-embedding-3-*" models go to the OpenAI
+embeddings API, and every other value is treated as a Pinecone Inference model.
+"""
+import os
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.rate_limiter import RATE_LIMIT_MAX_CONCURRENCY, call_with_retries, get_limiter
+from utils.settings import env_int
+
+
+PINECONE_EMBED_URL = "https://api.pinecone.io/embed"
+
+
+# Starting concurrency per upstream; the adaptive limiter grows it up to RATE_LIMIT_MAX_CONCURRENCY
+EMBED_MAX_CONCURRENCY = env_int("EMBED_MAX_CONCURRENCY", 4, minimum=1)
+EMBED_POOL_SIZE = max(EMBED_MAX_CONCURRENCY, RATE_LIMIT_MAX_CONCURRENCY)
+EMBED_TIMEOUT = env_int("EMBED_TIMEOUT", 60)
+
+
+class EmbeddingBackend(ABC):
+    """
+    One embedding provider. embed_batch is called with at most max_batch_size
+    texts and returns a (len(texts), dimension) float32 array.
+    """
+
+    name: str = ""
+    # Remote backends go through the embedding cache and the batch thread pool
+    remote: bool = True
+    max_batch_size: int = 96
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str], model: str, dimension: int, input_type: str) -> np.ndarray:
+        ...
+
+
+class PineconeInferenceBackend(EmbeddingBackend):
+    """Pinecone Inference /embed over a shared keep-alive session."""
+
+    name = "pinecone"
+    # Pinecone Inference rejects /embed requests with more than 96 inputs
+    max_batch_size = 96
+
+    def __init__(self, pool_size: int = EMBED_POOL_SIZE, timeout: int = EMBED_TIMEOUT):
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        get_limiter("pinecone-inference", initial=EMBED_MAX_CONCURRENCY)
+
+    @staticmethod
+    def _headers() -> dict:
+        api_key = os.getenv("PINECONE_API_KEY")
+        if not api_key:
+            raise RuntimeError("PINECONE_API_KEY not set")
+
+        api_ver = os.getenv("PINECONE_API_VERSION", "2025-10")  # recent version supporting inference
+        return {
+            "Api-Key": api_key,
+            "Content-Type": "application/json",
+            "X-Pinecone-API-Version": api_ver,
+        }
+
+    def _post(self, payload: dict) -> requests.Response:
+        r = self._session.post(PINECONE_EMBED_URL, headers=self._headers(), json=payload, timeout=self.timeout)
+        r.raise_for_status()
+        return r
+
+    def embed_batch(self, texts: List[str], model: str, dimension: int, input_type: str) -> np.ndarray:
+        payload = {
+            "model": model,
+            "parameters": {
+                "input_type": input_type,
+                "truncate": "END",
+
+                "dimension": dimension
+            },
+            "inputs": [{"text": t} for t in texts],
+        }
+
+        r = call_with_retries("pinecone-inference", self._post, payload)
+        data = r.json().get("data", [])
+
+        # Sanity check
+        if not data:
+            raise RuntimeError("No embeddings returned from Pinecone Inference")
+        if len(data) != len(texts):
+            raise RuntimeError(
+                f"Pinecone Inference returned {len(data)} embeddings for {len(texts)} inputs"
+            )
+        actual_dim = len(data[0]["values"])
+        if actual_dim != dimension:
+            raise RuntimeError(
+                f"Embedding dimension mismatch: requested {dimension}, got {actual_dim}. "
+                f"Ensure X-Pinecone-API-Version is >= 2025-04 for custom dimensions."
+            )
+
+        vectors = np.empty((len(data), dimension), dtype=np.float32)
+        for i, row in enumerate(data):
+            vectors[i] = row["values"]
+        return vectors
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API through one shared (connection-pooled) client."""
+
+    name = "openai"
+    max_batch_size = 2048
+
+    def __init__(self, timeout: int = EMBED_TIMEOUT):
+        import openai
+
+        # Retries are handled by the shared limiter so throttling adjusts concurrency
+        self._client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout, max_retries=0)
+        get_limiter("openai-embeddings", initial=EMBED_MAX_CONCURRENCY)
+
+    def embed_batch(self, texts: List[str], model: str, dimension: int, input_type: str) -> np.ndarray:
+        response = call_with_retries(
+            "openai-embeddings", self._client.embeddings.create, model=model, input=texts, dimensions=dimension
+        )
+        data = sorted(response.data, key=lambda row: row.index)
+        if len(data) != len(texts):
+            raise RuntimeError(f"OpenAI returned {len(data)} embeddings for {len(texts)} inputs")
+
+        vectors = np.empty((len(data), dimension), dtype=np.float32)
+        for i, row in enumerate(data):
+            vectors[i] = row.embedding
+        return vectors
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic, CPU-only feature-hashing embedder.
+
+    Lower-cased word unigrams and bigrams are hashed (CRC32) into `dimension`
+    signed buckets and the result is L2-normalised, so texts sharing vocabulary
+    get a high cosine similarity. Quality is far below a trained model; it exists
+    to benchmark and load-test the pipeline without network access.
+    """
+
+    name = "local-hash"
+    remote = False
+    max_batch_size = 1024
+
+    def embed_batch(self, texts: List[str], model: str, dimension: int, input_type: str) -> np.ndarray:
+        out = np.zeros((len(texts), dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint64, count=len(features)
+            )
+            buckets = (hashes % dimension).astype(np.intp)
+            signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], buckets, signs)
+
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        out /= norms
+        return out
+
+
+_factories: Dict[str, Callable[[], EmbeddingBackend]] = {
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend,
+    "text-embedding-3-large": OpenAIEmbeddingBackend,
+    "text-embedding-3-small": OpenAIEmbeddingBackend,
+}
+_instances: Dict[Callable[[], EmbeddingBackend], EmbeddingBackend] = {}
+_lock = threading.Lock()
+
+
+def register_backend(model: str, factory: Callable[[], EmbeddingBackend]) -> None:
+    """Route PINECONE_EMBED_MODEL=<model> to a custom backend."""
+    with _lock:
+        _factories[model] = factory
+
+
+def get_backend(model: str) -> EmbeddingBackend:
+    """
+    Backend serving `model`; unregistered model names go to Pinecone Inference.
+    Models sharing a backend class share one instance, and with it one client pool.
+    """
+    factory = _factories.get(model, PineconeInferenceBackend)
+    backend = _instances.get(factory)
+    if backend is None:
+        with _lock:
+            backend = _instances.get(factory)
+            if backend is None:
+                backend = factory()
+                _instances[factory] = backend
+    return backend
@@ -0,0 +1,117 @@
+# utils/embedding_batcher.py
+"""
+Cross-request micro-batching for query embeddings.
+
+Concurrent /pinecone/query calls each need one vector. Instead of one embed
+round trip per request, texts arriving within QUERY_EMBED_WINDOW_MS (or until
+QUERY_EMBED_MAX_BATCH texts are waiting) are sent as a single batched request
+and every caller gets its own row back.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.embedding_provider import ModelSpec, get_provider
+from utils.settings import env_int, env_float
+
+
+QUERY_EMBED_WINDOW_MS = env_float("QUERY_EMBED_WINDOW_MS", 8.0)
+QUERY_EMBED_MAX_BATCH = env_int("QUERY_EMBED_MAX_BATCH", 32, minimum=1)
+
+
+class QueryEmbeddingBatcher:
+    """Collects embed requests on the running event loop and flushes them in batches."""
+
+    def __init__(
+        self,
+        window_ms: float = QUERY_EMBED_WINDOW_MS,
+        max_batch: int = QUERY_EMBED_MAX_BATCH,
+        input_type: str = "query",
+    ):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.input_type = input_type
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Texts are grouped by the model their namespace is registered with
+        self._pending: Dict[ModelSpec, List[Tuple[str, asyncio.Future]]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set = set()
+
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.errors = 0
+
+    async def embed(self, text: str, namespace: Optional[str] = None) -> np.ndarray:
+        """Return the embedding of `text` for `namespace`'s model, sharing a request with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures and timers are bound to one loop
+            self._loop = loop
+            self._pending = {}
+            self._timer = None
+
+        spec = get_provider().spec_for(namespace)
+        future = loop.create_future()
+        group = self._pending.setdefault(spec, [])
+        group.append((text, future))
+        if len(group) >= self.max_batch:
+            self._start(spec, self._pending.pop(spec))
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        self._timer = None
+        pending, self._pending = self._pending, {}
+        for spec, batch in pending.items():
+            self._start(spec, batch)
+
+    def _start(self, spec: ModelSpec, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        task = self._loop.create_task(self._run(spec, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, spec: ModelSpec, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        if len(batch) >= self.max_batch:
+            self.full_batches += 1
+
+        try:
+            vectors = await get_provider().aembed_spec([text for text, _ in batch], spec, self.input_type)
+        except Exception as e:
+            self.errors += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for row, (_, future) in zip(vectors, batch):
+            if not future.done():
+                future.set_result(row)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "errors": self.errors,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fill_ratio": round(self.items / (self.batches * self.max_batch), 4) if self.batches else 0.0,
+        }
+
+
+_batcher: QueryEmbeddingBatcher | None = None
+
+
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    """Process-wide batcher used by the query endpoints."""
+    global _batcher
+    if _batcher is None:
+        _batcher = QueryEmbeddingBatcher()
+    return _batcher
@@ -0,0 +1,228 @@
+# utils/embedding_cache.py
+"""
+Persistent, content-addressed embedding cache.
+
+Vectors are stored in SQLite keyed by (model, dimension, input_type, sha256(text)),
+so identical text is only ever embedded once per model configuration. The cache
+is bounded by EMBED_CACHE_MAX_ENTRIES and evicts least-recently-used entries.
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from utils.settings import env_int, env_flag, SQLITE_MAX_PARAMS, connect_sqlite
+
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+EMBED_CACHE_ENABLED = env_flag("EMBED_CACHE_ENABLED")
+EMBED_CACHE_MAX_ENTRIES = env_int("EMBED_CACHE_MAX_ENTRIES", 200000)
+
+# Embedding functions may return an ndarray or nested lists; both are coerced to float32
+EmbedFn = Callable[[List[str]], np.ndarray | Sequence[Sequence[float]]]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors."""
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                input_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, dimension, input_type, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def lookup(
+        self, texts: List[str], model: str, dimension: int, input_type: str
+    ) -> Tuple[np.ndarray, List[int]]:
+        """
+        Return (vectors, missing) where vectors is a (len(texts), dimension) float32
+        array holding the cached rows, and missing lists the indices (rows left
+        zeroed) that still need embedding.
+        """
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, bytes] = {}
+        now = time.time()
+
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), SQLITE_MAX_PARAMS):
+                part = unique[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dimension = ? AND input_type = ? AND text_hash IN ({placeholders})",
+                    (model, dimension, input_type, *part),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = blob
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE model = ? AND dimension = ? AND input_type = ? AND text_hash = ?",
+                    [(now, model, dimension, input_type, h) for h in found],
+                )
+                self._conn.commit()
+
+        vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+        missing: List[int] = []
+        for i, h in enumerate(hashes):
+            blob = found.get(h)
+            if blob is None:
+                missing.append(i)
+            else:
+                vectors[i] = np.frombuffer(blob, dtype=np.float32)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return vectors, missing
+
+    def store(
+        self, texts: List[str], vectors: np.ndarray, model: str, dimension: int, input_type: str
+    ) -> None:
+        now = time.time()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [
+            (model, dimension, input_type, text_hash(t), v.tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, dimension, input_type, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._size += self._conn.total_changes - before
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        before = self._conn.total_changes
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, dimension, input_type, text_hash) IN ("
+            "SELECT model, dimension, input_type, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        removed = self._conn.total_changes - before
+        self._size -= removed
+        self.evictions += removed
+
+    def get_or_embed(
+        self, texts: List[str], model: str, dimension: int, input_type: str, embed_fn: EmbedFn
+    ) -> np.ndarray:
+        """Serve texts from the cache and call embed_fn only for the misses."""
+        vectors, missing = self.lookup(texts, model, dimension, input_type)
+        if missing:
+            self.fill_missing(texts, vectors, missing, embed_fn(self.pending(texts, missing)),
+                              model, dimension, input_type)
+        return vectors
+
+    @staticmethod
+    def pending(texts: List[str], missing: List[int]) -> List[str]:
+        """Distinct texts behind the missing indices; duplicates are embedded once."""
+        return list(dict.fromkeys(texts[i] for i in missing))
+
+    def fill_missing(
+        self,
+        texts: List[str],
+        vectors: np.ndarray,
+        missing: List[int],
+        fresh: np.ndarray,
+        model: str,
+        dimension: int,
+        input_type: str,
+    ) -> None:
+        """Store freshly embedded pending texts and copy them into the lookup result."""
+        pending = self.pending(texts, missing)
+        fresh = np.asarray(fresh, dtype=np.float32)
+        self.store(pending, fresh, model, dimension, input_type)
+        row_of = {t: i for i, t in enumerate(pending)}
+        for i in missing:
+            vectors[i] = fresh[row_of[texts[i]]]
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "enabled": True,
+            "path": self.path,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._size = 0
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide cache instance, or None when EMBED_CACHE_ENABLED is off."""
+    global _cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def cached_embed(
+    texts: List[str], model: str, dimension: int, input_type: str, embed_fn: EmbedFn
+) -> np.ndarray:
+    """
+    Embed texts through the shared cache, returning a (len(texts), dimension)
+    float32 array. Falls through to embed_fn when the cache is disabled.
+    """
+    if not texts:
+        return np.empty((0, dimension), dtype=np.float32)
+    cache = get_embedding_cache()
+    if cache is None:
+        return np.asarray(embed_fn(texts), dtype=np.float32)
+    return cache.get_or_embed(texts, model, dimension, input_type, embed_fn)
+
+
+def cache_stats() -> Dict[str, float]:
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
@@ -0,0 +1,331 @@
+# utils/embedding_migration.py
+"""
+Zero-downtime migration of a namespace to a new embedding model or dimension.
+
+A migration re-embeds every vector of a logical namespace into a shadow
+namespace (in a separate index when the dimension changes) in a background
+thread, throttled to MIGRATION_MAX_VECTORS_PER_SEC. While it runs, upserts
+and deletes of the namespace are mirrored to the shadow (upserts re-embedded
+with the new model). Mirrored writes are queued and applied in order by the
+migration thread between backfill batches, so the request that made them does
+not wait for re-embedding, and a vector deleted mid-migration cannot be copied
+back afterwards. When the backfill completes the logical namespace is cut over
+atomically through the alias registry (utils.namespace_aliases): queries and
+upserts go to the shadow, and query embeddings switch to the new model at the
+same moment.
+
+Texts are re-read from the chunk side store (or a legacy "text" metadata
+field). Vectors without one cannot be re-embedded: they are reported as
+not_migrated (with a sample of ids). Those, and mirrored writes that failed
+(dual_write_failed_ids), would be missing from the shadow, so a migration that
+has any does not cut over automatically.
+"""
+import re
+import time
+import uuid
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.embedding_provider import ModelSpec, get_provider
+from utils.namespace_aliases import Target, resolve as resolve_namespace, set_alias
+from utils.rate_limiter import call_with_retries
+from utils import pinecone_store
+from utils.coarse_index import get_coarse_index
+from utils.chunk_store import split_bodies, texts_for
+from utils.settings import env_float, FETCH_BATCH_SIZE
+
+
+MIGRATION_MAX_VECTORS_PER_SEC = env_float("MIGRATION_MAX_VECTORS_PER_SEC", 200.0)
+
+# Ids of vectors that could not be migrated, kept for the progress report
+NOT_MIGRATED_SAMPLE = 20
+# How long a backfilled migration waits for mirrored writes before checking for cutover/cancel
+MIRROR_POLL_SECONDS = 0.5
+# Shadow namespaces are named f"{namespace}{SHADOW_SEPARATOR}{model}-{dimension}"
+SHADOW_SEPARATOR = "__"
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+
+class MigrationJob:
+    """Background backfill of one namespace into its shadow, then cutover."""
+
+    def __init__(
+        self,
+        namespace: str,
+        spec: ModelSpec,
+        target_index: Optional[str] = None,
+        max_vectors_per_sec: float = MIGRATION_MAX_VECTORS_PER_SEC,
+        auto_cutover: bool = True,
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.namespace = namespace
+        self.spec = spec
+        self.source = resolve_namespace(namespace)
+        source_dim = get_provider().spec_for(namespace).dimension
+        if target_index is None and spec.dimension != source_dim:
+            # An index has a single dimension, so a dimension change needs its own index
+            target_index = f"{pinecone_store.INDEX_NAME}-{spec.dimension}"[:45]
+        self.target = Target(
+            target_index or self.source.index,
+            f"{namespace}{SHADOW_SEPARATOR}{_slug(spec.model)}-{spec.dimension}",
+            spec.model,
+            spec.dimension,
+        )
+        self.max_vectors_per_sec = max_vectors_per_sec
+        self.auto_cutover = auto_cutover
+
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.total = 0
+        self.migrated = 0
+        self.not_migrated = 0
+        self.not_migrated_ids: List[str] = []
+        self.dual_written = 0
+        self.dual_deleted = 0
+        self.dual_write_errors = 0
+        self.dual_write_failed_ids: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Mirrored ("upsert", vectors) / ("delete", ids) writes, applied in order by _apply_pending
+        self._pending: "queue.Queue[tuple]" = queue.Queue()
+        self._apply_lock = threading.Lock()
+
+    # ---- Lifecycle ----
+
+    def start(self) -> None:
+        self.status = "running"
+        self.started_at = time.time()
+        pinecone_store.register_dual_write(self.namespace, self.id, self._dual_write, self._dual_delete)
+        self._thread = threading.Thread(target=self._run, name=f"migrate-{self.namespace}", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def cutover(self) -> None:
+        """Point the logical namespace at the shadow; both reads and query embeddings switch together."""
+        if self.status not in ("backfilled", "completed"):
+            raise RuntimeError(f"Migration {self.id} is {self.status}; only a backfilled migration can cut over")
+        self._apply_pending()
+        set_alias(self.namespace, self.target)
+        pinecone_store.unregister_dual_write(self.namespace, self.id)
+        # Writes that resolved the old target just before the switch
+        self._apply_pending()
+        coarse = get_coarse_index(self.namespace)
+        if coarse is not None:
+            coarse.reset()
+        # Same logical namespace, different vectors: invalidate cached stats and results
+        pinecone_store.notify_write(self.namespace, 0)
+        self.status = "completed"
+        self.finished_at = time.time()
+
+    # ---- Backfill ----
+
+    def _target_index(self):
+        return pinecone_store.get_index(self.target.index)
+
+    def _embed_and_write(self, vectors: List[tuple]) -> int:
+        """
+        Re-embed (id, _, metadata) rows from their chunk text and write them to
+        the shadow. Rows without text are recorded as not migrated.
+        """
+        stored = texts_for(self.namespace, [vid for vid, _, md in vectors if not (md and md.get("text"))])
+        rows = []
+        for vid, _, md in vectors:
+            text = (md or {}).get("text") or stored.get(vid)
+            if text:
+                rows.append((vid, text, md or {}))
+            else:
+                self.not_migrated += 1
+                if len(self.not_migrated_ids) < NOT_MIGRATED_SAMPLE:
+                    self.not_migrated_ids.append(vid)
+        if not rows:
+            return 0
+        embeddings = get_provider().embed_spec([text for _, text, _ in rows], self.spec)
+        payload, _ = split_bodies([(vid, vec, md) for (vid, _, md), vec in zip(rows, embeddings)])
+        return pinecone_store.upsert_batches(self._target_index(), payload, self.target.namespace)
+
+    # ---- Mirrored writes ----
+
+    def _dual_write(self, vectors: List[tuple]) -> None:
+        self._pending.put(("upsert", list(vectors)))
+
+    def _dual_delete(self, ids: Optional[List[str]]) -> None:
+        """Delete from the shadow what was deleted from the source (ids=None: everything)."""
+        self._pending.put(("delete", None if ids is None else list(ids)))
+
+    def _apply_pending(self, wait: float = 0.0) -> None:
+        """Apply queued mirrored writes in order, waiting up to `wait` seconds for the first one."""
+        with self._apply_lock:
+            while True:
+                try:
+                    op, arg = self._pending.get(timeout=wait) if wait else self._pending.get_nowait()
+                except queue.Empty:
+                    return
+                wait = 0.0
+                try:
+                    if op == "upsert":
+                        self.dual_written += self._embed_and_write(arg)
+                    else:
+                        self._delete_shadow(arg)
+                except Exception as e:
+                    self.dual_write_errors += 1
+                    ids = [row[0] for row in arg] if op == "upsert" else (arg or ["*"])
+                    room = NOT_MIGRATED_SAMPLE - len(self.dual_write_failed_ids)
+                    self.dual_write_failed_ids.extend(ids[:max(0, room)])
+                    print(f"⚠️ Migration {self.id}: mirrored {op} of {len(ids)} vectors failed: {e}")
+
+    def _delete_shadow(self, ids: Optional[List[str]]) -> None:
+        index = self._target_index()
+        if ids is None:
+            index.delete(delete_all=True, namespace=self.target.namespace)
+            return
+        for start in range(0, len(ids), pinecone_store.DELETE_BATCH_SIZE):
+            call_with_retries(
+                "pinecone-delete", index.delete,
+                ids=ids[start:start + pinecone_store.DELETE_BATCH_SIZE], namespace=self.target.namespace,
+            )
+        self.dual_deleted += len(ids)
+
+    def _run(self) -> None:
+        try:
+            pinecone_store.ensure_index(self.spec.dimension, index_name=self.target.index or pinecone_store.INDEX_NAME)
+            source = pinecone_store.get_index(self.source.index)
+            stats = source.describe_index_stats()
+            self.total = int(stats.get("namespaces", {}).get(self.source.namespace, {}).get("vector_count", 0))
+
+            for id_page in source.list(namespace=self.source.namespace):
+                ids = list(id_page)
+                for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                    if self._cancel.is_set():
+                        self._cancelled()
+                        return
+                    batch_start = time.monotonic()
+                    res = call_with_retries(
+                        "pinecone-fetch", source.fetch,
+                        ids=ids[start:start + FETCH_BATCH_SIZE], namespace=self.source.namespace,
+                    )
+                    records = [(r.id, None, dict(r.metadata or {})) for r in res.vectors.values()]
+                    self.migrated += self._embed_and_write(records)
+                    # Writes mirrored while the batch was in flight land after it, e.g. deleting its copies
+                    self._apply_pending()
+                    self._throttle(len(records), time.monotonic() - batch_start)
+
+            self._apply_pending()
+            self.status = "backfilled"
+            blockers = []
+            if self.not_migrated:
+                blockers.append(
+                    f"{self.not_migrated} vectors have no chunk text to re-embed "
+                    f"(e.g. {', '.join(self.not_migrated_ids[:5])}); re-index their sources"
+                )
+            if self.dual_write_errors:
+                blockers.append(
+                    f"{self.dual_write_errors} mirrored writes failed "
+                    f"(e.g. {', '.join(self.dual_write_failed_ids[:5])}); re-upsert or delete those ids again"
+                )
+            if blockers:
+                self.error = (
+                    f"Not cut over automatically, the shadow is missing writes: {'; '.join(blockers)}. "
+                    f"Cut over explicitly to accept the loss"
+                )
+                print(f"⚠️ Migration {self.id} of '{self.namespace}': {self.error}")
+            elif self.auto_cutover:
+                self.cutover()
+                return
+
+            # Keep mirroring until an explicit cutover or cancel
+            while self.status == "backfilled":
+                if self._cancel.is_set():
+                    self._cancelled()
+                    return
+                self._apply_pending(wait=MIRROR_POLL_SECONDS)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            self.finished_at = time.time()
+            pinecone_store.unregister_dual_write(self.namespace, self.id)
+            print(f"❌ Migration {self.id} of '{self.namespace}' failed: {e}")
+
+    def _cancelled(self) -> None:
+        self.status = "cancelled"
+        self.finished_at = time.time()
+        pinecone_store.unregister_dual_write(self.namespace, self.id)
+
+    def _throttle(self, count: int, elapsed: float) -> None:
+        if self.max_vectors_per_sec > 0:
+            wait = count / self.max_vectors_per_sec - elapsed
+            if wait > 0:
+                self._cancel.wait(wait)
+
+    # ---- Progress ----
+
+    def progress(self) -> Dict[str, Any]:
+        processed = self.migrated + self.not_migrated
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - processed)
+        return {
+            "id": self.id,
+            "namespace": self.namespace,
+            "status": self.status,
+            "error": self.error,
+            "source": self.source._asdict(),
+            "target": self.target._asdict(),
+            "total": self.total,
+            "migrated": self.migrated,
+            "not_migrated": self.not_migrated,
+            "not_migrated_ids": self.not_migrated_ids,
+            "dual_written": self.dual_written,
+            "dual_deleted": self.dual_deleted,
+            "dual_write_errors": self.dual_write_errors,
+            "dual_write_failed_ids": self.dual_write_failed_ids,
+            "pending_dual_writes": self._pending.qsize(),
+            "percent": round(100.0 * processed / self.total, 1) if self.total else 0.0,
+            "vectors_per_sec": round(rate, 1),
+            "eta_seconds": round(remaining / rate) if rate > 0 and self.status == "running" else None,
+            "elapsed_seconds": round(elapsed, 1),
+        }
+
+
+_jobs: Dict[str, MigrationJob] = {}
+_lock = threading.Lock()
+
+
+def start_migration(
+    namespace: str,
+    model: str,
+    dimension: int,
+    target_index: Optional[str] = None,
+    max_vectors_per_sec: Optional[float] = None,
+    auto_cutover: bool = True,
+) -> MigrationJob:
+    with _lock:
+        for job in _jobs.values():
+            if job.namespace == namespace and job.status in ("pending", "running", "backfilled"):
+                raise RuntimeError(f"Namespace '{namespace}' already has migration {job.id} in progress")
+        job = MigrationJob(
+            namespace,
+            ModelSpec(model, dimension),
+            target_index=target_index,
+            max_vectors_per_sec=MIGRATION_MAX_VECTORS_PER_SEC if max_vectors_per_sec is None else max_vectors_per_sec,
+            auto_cutover=auto_cutover,
+        )
+        _jobs[job.id] = job
+    job.start()
+    return job
+
+
+def get_migration(job_id: str) -> Optional[MigrationJob]:
+    return _jobs.get(job_id)
+
+
+def list_migrations() -> List[Dict[str, Any]]:
+    return [job.progress() for job in list(_jobs.values())]
@@ -0,0 +1,258 @@
+# utils/embedding_provider.py
+"""
+Single entry point for every embedding call in the app.
+
+A namespace -> model registry decides which model embeds (and queries) each
+Pinecone namespace, so query and passage vectors always come from the same
+model. All calls share the backend client pools, the batch thread pool, the
+token-budget packer, the embedding cache and the per-model metrics.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.embedding_backends import EmbeddingBackend, get_backend, EMBED_POOL_SIZE
+from utils.embedding_cache import cached_embed, get_embedding_cache
+from utils.namespace_aliases import resolve as resolve_namespace
+from utils.token_budget import plan_requests
+from utils.settings import env_int
+
+
+# Upper bound on inputs per request; backends and model limits may impose a lower one
+EMBED_BATCH_SIZE = env_int("EMBED_BATCH_SIZE", 96, minimum=1)
+
+
+class ModelSpec(NamedTuple):
+    model: str
+    dimension: int
+
+
+# Namespaces whose existing vectors were written by a model other than the default.
+# EMBED_NAMESPACE_MODELS (JSON: {"namespace": "model:dimension"}) adds or overrides entries.
+DEFAULT_NAMESPACE_MODELS: Dict[str, ModelSpec] = {
+    "github-repos-test-1": ModelSpec("text-embedding-3-large", 1024),
+    "github-repos-test-2": ModelSpec("text-embedding-3-large", 1024),
+}
+
+
+def default_spec() -> ModelSpec:
+    """Model used for namespaces without a registry entry (PINECONE_EMBED_MODEL / _DIM)."""
+    model = os.getenv("PINECONE_EMBED_MODEL", "llama-text-embed-v2")
+    try:
+        dim = int(os.getenv("PINECONE_EMBED_DIM", "1024"))
+    except ValueError:
+        dim = 1024
+    return ModelSpec(model, dim)
+
+
+def _parse_spec(value: str) -> ModelSpec:
+    model, _, dim = value.rpartition(":")
+    if not model:
+        return ModelSpec(value, default_spec().dimension)
+    return ModelSpec(model, int(dim))
+
+
+def _load_namespace_models() -> Dict[str, ModelSpec]:
+    models = dict(DEFAULT_NAMESPACE_MODELS)
+    raw = os.getenv("EMBED_NAMESPACE_MODELS")
+    if raw:
+        try:
+            for namespace, value in json.loads(raw).items():
+                models[namespace] = _parse_spec(value)
+        except (ValueError, AttributeError) as e:
+            raise RuntimeError(f"Invalid EMBED_NAMESPACE_MODELS: {e}")
+    return models
+
+
+class EmbeddingProvider:
+    """Namespace-aware embedder with shared batching, caching and metrics."""
+
+    def __init__(self, namespace_models: Optional[Dict[str, ModelSpec]] = None):
+        self._namespace_models = namespace_models if namespace_models is not None else _load_namespace_models()
+        self._executor = ThreadPoolExecutor(max_workers=EMBED_POOL_SIZE, thread_name_prefix="embed")
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    # ---- Registry ----
+
+    def spec_for(self, namespace: Optional[str] = None) -> ModelSpec:
+        if namespace is None:
+            return default_spec()
+        # A migrated namespace embeds with the model its alias target was built with
+        target = resolve_namespace(namespace)
+        if target.model:
+            return ModelSpec(target.model, target.dimension or default_spec().dimension)
+        if namespace in self._namespace_models:
+            return self._namespace_models[namespace]
+        return default_spec()
+
+    def register_namespace(self, namespace: str, spec: ModelSpec) -> None:
+        with self._lock:
+            self._namespace_models[namespace] = spec
+
+    def namespace_models(self) -> Dict[str, ModelSpec]:
+        return dict(self._namespace_models)
+
+    # ---- Embedding ----
+
+    def _plan(self, texts: List[str], backend: EmbeddingBackend, spec: ModelSpec) -> Tuple[List[List[str]], int]:
+        """Truncate locally and pack into requests bounded by item and token limits."""
+        return plan_requests(texts, spec.model, min(EMBED_BATCH_SIZE, backend.max_batch_size))
+
+    def _embed_batch(self, backend: EmbeddingBackend, batch: List[str], spec: ModelSpec, input_type: str) -> np.ndarray:
+        start = time.perf_counter()
+        try:
+            vectors = backend.embed_batch(batch, spec.model, spec.dimension, input_type)
+        except Exception:
+            self._record(spec, requests=1, errors=1)
+            raise
+        self._record(spec, requests=1, texts=len(batch), seconds=time.perf_counter() - start)
+        return vectors
+
+    def _embed_uncached(
+        self, texts: List[str], spec: ModelSpec, input_type: str, usage: dict
+    ) -> np.ndarray:
+        backend = get_backend(spec.model)
+        batches, tokens = self._plan(texts, backend, spec)
+        usage["tokens"] += tokens
+        self._record(spec, tokens=tokens)
+        if len(batches) == 1:
+            return self._embed_batch(backend, batches[0], spec, input_type)
+
+        if backend.remote:
+            results = self._executor.map(lambda batch: self._embed_batch(backend, batch, spec, input_type), batches)
+        else:
+            results = (self._embed_batch(backend, batch, spec, input_type) for batch in batches)
+        return _stack(results, len(texts), spec.dimension)
+
+    def embed_with_usage(
+        self, texts: List[str], namespace: Optional[str] = None, input_type: str = "passage"
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Embed texts with the model registered for `namespace`.
+
+        For remote backends, texts already in the embedding cache are served locally.
+        The rest are truncated to the model's input limit and packed into requests
+        bounded by EMBED_BATCH_SIZE and the model's item/token limits, which are sent
+        concurrently (under the upstream's adaptive limit) over the backend's shared client.
+
+        Returns (vectors, tokens): a contiguous (len(texts), dimension) float32 array
+        in input order, and the number of tokens sent to the model (cache hits are free).
+        """
+        return self.embed_spec_with_usage(texts, self.spec_for(namespace), input_type)
+
+    def embed_spec_with_usage(
+        self, texts: List[str], spec: ModelSpec, input_type: str = "passage"
+    ) -> Tuple[np.ndarray, int]:
+        """embed_with_usage for an explicit model, e.g. a migration's target."""
+        usage = {"tokens": 0}
+        if not texts:
+            return np.empty((0, spec.dimension), dtype=np.float32), 0
+
+        if not get_backend(spec.model).remote:
+            return self._embed_uncached(texts, spec, input_type, usage), usage["tokens"]
+        vectors = cached_embed(
+            texts, spec.model, spec.dimension, input_type,
+            lambda missing: self._embed_uncached(missing, spec, input_type, usage),
+        )
+        return vectors, usage["tokens"]
+
+    def embed(self, texts: List[str], namespace: Optional[str] = None, input_type: str = "passage") -> np.ndarray:
+        return self.embed_with_usage(texts, namespace, input_type)[0]
+
+    def embed_spec(self, texts: List[str], spec: ModelSpec, input_type: str = "passage") -> np.ndarray:
+        return self.embed_spec_with_usage(texts, spec, input_type)[0]
+
+    async def aembed(
+        self, texts: List[str], namespace: Optional[str] = None, input_type: str = "passage"
+    ) -> np.ndarray:
+        """Async counterpart of embed; returns the same result without blocking the event loop."""
+        return await self.aembed_spec(texts, self.spec_for(namespace), input_type)
+
+    async def aembed_spec(self, texts: List[str], spec: ModelSpec, input_type: str = "passage") -> np.ndarray:
+        if not texts:
+            return np.empty((0, spec.dimension), dtype=np.float32)
+
+        backend = get_backend(spec.model)
+        if not backend.remote:
+            return self._embed_uncached(texts, spec, input_type, {"tokens": 0})
+
+        cache = get_embedding_cache()
+        if cache is None:
+            pending = texts
+        else:
+            vectors, missing = cache.lookup(texts, spec.model, spec.dimension, input_type)
+            if not missing:
+                return vectors
+            pending = cache.pending(texts, missing)
+
+        batches, tokens = self._plan(pending, backend, spec)
+        self._record(spec, tokens=tokens)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, self._embed_batch, backend, batch, spec, input_type)
+            for batch in batches
+        ])
+        fresh = _stack(results, len(pending), spec.dimension)
+
+        if cache is None:
+            return fresh
+        cache.fill_missing(texts, vectors, missing, fresh, spec.model, spec.dimension, input_type)
+        return vectors
+
+    # ---- Metrics ----
+
+    def _record(self, spec: ModelSpec, **counts: float) -> None:
+        key = f"{spec.model}:{spec.dimension}"
+        with self._lock:
+            m = self._metrics.setdefault(
+                key, {"requests": 0, "texts": 0, "tokens": 0, "errors": 0, "seconds": 0.0}
+            )
+            for name, value in counts.items():
+                m[name] += value
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            models = {}
+            for key, m in self._metrics.items():
+                ok = m["requests"] - m["errors"]
+                models[key] = {
+                    **m,
+                    "seconds": round(m["seconds"], 3),
+                    "avg_request_ms": round(1000 * m["seconds"] / ok, 1) if ok else 0.0,
+                }
+        return {
+            "default": f"{default_spec().model}:{default_spec().dimension}",
+            "namespaces": {ns: f"{s.model}:{s.dimension}" for ns, s in self._namespace_models.items()},
+            "models": models,
+        }
+
+
+def _stack(batch_results, n: int, dim: int) -> np.ndarray:
+    """Copy per-batch arrays into one contiguous (n, dim) block."""
+    out = np.empty((n, dim), dtype=np.float32)
+    row = 0
+    for block in batch_results:
+        out[row:row + len(block)] = block
+        row += len(block)
+    return out
+
+
+_provider: EmbeddingProvider | None = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> EmbeddingProvider:
+    """Process-wide provider shared by all embedding call sites."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = EmbeddingProvider()
+    return _provider
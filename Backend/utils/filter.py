@@ -57,3 +57,65 @@ def build_pinecone_filter_from_issue(
 
 
     return {"$and": clauses} if len(clauses) > 1 else (clauses[0] if clauses else {})
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    # List-valued metadata matches if any element does, as in Pinecone
+    if isinstance(value, list) and op in ("$eq", "$in"):
+        return any(_compare(v, op, operand) for v in value)
+    if isinstance(value, list) and op in ("$ne", "$nin"):
+        return all(_compare(v, op, operand) for v in value)
+
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def metadata_matches(metadata: Dict[str, Any], filter: Dict[str, Any] | None) -> bool:
+    """
+    Evaluate a Pinecone metadata filter against one record's metadata locally.
+    Supports $and/$or, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte/$exists and the
+    {"field": value} shorthand for $eq.
+    """
+    if not filter:
+        return True
+
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$exists":
+                    if (key in metadata) != bool(operand):
+                        return False
+                elif key not in metadata:
+                    if op not in ("$ne", "$nin"):
+                        return False
+                elif not _compare(metadata[key], op, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
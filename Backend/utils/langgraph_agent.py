@@ -4,7 +4,8 @@ LangGraph-based agentic workflow for intelligent document processing.
 This agent orchestrates document analysis, chunking decisions, and semantic search.
 """
 import os
-from typing import TypedDict, Annotated, List, Dict, Any
+from typing import TypedDict, Annotated, List, Dict, Any, Tuple
+import numpy as np
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
@@ -20,8 +21,14 @@ class DocumentProcessingState(TypedDict):
     chunk_size: int
     chunk_overlap: int
     chunks: List[str]
-    embeddings: List[List[float]]
+    chunk_sections: List[str]  # Heading path per chunk ("" outside any section or strategy)
+    vector_ids: List[Tuple[str, str]]  # (content-hash vector id, chunk hash) per chunk
+    pending: List[int]  # Positions of chunks not indexed yet
+    vanished: List[str]  # Previously indexed vector ids no longer in the document
+    embeddings: np.ndarray | None  # (len(pending), dim) float32 block, rows in `pending` order
+    tokens_embedded: int
     metadata: Dict[str, Any]
+    namespace: str | None
     error: str | None
     step: str
 
@@ -71,34 +78,91 @@ def chunk_document_node(state: DocumentProcessingState) -> DocumentProcessingSta
     """
     Chunk document based on the determined strategy.
     """
-    from Backend.utils.chunking import naive_chunks
+    from utils.chunking import naive_chunks, section_chunks
+    from utils.embedding import get_model_info
+    from utils.token_budget import get_limits, split
     
     text = state["document_text"]
     chunk_size = state["chunk_size"]
     chunk_overlap = state["chunk_overlap"]
     
-    chunks = naive_chunks(text, chunk_chars=chunk_size, overlap=chunk_overlap)
+    if state["chunk_strategy"] == "section_based":
+        # Headings, paragraphs and lists kept whole and packed up to chunk_size
+        sectioned = section_chunks(text, chunk_chars=chunk_size, overlap=chunk_overlap)
+    else:
+        sectioned = [(chunk, "") for chunk in naive_chunks(text, chunk_chars=chunk_size, overlap=chunk_overlap)]
+
+    # Split chunks the embedding model would otherwise truncate
+    max_tokens = get_limits(get_model_info(state.get("namespace"))[0]).max_input_tokens
+    sectioned = [(piece, path) for chunk, path in sectioned for piece in split(chunk, max_tokens)]
     
     return {
         **state,
-        "chunks": chunks,
+        "chunks": [chunk for chunk, _ in sectioned],
+        "chunk_sections": [path for _, path in sectioned],
         "step": "chunked"
     }
 
 
+def plan_reindex_node(state: DocumentProcessingState) -> DocumentProcessingState:
+    """
+    Give chunks content-hash ids and compare them with what is already indexed
+    for this file, so only new or changed chunks are embedded.
+    """
+    import json
+    from utils.chunk_manifest import chunk_ids, get_manifest
+    from utils.pinecone_store import list_ids
+    
+    file_id = state["file_id"]
+    namespace = state.get("namespace")
+    # Anything else stored with the vector; a metadata change re-indexes the chunk
+    salt = json.dumps({"filename": state["filename"], "metadata": state["metadata"]}, sort_keys=True, default=str)
+    # The section path goes into the vector's metadata too
+    sections = state.get("chunk_sections") or [""] * len(state["chunks"])
+    keyed = [f"{path}\x00{chunk}" if path else chunk for chunk, path in zip(state["chunks"], sections)]
+    ids = chunk_ids(file_id, keyed, salt)
+    
+    if namespace is None:
+        return {**state, "vector_ids": ids, "pending": list(range(len(ids))), "vanished": [], "step": "planned"}
+    
+    try:
+        manifest = get_manifest()
+        if manifest.has_file(namespace, file_id):
+            indexed = list(manifest.entries(namespace, file_id))
+        else:
+            # Indexed before manifests (ids were "{file_id}-{i}"), or never
+            indexed = list_ids(namespace, prefix=f"{file_id}-")
+        plan = manifest.plan(namespace, file_id, ids, indexed)
+    except Exception as e:
+        return {
+            **state,
+            "error": f"Re-index planning failed: {str(e)}",
+            "step": "error"
+        }
+    
+    return {
+        **state,
+        "vector_ids": ids,
+        "pending": plan.pending,
+        "vanished": plan.vanished,
+        "step": "planned"
+    }
+
+
 def embed_chunks_node(state: DocumentProcessingState) -> DocumentProcessingState:
     """
-    Generate embeddings for document chunks.
+    Generate embeddings for the document chunks that are not indexed yet.
     """
-    from Backend.utils.embedding import embed_texts
+    from utils.embedding import embed_texts_with_usage
     
-    chunks = state["chunks"]
+    chunks = [state["chunks"][i] for i in state["pending"]]
     
     try:
-        embeddings = embed_texts(chunks)
+        embeddings, tokens = embed_texts_with_usage(chunks, namespace=state.get("namespace"))
         return {
             **state,
             "embeddings": embeddings,
+            "tokens_embedded": tokens,
             "step": "embedded"
         }
     except Exception as e:
@@ -118,6 +182,15 @@ def should_continue_to_embed(state: DocumentProcessingState) -> str:
     return "embed"
 
 
+def should_continue_after_plan(state: DocumentProcessingState) -> str:
+    """
+    Routing function after re-index planning.
+    """
+    if state.get("error"):
+        return "error"
+    return "embed"
+
+
 def should_continue_after_embed(state: DocumentProcessingState) -> str:
     """
     Routing function after embedding.
@@ -134,13 +207,15 @@ def create_document_processing_graph():
     Workflow:
     1. Analyze document → Determine chunking strategy
     2. Chunk document → Create text chunks
-    3. Embed chunks → Generate vector embeddings
+    3. Plan re-index → Content-hash ids, diff against the file's manifest
+    4. Embed chunks → Generate vector embeddings for new/changed chunks
     """
     workflow = StateGraph(DocumentProcessingState)
     
     # Add nodes
     workflow.add_node("analyze", analyze_document_node)
     workflow.add_node("chunk", chunk_document_node)
+    workflow.add_node("plan", plan_reindex_node)
     workflow.add_node("embed", embed_chunks_node)
     
     # Define edges
@@ -151,6 +226,16 @@ def create_document_processing_graph():
     workflow.add_conditional_edges(
         "chunk",
         should_continue_to_embed,
+        {
+            "embed": "plan",
+            "error": END
+        }
+    )
+    
+    # Conditional routing after planning
+    workflow.add_conditional_edges(
+        "plan",
+        should_continue_after_plan,
         {
             "embed": "embed",
             "error": END
@@ -174,7 +259,8 @@ def process_document_with_agent(
     document_text: str,
     filename: str,
     file_id: str,
-    metadata: Dict[str, Any] | None = None
+    metadata: Dict[str, Any] | None = None,
+    namespace: str | None = None
 ) -> DocumentProcessingState:
     """
     Process a document using the LangGraph agent workflow.
@@ -184,9 +270,11 @@ def process_document_with_agent(
         filename: Name of the file
         file_id: MongoDB file ID
         metadata: Optional metadata to attach
+        namespace: Target Pinecone namespace (selects the embedding model)
     
     Returns:
-        Final state containing chunks, embeddings, and analysis
+        Final state containing chunks, their vector ids, the embeddings of the
+        pending (new or changed) chunks, vanished ids, and analysis
     """
     # Create the graph
     graph = create_document_processing_graph()
@@ -201,8 +289,14 @@ def process_document_with_agent(
         "chunk_size": 1200,
         "chunk_overlap": 150,
         "chunks": [],
-        "embeddings": [],
+        "chunk_sections": [],
+        "vector_ids": [],
+        "pending": [],
+        "vanished": [],
+        "embeddings": None,
+        "tokens_embedded": 0,
         "metadata": metadata or {},
+        "namespace": namespace,
         "error": None,
         "step": "initialized"
     }
@@ -217,7 +311,7 @@ def process_document_with_agent(
 class QueryState(TypedDict):
     """State for query processing workflow."""
     query_text: str
-    query_embedding: List[float]
+    query_embedding: np.ndarray | None
     jira_context: Dict[str, Any] | None
     filter_metadata: Dict[str, Any]
     namespace: str
@@ -228,10 +322,10 @@ class QueryState(TypedDict):
 
 def embed_query_node(state: QueryState) -> QueryState:
     """Embed the query text."""
-    from Backend.utils.embedding import embed_texts
+    from utils.embedding import embed_texts
     
     query_text = state["query_text"]
-    embeddings = embed_texts([query_text])
+    embeddings = embed_texts([query_text], input_type="query", namespace=state["namespace"])
     
     return {
         **state,
@@ -263,7 +357,8 @@ def build_filter_node(state: QueryState) -> QueryState:
 
 def search_vectors_node(state: QueryState) -> QueryState:
     """Execute vector search."""
-    from Backend.utils.pinecone_store import query
+    from utils.pinecone_store import query
+    from utils.chunk_store import hydrate
     
     results = query(
         vector=state["query_embedding"],
@@ -272,7 +367,7 @@ def search_vectors_node(state: QueryState) -> QueryState:
         filter=state["filter_metadata"]
     )
     
-    matches = results.get("matches", [])
+    matches = hydrate(results.get("matches", []), state["namespace"])
     
     return {
         **state,
@@ -321,7 +416,7 @@ def query_with_agent(
     
     initial_state: QueryState = {
         "query_text": query_text,
-        "query_embedding": [],
+        "query_embedding": None,
         "jira_context": jira_context,
         "filter_metadata": {},
         "namespace": namespace,
@@ -0,0 +1,270 @@
+# utils/lexical_index.py
+"""
+Local BM25 index over chunk text, for queries that name exact identifiers.
+
+upsert_chunks adds each chunk's text (with its compact metadata) to an SQLite
+FTS5 table keyed by (logical namespace, vector id); delete_namespace drops it.
+Dense embeddings rank Jira keys ("AATA-9"), table names and error codes
+poorly, so /pinecone/query uses this index in two ways:
+
+  * identifier-heavy queries (identifiers plus at most LEXICAL_FASTPATH_MAX_WORDS
+    other words) that have lexical hits are answered from it alone, with no
+    embedding call;
+  * everything else runs the dense search and fuses both rankings with
+    reciprocal rank fusion (RRF).
+
+A match's "score" stays the dense cosine similarity (None for matches found
+only lexically); the BM25 value goes in "bm25" and the RRF value in
+"fused_score". The order of the returned list is the ranking.
+
+Identifiers are Jira-style keys, snake_case or dotted names, error codes like
+ORA-00942 / E1234, and any table_name seen in indexed metadata.
+"""
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.filter import metadata_matches
+from utils.settings import env_int, env_flag, connect_sqlite
+
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(".cache", "lexical.sqlite3"))
+LEXICAL_INDEX_ENABLED = env_flag("LEXICAL_INDEX_ENABLED")
+LEXICAL_FASTPATH_MAX_WORDS = env_int("LEXICAL_FASTPATH_MAX_WORDS", 4)
+LEXICAL_RRF_K = env_int("LEXICAL_RRF_K", 60)
+
+# Rows fetched per requested match when a metadata filter is applied afterwards
+_FILTER_OVERFETCH = 4
+# Metadata fields whose values count as identifiers in queries
+IDENTIFIER_FIELDS = ("table_name",)
+
+_IDENTIFIER = re.compile(
+    r"\b[A-Z][A-Z0-9]{1,9}-\d+\b"  # Jira keys, ORA-00942
+    r"|\b[A-Za-z][A-Za-z0-9]*(?:[_.][A-Za-z0-9]+)+\b"  # flight_bookings, public.users
+    r"|\b[A-Z]{1,5}\d{2,}\b"  # E1234, HTTP503
+)
+_WORD = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "by", "for", "from", "how", "in", "is", "of", "on", "or",
+    "show", "the", "to", "what", "which", "with", "me", "about", "find", "does", "do",
+}
+
+
+def _phrase(text: str) -> str:
+    """FTS5 phrase matching `text`'s tokens in order (tokens are \\w+, so quoting is safe)."""
+    return '"' + " ".join(_WORD.findall(text.lower())) + '"'
+
+
+class LexicalIndex:
+    """SQLite FTS5 table of chunk text and metadata per namespace."""
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self.fast_path_hits = 0
+        self.fused = 0
+        self._lock = threading.Lock()
+
+        self._conn = connect_sqlite(path)
+        # Porter-stemmed; "_" joins tokens so snake_case names stay whole, "AATA-9" becomes the phrase "aata 9"
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            "namespace UNINDEXED, id UNINDEXED, metadata UNINDEXED, text, "
+            "tokenize = \"porter unicode61 tokenchars '_'\")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_rows ("
+            "namespace TEXT NOT NULL, id TEXT NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (namespace, id)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS identifiers (term TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._identifiers = {row[0] for row in self._conn.execute("SELECT term FROM identifiers")}
+
+    # ---- Writes ----
+
+    def put(self, namespace: str, rows: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Insert or replace (id, text, metadata) rows; metadata should not carry the text."""
+        rows = list(rows)
+        if not rows:
+            return
+        terms = {
+            str(md[f]).lower() for _, _, md in rows for f in IDENTIFIER_FIELDS if md and md.get(f)
+        } - self._identifiers
+        with self._lock:
+            self._delete_locked(namespace, [vid for vid, _, _ in rows])
+            for vid, text, md in rows:
+                cur = self._conn.execute(
+                    "INSERT INTO chunks (namespace, id, metadata, text) VALUES (?, ?, ?, ?)",
+                    (namespace, vid, json.dumps(md or {}), text),
+                )
+                self._conn.execute(
+                    "INSERT INTO chunk_rows (namespace, id, row) VALUES (?, ?, ?)", (namespace, vid, cur.lastrowid)
+                )
+            if terms:
+                self._conn.executemany("INSERT OR IGNORE INTO identifiers (term) VALUES (?)", [(t,) for t in terms])
+                self._identifiers |= terms
+            self._conn.commit()
+
+    def _delete_locked(self, namespace: str, ids: Sequence[str]) -> None:
+        for vid in ids:
+            row = self._conn.execute(
+                "SELECT row FROM chunk_rows WHERE namespace = ? AND id = ?", (namespace, vid)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM chunks WHERE rowid = ?", row)
+                self._conn.execute("DELETE FROM chunk_rows WHERE namespace = ? AND id = ?", (namespace, vid))
+
+    def delete(self, namespace: str, ids: Sequence[str] | None = None) -> None:
+        """Drop the given ids, or the whole namespace when ids is None."""
+        with self._lock:
+            if ids is None:
+                self._conn.execute(
+                    "DELETE FROM chunks WHERE rowid IN (SELECT row FROM chunk_rows WHERE namespace = ?)", (namespace,)
+                )
+                self._conn.execute("DELETE FROM chunk_rows WHERE namespace = ?", (namespace,))
+            else:
+                self._delete_locked(namespace, ids)
+            self._conn.commit()
+
+    # ---- Queries ----
+
+    def identifiers(self, text: str) -> List[str]:
+        """Identifiers named in a query, in order of appearance."""
+        found = [m.group(0) for m in _IDENTIFIER.finditer(text)]
+        found += [w for w in _WORD.findall(text) if w.lower() in self._identifiers and w not in found]
+        return found
+
+    def search(
+        self,
+        namespace: str,
+        text: str,
+        limit: int,
+        filter: Dict[str, Any] | None = None,
+        require: Sequence[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """
+        BM25-ranked matches for any of the query's words; every phrase in
+        `require` must appear. "bm25" is positive, higher is better; there is
+        no dense "score".
+        """
+        words = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+        terms = list(dict.fromkeys([_phrase(r) for r in require] + [f'"{w}"' for w in words]))
+        if not terms:
+            return []
+        expression = " OR ".join(terms)
+        if require:
+            expression = " AND ".join(_phrase(r) for r in require) + f" AND ({expression})"
+
+        fetch = limit * _FILTER_OVERFETCH if filter else limit
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, metadata, bm25(chunks) AS rank FROM chunks "
+                "WHERE chunks MATCH ? AND namespace = ? ORDER BY rank LIMIT ?",
+                (expression, namespace, fetch),
+            ).fetchall()
+
+        matches = []
+        for vid, md, rank in rows:
+            metadata = json.loads(md)
+            if filter and not metadata_matches(metadata, filter):
+                continue
+            matches.append({"id": vid, "score": None, "bm25": -rank, "metadata": metadata, "namespace": namespace})
+            if len(matches) == limit:
+                break
+        return matches
+
+    def fast_path(
+        self, text: str, targets: Sequence[Tuple[str, Dict[str, Any] | None]], limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Matches for an identifier-heavy query across (namespace, filter) targets,
+        or None when the query needs the dense search.
+        """
+        found = self.identifiers(text)
+        if not found:
+            return None
+        rest = text
+        for ident in found:
+            rest = rest.replace(ident, " ")
+        extra = [w for w in _WORD.findall(rest.lower()) if w not in _STOPWORDS]
+        if len(extra) > LEXICAL_FASTPATH_MAX_WORDS:
+            return None
+
+        matches = [m for ns, f in targets for m in self.search(ns, text, limit, f, require=found)]
+        if not matches:
+            return None
+        self.fast_path_hits += 1
+        matches.sort(key=lambda m: m["bm25"], reverse=True)
+        return matches[:limit]
+
+    def fuse(
+        self,
+        dense: List[Dict[str, Any]],
+        text: str,
+        targets: Sequence[Tuple[str, Dict[str, Any] | None]],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """RRF of the dense matches with the lexical ranking over the same targets."""
+        lexical = [m for ns, f in targets for m in self.search(ns, text, limit, f)]
+        if not lexical:
+            return dense[:limit]
+        lexical.sort(key=lambda m: m["bm25"], reverse=True)
+        self.fused += 1
+        return rrf_fuse([dense, lexical], limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+        return {
+            "enabled": True,
+            "path": self.path,
+            "chunks": rows,
+            "identifiers": len(self._identifiers),
+            "fast_path_hits": self.fast_path_hits,
+            "fused": self.fused,
+        }
+
+
+def rrf_fuse(rankings: Sequence[List[Dict[str, Any]]], limit: int, k: int = LEXICAL_RRF_K) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion: each match gets fused_score = sum(1 / (k + rank))
+    over the rankings it appears in, and the result is ordered by it. Fields
+    of the earliest ranking's copy win, so a dense match keeps its "score"
+    and gains "bm25" from the lexical copy.
+    """
+    scores: Dict[Tuple[str, str], float] = {}
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, 1):
+            key = (match.get("namespace"), match["id"])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            merged[key] = {**match, **merged[key]} if key in merged else match
+    order = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [{**merged[key], "fused_score": scores[key]} for key in order]
+
+
+_index: LexicalIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex | None:
+    """Process-wide index, or None when LEXICAL_INDEX_ENABLED is off."""
+    global _index
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LexicalIndex()
+    return _index
+
+
+def lexical_index_stats() -> Dict[str, Any]:
+    index = get_lexical_index()
+    if index is None:
+        return {"enabled": False}
+    return index.stats()
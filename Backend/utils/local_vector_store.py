@@ -0,0 +1,555 @@
+# utils/local_vector_store.py
+"""
+In-process vector store with the Pinecone data-plane surface pinecone_store uses.
+
+Each namespace is a memory-mapped float32 matrix of L2-normalised rows on disk
+(LOCAL_VECTOR_STORE_PATH/<index>/<namespace>/vectors.f32) plus its ids and
+metadata, so cosine scores are a single matrix-vector product. Ids and metadata
+live in a meta.json snapshot and an append-only meta.log of the writes since;
+a write batch appends only its own rows, and the log is folded into the
+snapshot once it outgrows the namespace.
+LocalIndex mirrors the parts of pinecone.Index that the app calls (upsert,
+query, fetch, list, delete, describe_index_stats) and is returned by
+pinecone_store.get_index when VECTOR_STORE_BACKEND=local, or for the
+namespaces in VECTOR_STORE_LOCAL_NAMESPACES.
+
+Search is an exact scan, or IVF once a namespace holds LOCAL_IVF_MIN_VECTORS
+rows: sqrt(n) k-means centroids, and only the rows of the LOCAL_IVF_NPROBE
+nearest lists are scored. Filters become a row mask: $eq/$in (all that
+utils.filter.build_pinecone_filter_from_issue emits, under $and/$or) come from
+per-field postings, other operators from utils.filter.metadata_matches. If IVF
+candidates leave fewer than top_k rows after filtering, the query falls back
+to an exact scan of the matching rows.
+"""
+import os
+import json
+import math
+import shutil
+import threading
+from urllib.parse import quote, unquote
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utils.filter import metadata_matches
+from utils.settings import env_int
+
+
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", os.path.join(".cache", "vectors"))
+# auto: exact scan below LOCAL_IVF_MIN_VECTORS, IVF above; or force "brute" / "ivf"
+LOCAL_VECTOR_SEARCH = os.getenv("LOCAL_VECTOR_SEARCH", "auto").lower()
+LOCAL_IVF_MIN_VECTORS = env_int("LOCAL_IVF_MIN_VECTORS", 20000)
+LOCAL_IVF_NPROBE = env_int("LOCAL_IVF_NPROBE", 32, minimum=1)
+
+LIST_PAGE_SIZE = 100
+_INITIAL_CAPACITY = 1024
+_ASSIGN_BATCH = 65536
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 64
+# meta.log lines tolerated before compaction, at least (more for larger namespaces)
+_MIN_LOG_ENTRIES = 10000
+
+
+def _normalize(block: np.ndarray) -> np.ndarray:
+    block = np.array(np.atleast_2d(block), dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    block /= norms
+    return block
+
+
+def _dirname(namespace: str) -> str:
+    return quote(namespace, safe="") or "__default__"
+
+
+def _namespace_of(dirname: str) -> str:
+    return "" if dirname == "__default__" else unquote(dirname)
+
+
+class Record(NamedTuple):
+    id: str
+    values: List[float]
+    metadata: Dict[str, Any]
+
+
+class FetchResponse(NamedTuple):
+    vectors: Dict[str, Record]
+
+
+class LocalNamespace:
+    """Rows, ids and metadata of one namespace, with an optional IVF partition."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dimension: Optional[int] = None
+        self._size = 0
+        self._capacity = 0
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.RLock()
+
+        # IVF state: centroids, list id per row, and rows grouped by list
+        self._centroids: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+        self._lists: Optional[tuple] = None
+        self._trained_size = 0
+        self._training = False
+        # Bumped when rows change in place, so a concurrent training run reassigns them
+        self._rewrites = 0
+        # field -> value -> rows, for $eq/$in filters
+        self._postings: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._log_entries = 0
+
+        self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ---- Storage ----
+
+    def _open(self, capacity: int) -> None:
+        """(Re)map vectors.f32 with room for `capacity` rows."""
+        path = os.path.join(self.directory, "vectors.f32")
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self._capacity = capacity
+        if self._assign is not None and len(self._assign) < capacity:
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:self._size] = self._assign[:self._size]
+            self._assign = grown
+
+    def _load(self) -> None:
+        """Read the meta.json snapshot, then replay meta.log on top of it."""
+        meta_path = os.path.join(self.directory, "meta.json")
+        log_path = os.path.join(self.directory, "meta.log")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dimension = meta["dimension"]
+            self._ids = meta["ids"]
+            self._metadata = meta["metadata"]
+            self._size = len(self._ids)
+            self._positions = {vid: i for i, vid in enumerate(self._ids)}
+        if os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line of an interrupted write
+                    if "dimension" in entry:
+                        self.dimension = entry["dimension"]
+                    elif "metadata" in entry:
+                        self._put(entry["id"], entry["metadata"])
+                    else:
+                        self._remove(entry["id"])
+                    self._log_entries += 1
+        if self.dimension is not None:
+            path = os.path.join(self.directory, "vectors.f32")
+            on_disk = os.path.getsize(path) // (4 * self.dimension) if os.path.exists(path) else 0
+            self._open(max(on_disk, self._size, _INITIAL_CAPACITY))
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        """Persist one write batch: rows first, then its log lines; compact when the log has grown."""
+        self._matrix.flush()
+        if self._log_entries + len(entries) > max(_MIN_LOG_ENTRIES, self._size):
+            self._compact()
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "meta.log"), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._log_entries += len(entries)
+
+    def _compact(self) -> None:
+        """Rewrite meta.json from memory and start an empty meta.log."""
+        path = os.path.join(self.directory, "meta.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "ids": self._ids, "metadata": self._metadata}, f)
+        os.replace(tmp, path)
+        with open(os.path.join(self.directory, "meta.log"), "w", encoding="utf-8"):
+            pass
+        self._log_entries = 0
+
+    def _put(self, vid: str, metadata: Dict[str, Any]) -> int:
+        """Row of `vid`, appended if new; metadata replaced either way."""
+        pos = self._positions.get(vid)
+        if pos is None:
+            pos = self._size
+            self._ids.append(vid)
+            self._metadata.append(metadata)
+            self._positions[vid] = pos
+            self._size += 1
+        else:
+            self._metadata[pos] = metadata
+            self._rewrites += 1
+        return pos
+
+    def _remove(self, vid: str) -> bool:
+        """Drop `vid`, moving the last row into the hole. The caller moves the vector."""
+        pos = self._positions.pop(vid, None)
+        if pos is None:
+            return False
+        last = self._size - 1
+        self._rewrites += 1
+        if pos != last:
+            if self._matrix is not None:
+                self._matrix[pos] = self._matrix[last]
+            self._ids[pos] = self._ids[last]
+            self._metadata[pos] = self._metadata[last]
+            self._positions[self._ids[pos]] = pos
+            if self._assign is not None:
+                self._assign[pos] = self._assign[last]
+        self._ids.pop()
+        self._metadata.pop()
+        self._size -= 1
+        return True
+
+    # ---- Writes ----
+
+    def upsert(self, ids: Sequence[str], values, metadatas: Sequence[Dict[str, Any]]) -> int:
+        if not ids:
+            return 0
+        block = _normalize(np.asarray(values, dtype=np.float32))
+        with self._lock:
+            entries: List[Dict[str, Any]] = []
+            if self.dimension is None:
+                self.dimension = block.shape[1]
+                entries.append({"dimension": self.dimension})
+            if block.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Vector dimension {block.shape[1]} does not match namespace dimension {self.dimension}"
+                )
+            new = sum(1 for vid in dict.fromkeys(ids) if vid not in self._positions)
+            if self._matrix is None or self._size + new > self._capacity:
+                self._open(max(self._size + new, 2 * self._capacity, _INITIAL_CAPACITY))
+
+            rows = np.empty(len(ids), dtype=np.int64)
+            for i, (vid, md) in enumerate(zip(ids, metadatas)):
+                rows[i] = self._put(vid, md or {})
+                entries.append({"id": vid, "metadata": md or {}})
+            self._matrix[rows] = block
+            self._postings = {}
+            if self._centroids is not None:
+                self._assign[rows] = self._nearest(block)
+                self._lists = None
+            self._append(entries)
+        return len(ids)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            removed = [{"id": vid} for vid in ids if self._remove(vid)]
+            self._lists = None
+            self._postings = {}
+            if self._matrix is not None and removed:
+                self._append(removed)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._matrix = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.dimension = None
+            self._size = self._capacity = 0
+            self._ids, self._metadata, self._positions = [], [], {}
+            self._centroids = self._assign = self._lists = None
+            self._trained_size = 0
+            self._rewrites += 1
+            self._postings = {}
+            self._log_entries = 0
+
+    # ---- Reads ----
+
+    def fetch(self, ids: Sequence[str]) -> Dict[str, Record]:
+        with self._lock:
+            out = {}
+            for vid in ids:
+                pos = self._positions.get(vid)
+                if pos is not None:
+                    out[vid] = Record(vid, self._matrix[pos].tolist(), self._metadata[pos])
+            return out
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._ids)
+
+    def query(
+        self, vector, top_k: int, filter: Dict[str, Any] | None = None, mode: str | None = None
+    ) -> List[Dict[str, Any]]:
+        q = _normalize(np.asarray(vector, dtype=np.float32).ravel())[0]
+        mode = mode or LOCAL_VECTOR_SEARCH
+        if mode == "ivf" and self._size and self._needs_training():
+            # Forced IVF waits for a partition, but trains outside the lock so writers go on
+            self._train()
+        with self._lock:
+            n = self._size
+            if n == 0 or top_k <= 0:
+                return []
+
+            keep = self._filter_mask(filter) if filter else None
+            rows = None
+            if (mode == "ivf" or (mode == "auto" and n >= LOCAL_IVF_MIN_VECTORS)) and self._ivf_ready():
+                rows = self._ivf_candidates(q)
+                if keep is not None:
+                    rows = rows[keep[rows]]
+                if len(rows) < top_k:
+                    rows = None  # Too few candidates: exact scan instead
+
+            if rows is None and keep is not None:
+                rows = np.flatnonzero(keep)
+
+            if rows is None:
+                scores = self._matrix[:n] @ q
+                rows = np.arange(n)
+            else:
+                scores = self._matrix[rows] @ q
+
+            k = min(top_k, len(rows))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self._ids[rows[i]], "score": float(scores[i]), "metadata": self._metadata[rows[i]]}
+                for i in top
+            ]
+
+    # ---- Filters ----
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        """
+        Boolean mask over all rows. $eq/$in clauses are answered from per-field
+        postings, built on first use and dropped on writes; any other operator
+        is evaluated row by row with metadata_matches.
+        """
+        n = self._size
+        mask = np.ones(n, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._filter_mask(sub)
+            elif key == "$or":
+                any_of = np.zeros(n, dtype=bool)
+                for sub in condition:
+                    any_of |= self._filter_mask(sub)
+                mask &= any_of
+            else:
+                ops = condition if isinstance(condition, dict) else {"$eq": condition}
+                for op, operand in ops.items():
+                    if op == "$eq" and not isinstance(operand, (list, dict)):
+                        mask &= self._postings_mask(key, [operand])
+                    elif op == "$in" and isinstance(operand, list):
+                        mask &= self._postings_mask(key, operand)
+                    else:
+                        clause = {key: {op: operand}}
+                        mask &= np.fromiter(
+                            (metadata_matches(md, clause) for md in self._metadata), dtype=bool, count=n
+                        )
+        return mask
+
+    def _postings_mask(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        postings = self._postings.get(field)
+        if postings is None:
+            grouped: Dict[Any, List[int]] = {}
+            for i, md in enumerate(self._metadata):
+                value = md.get(field)
+                # List-valued metadata matches on any element, as in Pinecone
+                for v in value if isinstance(value, list) else [value]:
+                    if v is not None:
+                        grouped.setdefault(v, []).append(i)
+            postings = {v: np.asarray(rows, dtype=np.int64) for v, rows in grouped.items()}
+            self._postings[field] = postings
+        mask = np.zeros(self._size, dtype=bool)
+        for v in values:
+            rows = postings.get(v)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    # ---- IVF ----
+
+    def _nearest(self, block: np.ndarray, centroids: np.ndarray | None = None) -> np.ndarray:
+        centroids = self._centroids if centroids is None else centroids
+        out = np.empty(len(block), dtype=np.int32)
+        for start in range(0, len(block), _ASSIGN_BATCH):
+            part = np.asarray(block[start:start + _ASSIGN_BATCH])
+            out[start:start + len(part)] = np.argmax(part @ centroids.T, axis=1)
+        return out
+
+    def _train(self) -> None:
+        """
+        Spherical k-means on a sample, then list assignment for every row. The
+        heavy work runs without the lock; rows added meanwhile are assigned
+        afterwards, and everything is reassigned if rows were rewritten in place.
+        """
+        with self._lock:
+            n = self._size
+            rewrites = self._rewrites
+            nlist = max(1, int(math.sqrt(n)))
+            rng = np.random.default_rng(0)
+            picks = np.sort(rng.choice(n, min(n, nlist * _KMEANS_SAMPLE_PER_LIST), replace=False))
+            sample = np.asarray(self._matrix[picks])
+            matrix = self._matrix
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            one_hot = np.zeros((len(sample), nlist), dtype=np.float32)
+            one_hot[np.arange(len(sample)), labels] = 1.0
+            sums = one_hot.T @ sample
+            filled = one_hot.sum(axis=0) > 0
+            centroids[filled] = _normalize(sums[filled])
+        assign = self._nearest(matrix[:n], centroids)
+
+        with self._lock:
+            if self._matrix is None:
+                return  # Dropped while training
+            if self._rewrites != rewrites or matrix is not self._matrix:
+                n, assign = 0, np.empty(0, dtype=np.int32)
+            full = np.zeros(self._capacity, dtype=np.int32)
+            full[:n] = assign
+            full[n:self._size] = self._nearest(self._matrix[n:self._size], centroids)
+            self._centroids, self._assign = centroids, full
+            self._trained_size = self._size
+            self._lists = None
+
+    def _train_in_background(self) -> None:
+        try:
+            self._train()
+        except Exception as e:
+            print(f"⚠️ IVF training for '{self.directory}' failed: {e}")
+        finally:
+            self._training = False
+
+    def _needs_training(self) -> bool:
+        """A missing or outgrown partition (the namespace doubled since training)."""
+        return self._centroids is None or self._size > 2 * self._trained_size
+
+    def _ivf_ready(self) -> bool:
+        """
+        Whether IVF can serve a query. A partition that needs training is rebuilt
+        in a background thread while the caller scans exactly (or keeps the old one).
+        """
+        if self._needs_training() and not self._training:
+            self._training = True
+            threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True).start()
+        return self._centroids is not None
+
+    def _ivf_candidates(self, q: np.ndarray) -> np.ndarray:
+        if self._lists is None:
+            assign = self._assign[:self._size]
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+        nprobe = min(LOCAL_IVF_NPROBE, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+        return np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+
+
+class LocalIndex:
+    """Directory of LocalNamespaces answering the pinecone.Index calls the app makes."""
+
+    def __init__(self, name: str, root: str = LOCAL_VECTOR_STORE_PATH):
+        self.name = name
+        self.directory = os.path.join(root, name)
+        self.dimension: Optional[int] = None
+        self._namespaces: Dict[str, LocalNamespace] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, entry)
+            if os.path.isdir(path):
+                ns = LocalNamespace(path)
+                self._namespaces[_namespace_of(entry)] = ns
+                self.dimension = self.dimension or ns.dimension
+
+    def _namespace(self, namespace: str | None) -> LocalNamespace:
+        namespace = namespace or ""
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            with self._lock:
+                ns = self._namespaces.get(namespace)
+                if ns is None:
+                    ns = LocalNamespace(os.path.join(self.directory, _dirname(namespace)))
+                    self._namespaces[namespace] = ns
+        return ns
+
+    def ensure_dimension(self, dimension: int) -> None:
+        if self.dimension is None:
+            self.dimension = dimension
+        elif self.dimension != dimension:
+            raise ValueError(
+                f"Local index '{self.name}' holds dimension {self.dimension}, but app expects {dimension}. "
+                f"Delete {self.directory} to recreate it, or migrate the namespace with POST /pinecone/migrations."
+            )
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> Dict[str, int]:
+        count = self._namespace(namespace).upsert(
+            [v["id"] for v in vectors], [v["values"] for v in vectors], [v.get("metadata") for v in vectors]
+        )
+        self.dimension = self.dimension or self._namespace(namespace).dimension
+        return {"upserted_count": count}
+
+    def query(
+        self,
+        vector,
+        top_k: int = 10,
+        namespace: str = "",
+        filter: Dict[str, Any] | None = None,
+        include_metadata: bool = True,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        matches = self._namespace(namespace).query(vector, top_k, filter)
+        if not include_metadata:
+            matches = [{"id": m["id"], "score": m["score"]} for m in matches]
+        return {"matches": matches, "namespace": namespace}
+
+    def fetch(self, ids: Sequence[str], namespace: str = "") -> FetchResponse:
+        return FetchResponse(self._namespace(namespace).fetch(ids))
+
+    def list(self, namespace: str = "", prefix: str | None = None, limit: int = LIST_PAGE_SIZE) -> Iterator[List[str]]:
+        ids = [vid for vid in self._namespace(namespace).ids() if not prefix or vid.startswith(prefix)]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def delete(
+        self, ids: Sequence[str] | None = None, delete_all: bool = False, namespace: str = "", **kwargs: Any
+    ) -> Dict[str, Any]:
+        ns = self._namespace(namespace)
+        if delete_all:
+            ns.drop()
+        elif ids:
+            ns.delete(ids)
+        return {}
+
+    def describe_index_stats(self, **kwargs: Any) -> Dict[str, Any]:
+        namespaces = {name: {"vector_count": len(ns)} for name, ns in list(self._namespaces.items()) if len(ns)}
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(v["vector_count"] for v in namespaces.values()),
+        }
+
+
+_indexes: Dict[str, LocalIndex] = {}
+_lock = threading.Lock()
+
+
+def get_local_index(name: str) -> LocalIndex:
+    """Process-wide LocalIndex for `name`, opened from disk on first use."""
+    index = _indexes.get(name)
+    if index is None:
+        with _lock:
+            index = _indexes.get(name)
+            if index is None:
+                index = LocalIndex(name)
+                _indexes[name] = index
+    return index
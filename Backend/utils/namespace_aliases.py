@@ -0,0 +1,70 @@
+# utils/namespace_aliases.py
+"""
+Logical namespace -> physical (index, namespace) aliases.
+
+Callers keep using the logical names ("mongodb-files", "postgresql-data", ...);
+after an embedding migration cuts over, the alias points them at the shadow
+namespace (possibly in another index). Aliases persist to NAMESPACE_ALIASES_PATH
+together with the embedding model of the target, and are swapped atomically:
+readers see either the old or the new target.
+"""
+import os
+import json
+import threading
+from typing import Dict, NamedTuple, Optional
+
+
+NAMESPACE_ALIASES_PATH = os.getenv("NAMESPACE_ALIASES_PATH", ".cache/namespace_aliases.json")
+
+
+class Target(NamedTuple):
+    index: Optional[str]  # None = the default index (PINECONE_INDEX)
+    namespace: str
+    model: Optional[str] = None  # Model the target was embedded with (None = registry default)
+    dimension: Optional[int] = None
+
+
+_aliases: Dict[str, Target] | None = None
+_lock = threading.Lock()
+
+
+def _load() -> Dict[str, Target]:
+    global _aliases
+    if _aliases is None:
+        with _lock:
+            if _aliases is None:
+                aliases: Dict[str, Target] = {}
+                if os.path.exists(NAMESPACE_ALIASES_PATH):
+                    with open(NAMESPACE_ALIASES_PATH, "r", encoding="utf-8") as f:
+                        for name, target in json.load(f).items():
+                            aliases[name] = Target(
+                                target.get("index"), target["namespace"], target.get("model"), target.get("dimension")
+                            )
+                _aliases = aliases
+    return _aliases
+
+
+def resolve(namespace: str) -> Target:
+    """Physical target for a logical namespace (itself, in the default index, if unaliased)."""
+    return _load().get(namespace) or Target(None, namespace)
+
+
+def set_alias(namespace: str, target: Target) -> None:
+    """Point `namespace` at `target`, persisting before it takes effect."""
+    global _aliases
+    _load()
+    with _lock:
+        updated = {**_aliases, namespace: target}
+        directory = os.path.dirname(NAMESPACE_ALIASES_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{NAMESPACE_ALIASES_PATH}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: t._asdict() for k, t in updated.items()}, f, indent=2)
+        os.replace(tmp, NAMESPACE_ALIASES_PATH)
+        # Rebinding the dict is atomic for readers
+        _aliases = updated
+
+
+def aliases() -> Dict[str, Dict[str, object]]:
+    return {k: t._asdict() for k, t in _load().items()}
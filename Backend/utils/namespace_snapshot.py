@@ -0,0 +1,236 @@
+# utils/namespace_snapshot.py
+"""
+Export a namespace (ids, vectors, metadata and chunk text) to local columnar
+files and restore it into any backend without re-embedding.
+
+A snapshot is a directory with snapshot.json (namespace, dimension, embedding
+model, row count, part files) and parts of at most SNAPSHOT_PART_ROWS rows:
+Parquet (id, values as fixed-size float32 lists, metadata as JSON) when
+pyarrow is installed, otherwise NPZ with the same three columns, the strings
+stored as one UTF-8 byte blob plus offsets (a fixed-width numpy string array
+would pad every row to the longest metadata). Export pages
+through the namespace with list + fetch, so memory stays bounded by one part;
+restore reads one Parquet row group (or NPZ part) at a time and hands it to
+upsert_chunks, which sends batches in parallel and refills the chunk store and
+lexical index from the "text" metadata.
+"""
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from utils import pinecone_store
+from utils.chunk_store import texts_for
+from utils.embedding_provider import get_provider
+from utils.rate_limiter import call_with_retries
+from utils.settings import env_int, FETCH_BATCH_SIZE
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # NPZ only
+    pa = None
+    pq = None
+
+
+SNAPSHOT_PART_ROWS = env_int("SNAPSHOT_PART_ROWS", 20000, minimum=1)
+SNAPSHOT_FETCH_CONCURRENCY = env_int("SNAPSHOT_FETCH_CONCURRENCY", 4, minimum=1)
+
+MANIFEST_NAME = "snapshot.json"
+# Rows per Parquet row group, i.e. per upsert_chunks call on restore
+ROW_GROUP_ROWS = 2000
+
+Row = Tuple[str, np.ndarray, Dict[str, Any]]
+
+
+def default_format() -> str:
+    return "parquet" if pq is not None else "npz"
+
+
+# ---- Export ----
+
+def _fetch_rows(index, physical: str, namespace: str, ids: List[str]) -> List[Row]:
+    res = call_with_retries("pinecone-fetch", index.fetch, ids=ids, namespace=physical)
+    records = [res.vectors[vid] for vid in ids if vid in res.vectors]
+    stored = texts_for(namespace, [r.id for r in records if not (r.metadata or {}).get("text")])
+    rows = []
+    for r in records:
+        md = dict(r.metadata or {})
+        if not md.get("text") and r.id in stored:
+            md["text"] = stored[r.id]
+        rows.append((r.id, np.asarray(r.values, dtype=np.float32), md))
+    return rows
+
+
+def iter_rows(namespace: str) -> Iterator[Row]:
+    """(id, float32 values, metadata with text) for every vector of a logical namespace."""
+    index, physical = pinecone_store.physical_target(namespace)
+
+    def batches() -> Iterator[List[str]]:
+        for id_page in index.list(namespace=physical):
+            ids = list(id_page)
+            for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                yield ids[start:start + FETCH_BATCH_SIZE]
+
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_FETCH_CONCURRENCY, thread_name_prefix="snapshot") as pool:
+        pending = []
+        for ids in batches():
+            pending.append(pool.submit(_fetch_rows, index, physical, namespace, ids))
+            if len(pending) >= SNAPSHOT_FETCH_CONCURRENCY:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """UTF-8 blob and n + 1 offsets; string i is blob[offsets[i]:offsets[i + 1]]."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _write_part(path: str, rows: List[Row], fmt: str) -> None:
+    ids = [vid for vid, _, _ in rows]
+    values = np.stack([v for _, v, _ in rows]).astype(np.float32, copy=False)
+    metadata = [json.dumps(md, ensure_ascii=False) for _, _, md in rows]
+    if fmt == "parquet":
+        dim = values.shape[1]
+        table = pa.table({
+            "id": pa.array(ids, pa.string()),
+            "values": pa.FixedSizeListArray.from_arrays(pa.array(values.ravel(), pa.float32()), dim),
+            "metadata": pa.array(metadata, pa.string()),
+        })
+        pq.write_table(table, path, row_group_size=ROW_GROUP_ROWS)
+    else:
+        id_blob, id_offsets = _pack_strings(ids)
+        metadata_blob, metadata_offsets = _pack_strings(metadata)
+        np.savez(
+            path, values=values, id_blob=id_blob, id_offsets=id_offsets,
+            metadata_blob=metadata_blob, metadata_offsets=metadata_offsets,
+        )
+
+
+def export_namespace(
+    namespace: str,
+    directory: str,
+    fmt: str | None = None,
+    part_rows: int = SNAPSHOT_PART_ROWS,
+    on_progress: Callable[[int], None] | None = None,
+) -> Dict[str, Any]:
+    """Write `namespace` to `directory`; returns the snapshot manifest."""
+    fmt = fmt or default_format()
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Parquet snapshots need pyarrow; install it or use --format npz")
+    if fmt not in ("parquet", "npz"):
+        raise ValueError(f"Unknown snapshot format '{fmt}' (expected parquet or npz)")
+    os.makedirs(directory, exist_ok=True)
+
+    spec = get_provider().spec_for(namespace)
+    parts: List[str] = []
+    count = 0
+    dimension = None
+    rows: List[Row] = []
+
+    def flush() -> None:
+        name = f"part-{len(parts):05d}.{fmt}"
+        _write_part(os.path.join(directory, name), rows, fmt)
+        parts.append(name)
+        rows.clear()
+
+    for row in iter_rows(namespace):
+        if dimension is None:
+            dimension = len(row[1])
+        rows.append(row)
+        count += 1
+        if len(rows) >= part_rows:
+            flush()
+            if on_progress:
+                on_progress(count)
+    if rows:
+        flush()
+        if on_progress:
+            on_progress(count)
+
+    manifest = {
+        "namespace": namespace,
+        "format": fmt,
+        "count": count,
+        "dimension": dimension or spec.dimension,
+        "model": spec.model,
+        "created_at": time.time(),
+        "parts": parts,
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ---- Restore ----
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_batches(directory: str, manifest: Dict[str, Any] | None = None) -> Iterator[List[Row]]:
+    """Snapshot rows, one Parquet row group or NPZ part at a time."""
+    manifest = manifest or read_manifest(directory)
+    for name in manifest["parts"]:
+        path = os.path.join(directory, name)
+        if manifest["format"] == "parquet":
+            if pq is None:
+                raise RuntimeError("This snapshot is Parquet; install pyarrow to restore it")
+            parquet = pq.ParquetFile(path)
+            for group in range(parquet.num_row_groups):
+                table = parquet.read_row_group(group)
+                values = table.column("values").combine_chunks().flatten().to_numpy()
+                values = values.reshape(table.num_rows, -1)
+                yield [
+                    (vid, values[i], json.loads(md))
+                    for i, (vid, md) in enumerate(zip(table.column("id").to_pylist(), table.column("metadata").to_pylist()))
+                ]
+        else:
+            with np.load(path) as part:
+                values = part["values"]
+                if "metadata_blob" in part:
+                    ids = _unpack_strings(part["id_blob"], part["id_offsets"])
+                    metadata = _unpack_strings(part["metadata_blob"], part["metadata_offsets"])
+                else:  # Parts written with numpy string arrays
+                    ids, metadata = [str(vid) for vid in part["id"]], [str(md) for md in part["metadata"]]
+                yield [(vid, values[i], json.loads(md)) for i, (vid, md) in enumerate(zip(ids, metadata))]
+
+
+def restore_namespace(
+    directory: str,
+    namespace: str | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Upsert a snapshot into `namespace` (default: the one it was taken from).
+    Returns the number of vectors upserted.
+    """
+    manifest = read_manifest(directory)
+    namespace = namespace or manifest["namespace"]
+    spec = get_provider().spec_for(namespace)
+    if spec.model != manifest["model"]:
+        print(
+            f"⚠️ Snapshot was embedded with '{manifest['model']}' but '{namespace}' queries with "
+            f"'{spec.model}'; search quality will suffer until the models match"
+        )
+    pinecone_store.ensure_index(manifest["dimension"], namespace=namespace)
+
+    restored = 0
+    for batch in iter_batches(directory, manifest):
+        restored += pinecone_store.upsert_chunks(batch, namespace=namespace)
+        if on_progress:
+            on_progress(restored, manifest["count"])
+    return restored
@@ -0,0 +1,207 @@
+# utils/namespace_stats.py
+"""
+Background-refreshed vector counts and dimensions per logical namespace.
+
+Retrieval used to call describe_index_stats() on every request just to learn
+which namespaces exist. This cache asks once, then refreshes in a daemon
+thread every NAMESPACE_STATS_REFRESH_SECONDS, and sooner after upserts and
+deletes (pinecone_store tells it about every write; the refresh waits
+NAMESPACE_STATS_WRITE_DELAY seconds, since Pinecone's stats lag writes and
+bursts of batches should coalesce into one call). Between refreshes, write
+deltas are applied to the cached counts so a namespace that just received its
+first vectors is routable at once; it stays routable until the stats show its
+vectors (or NAMESPACE_STATS_REFRESH_SECONDS pass).
+
+Namespaces are reported under their logical names: aliased namespaces take the
+stats of their target (possibly in another index), and physical shadow
+namespaces of embedding migrations are left out.
+"""
+import time
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from utils import pinecone_store
+from utils.embedding_migration import SHADOW_SEPARATOR
+from utils.local_vector_store import get_local_index
+from utils.namespace_aliases import aliases as namespace_aliases
+from utils.settings import env_float, env_flag
+
+
+NAMESPACE_STATS_ENABLED = env_flag("NAMESPACE_STATS_ENABLED")
+NAMESPACE_STATS_REFRESH_SECONDS = env_float("NAMESPACE_STATS_REFRESH_SECONDS", 60.0, minimum=1.0)
+NAMESPACE_STATS_WRITE_DELAY = env_float("NAMESPACE_STATS_WRITE_DELAY", 2.0, minimum=0.0)
+
+
+class NamespaceInfo(NamedTuple):
+    vector_count: int
+    dimension: Optional[int]
+    index: Optional[str]  # None = the default index
+
+
+def _describe(index) -> tuple:
+    """(dimension, {physical namespace: vector count}) of one index handle."""
+    stats = index.describe_index_stats()
+    counts = {
+        ns: int(summary.get("vector_count", 0) or 0)
+        for ns, summary in (stats.get("namespaces") or {}).items()
+    }
+    return stats.get("dimension"), counts
+
+
+def collect() -> Dict[str, NamespaceInfo]:
+    """Fresh stats for every logical namespace (one describe_index_stats per index involved)."""
+    described: Dict[Optional[str], tuple] = {}
+
+    def index_stats(name: Optional[str]) -> tuple:
+        if name not in described:
+            described[name] = _describe(pinecone_store.get_index(name))
+        return described[name]
+
+    dimension, counts = index_stats(None)
+    out = {
+        ns: NamespaceInfo(count, dimension, None)
+        for ns, count in counts.items()
+        if SHADOW_SEPARATOR not in ns
+    }
+
+    if pinecone_store.LOCAL_NAMESPACES and pinecone_store.VECTOR_STORE_BACKEND != "local":
+        local_dim, local_counts = _describe(get_local_index(pinecone_store.INDEX_NAME or "local"))
+        for ns in pinecone_store.LOCAL_NAMESPACES:
+            out[ns] = NamespaceInfo(local_counts.get(ns, 0), local_dim, None)
+
+    for logical, target in namespace_aliases().items():
+        if logical in pinecone_store.LOCAL_NAMESPACES:
+            continue
+        dim, target_counts = index_stats(target.get("index"))
+        out[logical] = NamespaceInfo(target_counts.get(target["namespace"], 0), dim, target.get("index"))
+    return out
+
+
+class NamespaceStatsCache:
+    """Last known NamespaceInfo per logical namespace, kept fresh by a daemon thread."""
+
+    def __init__(self, refresh_seconds: float = NAMESPACE_STATS_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.refreshed_at: float | None = None
+        self.refreshes = 0
+        self.write_refreshes = 0
+        self.last_error: str | None = None
+        self._stats: Dict[str, NamespaceInfo] = {}
+        self._written: Dict[str, float] = {}  # namespace -> time of the last upsert noted
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---- Refresh ----
+
+    def refresh(self) -> Dict[str, NamespaceInfo]:
+        """Replace the cached stats with fresh ones; raises if describe_index_stats fails."""
+        with self._refresh_lock:
+            stats = collect()
+            with self._lock:
+                # Stats lag upserts: keep a just-written namespace routable until they catch up
+                now = time.monotonic()
+                for ns, written in list(self._written.items()):
+                    cached = self._stats.get(ns)
+                    if now - written > self.refresh_seconds or ns not in self._stats:
+                        del self._written[ns]
+                    elif stats.get(ns, cached).vector_count == 0 and cached.vector_count > 0:
+                        stats[ns] = cached
+                        self._wake.set()
+                    else:
+                        del self._written[ns]
+                self._stats = stats
+                self.refreshed_at = time.time()
+                self.refreshes += 1
+                self.last_error = None
+        return stats
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="namespace-stats", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            woken = self._wake.wait(self.refresh_seconds)
+            if woken:
+                time.sleep(NAMESPACE_STATS_WRITE_DELAY)
+                self._wake.clear()
+                self.write_refreshes += 1
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ Namespace stats refresh failed; keeping the last snapshot: {e}")
+
+    def note_write(self, namespace: str, delta: int | None) -> None:
+        """Apply a write to the cached count and schedule an early refresh."""
+        with self._lock:
+            info = self._stats.get(namespace)
+            if delta is None:
+                count = 0
+            else:
+                count = max(0, (info.vector_count if info else 0) + delta)
+            if delta is None:
+                self._written.pop(namespace, None)
+            elif delta > 0:
+                self._written[namespace] = time.monotonic()
+            self._stats = {
+                **self._stats,
+                namespace: NamespaceInfo(count, info.dimension if info else None, info.index if info else None),
+            }
+        self._wake.set()
+
+    # ---- Reads ----
+
+    def snapshot(self) -> Dict[str, NamespaceInfo]:
+        """
+        Cached stats, refreshing synchronously on first use (then in the
+        background). If that first refresh fails the error propagates.
+        """
+        if self.refreshed_at is None:
+            self.refresh()
+            self.start()
+        return self._stats
+
+    def namespaces(self, min_vectors: int = 1) -> List[str]:
+        """Logical namespaces holding at least `min_vectors` vectors."""
+        return [ns for ns, info in self.snapshot().items() if info.vector_count >= min_vectors]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "refresh_seconds": self.refresh_seconds,
+            "refreshed_at": self.refreshed_at,
+            "refreshes": self.refreshes,
+            "write_refreshes": self.write_refreshes,
+            "last_error": self.last_error,
+            "namespaces": {ns: info._asdict() for ns, info in sorted(self._stats.items())},
+        }
+
+
+_cache: NamespaceStatsCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_namespace_stats() -> NamespaceStatsCache | None:
+    """Process-wide cache, or None when NAMESPACE_STATS_ENABLED is off."""
+    global _cache
+    if not NAMESPACE_STATS_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NamespaceStatsCache()
+                pinecone_store.register_write_listener(_cache.note_write)
+    return _cache
+
+
+def namespace_stats() -> Dict[str, Any]:
+    cache = get_namespace_stats()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
@@ -1,16 +1,60 @@
 
 import os
-from typing import List, Dict, Any, Tuple
+import json
+import time
+import heapq
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import List, Dict, Any, Callable, NamedTuple, Tuple, Sequence
+import numpy as np
 from pinecone import Pinecone, ServerlessSpec
 
+from utils.chunk_manifest import get_manifest
+from utils.chunk_store import get_chunk_store, split_bodies
+from utils.coarse_index import get_coarse_index
+from utils.lexical_index import get_lexical_index
+from utils.local_vector_store import get_local_index
+from utils.namespace_aliases import resolve as resolve_namespace
+from utils.rate_limiter import RATE_LIMIT_MAX_CONCURRENCY, call_with_retries
+from utils.settings import env_int, env_float, FETCH_BATCH_SIZE
+
 
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = os.getenv("PINECONE_INDEX")
+# PINECONE_INDEX_NAME is what the agents and .env use
+INDEX_NAME = os.getenv("PINECONE_INDEX") or os.getenv("PINECONE_INDEX_NAME")
+# "pinecone", or "local" for the on-disk store in utils/local_vector_store.py
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+if VECTOR_STORE_BACKEND not in ("pinecone", "local"):
+    raise RuntimeError(f"VECTOR_STORE_BACKEND must be 'pinecone' or 'local', got '{VECTOR_STORE_BACKEND}'")
+# Small namespaces served from the local store while the rest stay on Pinecone
+LOCAL_NAMESPACES = {
+    ns.strip() for ns in os.getenv("VECTOR_STORE_LOCAL_NAMESPACES", "").split(",") if ns.strip()
+}
 CLOUD = os.getenv("PINECONE_CLOUD", "aws")
 REGION = os.getenv("PINECONE_REGION", "us-east-1")
+# Upserts are split into requests of at most UPSERT_BATCH_SIZE vectors and
+# UPSERT_MAX_BATCH_BYTES of estimated JSON (Pinecone rejects requests over 2 MB)
+# and sent UPSERT_MAX_CONCURRENCY at a time. Vectors are converted to JSON-ready
+# lists one request at a time.
+UPSERT_BATCH_SIZE = min(1000, env_int("UPSERT_BATCH_SIZE", 100, minimum=1))
+UPSERT_MAX_BATCH_BYTES = env_int("UPSERT_MAX_BATCH_BYTES", 1_800_000)
+UPSERT_MAX_CONCURRENCY = env_int("UPSERT_MAX_CONCURRENCY", 8, minimum=1)
+QUERY_MAX_CONCURRENCY = env_int("QUERY_MAX_CONCURRENCY", 16, minimum=1)
+# Per-namespace budget when fanning a query out over several namespaces
+QUERY_NAMESPACE_TIMEOUT = env_float("QUERY_NAMESPACE_TIMEOUT", 5.0)
+# Pinecone accepts at most 1000 ids per delete request
+DELETE_BATCH_SIZE = 1000
+# Rough JSON size of one float32 value ("-0.0123456789," is ~14 characters)
+_BYTES_PER_VALUE = 14
+# How long a verified index description is trusted before ensure_index asks again
+INDEX_DESCRIPTION_TTL = env_float("PINECONE_INDEX_DESCRIPTION_TTL", 300.0)
 
 _pc: Pinecone | None = None
+_indexes: Dict[str, Any] = {}
+_descriptions: Dict[str, Tuple[float, int | None]] = {}  # name -> (expires_at, dimension)
+_lock = threading.Lock()
 
 def _get_pc() -> Pinecone:
     global _pc
@@ -21,58 +65,463 @@ def _get_pc() -> Pinecone:
     return _pc
 
 
-def ensure_index(dimension: int, metric: str = "cosine") -> None:
+def get_index(name: str | None = None):
+    """
+    Process-wide data-plane handle for `name` (default PINECONE_INDEX). Each handle
+    owns one keep-alive connection pool, so it is built once and reused by every call.
+    With VECTOR_STORE_BACKEND=local this is a LocalIndex with the same methods.
+    """
+    if VECTOR_STORE_BACKEND == "local":
+        return get_local_index(name or INDEX_NAME or "local")
+    name = name or INDEX_NAME
+    if not name:
+        raise RuntimeError("PINECONE_INDEX (or PINECONE_INDEX_NAME) not set")
+    index = _indexes.get(name)
+    if index is None:
+        with _lock:
+            index = _indexes.get(name)
+            if index is None:
+                index = _get_pc().Index(name, connection_pool_maxsize=RATE_LIMIT_MAX_CONCURRENCY)
+                _indexes[name] = index
+    return index
+
+
+def ensure_index(dimension: int, metric: str = "cosine", namespace: str | None = None, index_name: str | None = None) -> None:
     """
     Create the index if missing; verify dimension if it exists.
+    The index is `index_name`, or the one `namespace` is aliased to, or PINECONE_INDEX.
+    A verified description is cached for INDEX_DESCRIPTION_TTL seconds, so repeated
+    calls make no control-plane requests.
     Raises with a clear error if dimension mismatches (so you can recreate intentionally).
     """
-    pc = _get_pc()
-    names = [i.name for i in pc.list_indexes()]
-    if INDEX_NAME not in names:
-        pc.create_index(
-            name=INDEX_NAME,
-            dimension=dimension,
-            metric=metric,
-            spec=ServerlessSpec(cloud=CLOUD, region=REGION),
-        )
+    name = index_name or (resolve_namespace(namespace).index if namespace else None) or INDEX_NAME
+    if VECTOR_STORE_BACKEND == "local" or namespace in LOCAL_NAMESPACES:
+        get_local_index(name or "local").ensure_dimension(dimension)
         return
+    cached = _descriptions.get(name)
+    if cached is not None and cached[0] > time.monotonic():
+        idx_dim = cached[1]
+    else:
+        pc = _get_pc()
+        names = [i.name for i in pc.list_indexes()]
+        if name not in names:
+            pc.create_index(
+                name=name,
+                dimension=dimension,
+                metric=metric,
+                spec=ServerlessSpec(cloud=CLOUD, region=REGION),
+            )
+            _descriptions[name] = (time.monotonic() + INDEX_DESCRIPTION_TTL, dimension)
+            return
+
+        # Verify dimension if index already exists
+        desc = pc.describe_index(name)
+        idx_dim = getattr(desc, "dimension", None)
+        _descriptions[name] = (time.monotonic() + INDEX_DESCRIPTION_TTL, idx_dim)
 
-    # Verify dimension if index already exists
-    desc = pc.describe_index(INDEX_NAME)
-    idx_dim = getattr(desc, "dimension", None)
     if idx_dim and idx_dim != dimension:
         raise ValueError(
-            f"Pinecone index '{INDEX_NAME}' exists with dimension {idx_dim}, "
-            f"but app expects {dimension}. Recreate the index to match."
+            f"Pinecone index '{name}' exists with dimension {idx_dim}, "
+            f"but app expects {dimension}. Recreate the index to match, "
+            f"or migrate the namespace with POST /pinecone/migrations."
         )
 
 
-def upsert_chunks(vectors, namespace="default") -> int:
-    pc = _get_pc()
-    index = pc.Index(INDEX_NAME)
-    payload = [{"id": vid, "values": vals, "metadata": md} for vid, vals, md in vectors]
-    res = index.upsert(vectors=payload, namespace=namespace)
-    # Pinecone SDK may not return upsertedCount reliably; fallback to len(payload)
-    return len(payload)
+def physical_target(namespace: str):
+    """
+    (index handle, physical namespace) a logical namespace currently points at,
+    for callers that read or write the vectors directly (snapshots, migrations).
+    """
+    target = resolve_namespace(namespace)
+    if namespace in LOCAL_NAMESPACES:
+        return get_local_index(target.index or INDEX_NAME or "local"), target.namespace
+    return get_index(target.index), target.namespace
+
+
+def _to_wire(values: np.ndarray | Sequence[float]) -> List[float]:
+    """Convert a float32 row (or plain list) to the JSON list the SDK sends."""
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+class UpsertError(RuntimeError):
+    """Some upsert batches still failed after retries; `upserted` vectors were written."""
+
+    def __init__(self, message: str, upserted: int, failed: int, failed_ids: Sequence[str] = ()):
+        super().__init__(message)
+        self.upserted = upserted
+        self.failed = failed
+        self.failed_ids = list(failed_ids)  # ids of the batches that did not land
+
+
+def _estimate_bytes(vid: str, values, metadata: Dict[str, Any] | None) -> int:
+    size = len(vid) + len(values) * _BYTES_PER_VALUE + 32
+    if metadata:
+        size += len(json.dumps(metadata, default=str))
+    return size
+
+
+def plan_upsert_batches(
+    vectors: Sequence[tuple], max_items: int = UPSERT_BATCH_SIZE, max_bytes: int = UPSERT_MAX_BATCH_BYTES
+) -> List[Tuple[int, int]]:
+    """Split vectors into consecutive [start, end) ranges within the item and byte limits."""
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    size = 0
+    for i, (vid, values, md) in enumerate(vectors):
+        n = _estimate_bytes(vid, values, md)
+        if i > start and (i - start >= max_items or size + n > max_bytes):
+            ranges.append((start, i))
+            start, size = i, 0
+        size += n
+    if start < len(vectors):
+        ranges.append((start, len(vectors)))
+    return ranges
+
+
+def _upserted_count(response, sent: int) -> int:
+    count = getattr(response, "upserted_count", None)
+    if count is None and isinstance(response, dict):
+        count = response.get("upserted_count", response.get("upsertedCount"))
+    return int(count) if count is not None else sent
+
+
+_upsert_executor = ThreadPoolExecutor(max_workers=UPSERT_MAX_CONCURRENCY, thread_name_prefix="upsert")
+
+
+def upsert_batches(
+    index,
+    vectors: list,
+    namespace: str,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Send vectors in size-bounded batches, UPSERT_MAX_CONCURRENCY at a time, each
+    retried on throttling. Returns the upserted count Pinecone reported; raises
+    UpsertError if any batch still failed. This is the raw write to one physical
+    namespace: no side stores, dual writes or listeners (upsert_chunks adds those).
+    """
+    def send(rng: Tuple[int, int]) -> int:
+        payload = [
+            {"id": vid, "values": _to_wire(vals), "metadata": md}
+            for vid, vals, md in vectors[rng[0]:rng[1]]
+        ]
+        res = call_with_retries("pinecone-upsert", index.upsert, vectors=payload, namespace=namespace)
+        return _upserted_count(res, len(payload))
+
+    ranges = plan_upsert_batches(vectors)
+    if not ranges:
+        return 0
+    if len(ranges) == 1:
+        try:
+            upserted = send(ranges[0])
+        except Exception as e:
+            raise UpsertError(
+                f"Upserted 0 of {len(vectors)} vectors to '{namespace}'; the batch failed: {e}",
+                upserted=0,
+                failed=len(vectors),
+                failed_ids=[v[0] for v in vectors],
+            ) from e
+        if on_progress:
+            on_progress(upserted, len(vectors))
+        return upserted
+
+    upserted = 0
+    failed_ids: List[str] = []
+    errors: List[Exception] = []
+    futures = {_upsert_executor.submit(send, rng): rng for rng in ranges}
+    for future in as_completed(futures):
+        start, end = futures[future]
+        try:
+            upserted += future.result()
+        except Exception as e:
+            failed_ids.extend(v[0] for v in vectors[start:end])
+            errors.append(e)
+        if on_progress:
+            on_progress(upserted, len(vectors))
+
+    if errors:
+        raise UpsertError(
+            f"Upserted {upserted} of {len(vectors)} vectors to '{namespace}'; "
+            f"{len(errors)} of {len(ranges)} batches failed: {errors[0]}",
+            upserted=upserted,
+            failed=len(failed_ids),
+            failed_ids=failed_ids,
+        )
+    return upserted
+
+
+class DualWrite(NamedTuple):
+    upsert: Callable[[list], None]  # (id, values, metadata) tuples as given to upsert_chunks
+    delete: Callable[[List[str] | None], None]  # ids, or None for the whole namespace
+
+
+# Extra writers per logical namespace, e.g. a migration re-embedding into its shadow namespace
+_dual_writes: Dict[str, Dict[str, DualWrite]] = {}
+
+
+def register_dual_write(
+    namespace: str, key: str, upsert: Callable[[list], None], delete: Callable[[List[str] | None], None]
+) -> None:
+    """Mirror upserts and deletes of a logical namespace until unregister_dual_write."""
+    _dual_writes.setdefault(namespace, {})[key] = DualWrite(upsert, delete)
+
+
+def unregister_dual_write(namespace: str, key: str) -> None:
+    _dual_writes.get(namespace, {}).pop(key, None)
+
+
+# Callbacks told (namespace, vector count delta) after writes; None means the namespace was emptied
+_write_listeners: List[Callable[[str, int | None], None]] = []
+
+
+def register_write_listener(listener: Callable[[str, int | None], None]) -> None:
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
 
+def notify_write(namespace: str, delta: int | None) -> None:
+    """Tell the write listeners about a change; delta 0 means same count, different vectors."""
+    for listener in list(_write_listeners):
+        try:
+            listener(namespace, delta)
+        except Exception as e:
+            print(f"⚠️ Write listener for namespace '{namespace}' failed: {e}")
 
 
-def query(vector: List[float], top_k: int = 5, namespace: str = "default", filter: Dict[str, Any] | None = None):
+def _mirror(namespace: str, op: str, arg) -> None:
+    """Pass a landed write on to the namespace's dual writers; their failures are logged, not raised."""
+    for key, dual in list(_dual_writes.get(namespace, {}).items()):
+        try:
+            getattr(dual, op)(arg)
+        except Exception as e:
+            print(f"⚠️ Dual {op} '{key}' for namespace '{namespace}' failed: {e}")
+
+
+def _put_side_stores(namespace: str, vectors: list, bodies: List[Tuple[str, str]]) -> None:
+    """
+    Chunk text and lexical entries of vectors that have landed. Written after
+    the upsert, so a failed batch leaves no ids that the lexical path could
+    return; until then hydrate falls back to the metadata preview.
+    """
+    if bodies:
+        get_chunk_store().put(namespace, bodies)
+    lexical = get_lexical_index()
+    if lexical is not None:
+        lexical.put(namespace, [
+            (vid, md["text"], {k: v for k, v in md.items() if k != "text"})
+            for vid, _, md in vectors if md and md.get("text")
+        ])
+
+
+def upsert_chunks(vectors, namespace="default", on_progress: Callable[[int, int], None] | None = None) -> int:
+    """
+    Upsert (id, values, metadata) tuples. values may be float32 ndarray rows;
+    they are only turned into Python lists per request batch, right before sending.
+    A "text" metadata field is stored in the chunk side store instead of Pinecone,
+    and indexed lexically.
+    Batches are sent in parallel; on_progress(upserted, total) is called as they land.
+    Returns the number of vectors Pinecone reports as upserted.
+    """
+    vectors = list(vectors)
+    if not vectors:
+        return 0
+    index, physical = physical_target(namespace)
+    payload, bodies = split_bodies(vectors)
+    coarse = get_coarse_index(namespace)
+    try:
+        upserted = upsert_batches(index, payload, physical, on_progress)
+    except UpsertError as e:
+        # Some rows landed and some did not: side stores get only the landed ones,
+        # and the coarse copy is rebuilt from Pinecone
+        failed = set(e.failed_ids)
+        _put_side_stores(namespace, [v for v in vectors if v[0] not in failed], [b for b in bodies if b[0] not in failed])
+        if coarse is not None:
+            coarse.reset()
+        notify_write(namespace, e.upserted)
+        raise
+
+    _put_side_stores(namespace, vectors, bodies)
+    if coarse is not None:
+        coarse.add([v[0] for v in payload], [v[1] for v in payload], [v[2] for v in payload])
+    _mirror(namespace, "upsert", vectors)
+    notify_write(namespace, upserted)
+    return upserted
+
+
+def _fetch_values(index, ids: List[str], namespace: str) -> Dict[str, List[float]]:
+    res = call_with_retries("pinecone-fetch", index.fetch, ids=ids, namespace=namespace)
+    return {vid: rec.values for vid, rec in res.vectors.items()}
+
+
+def fetch_metadata(ids: Sequence[str], namespace: str) -> Dict[str, Dict[str, Any]]:
+    """Metadata of the given ids that exist, in one fetch per FETCH_BATCH_SIZE ids."""
+    index, physical = physical_target(namespace)
+    ids = list(ids)
+    out: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        res = call_with_retries("pinecone-fetch", index.fetch, ids=ids[start:start + FETCH_BATCH_SIZE], namespace=physical)
+        out.update({vid: dict(rec.metadata or {}) for vid, rec in res.vectors.items()})
+    return out
+
+
+def query(vector: np.ndarray | List[float], top_k: int = 5, namespace: str = "default", filter: Dict[str, Any] | None = None):
+    """
+    Top-k matches in `namespace`. Namespaces with a coarse index are answered
+    in-process when the low-dimension ranking is decisive, or by reranking a
+    fetched shortlist; everything else is a full-dimension Pinecone query.
+    """
+    index, physical = physical_target(namespace)
+    coarse = get_coarse_index(namespace)
+    if coarse is not None:
+        coarse.start_loading(lambda: index, physical)
+        result = coarse.search(vector, top_k, filter, fetch_full=lambda ids: _fetch_values(index, ids, physical))
+        if result is not None:
+            return result
 
-    pc = _get_pc()
-    index = pc.Index(INDEX_NAME)
     return index.query(
-        vector=vector,
+        vector=_to_wire(vector),
         top_k=top_k,
         include_metadata=True,
-        namespace=namespace,
+        namespace=physical,
         filter=filter or {},
     )
 
 
+class NamespaceQuery(NamedTuple):
+    namespace: str
+    vector: Any  # np.ndarray | List[float]
+    filter: Dict[str, Any] | None = None
+
+
+_query_executor = ThreadPoolExecutor(max_workers=QUERY_MAX_CONCURRENCY, thread_name_prefix="query")
+
+
+def _as_match(match, namespace: str) -> Dict[str, Any]:
+    """Plain dict for an SDK ScoredVector or a coarse-index match, tagged with its namespace."""
+    if isinstance(match, dict):
+        md = match.get("metadata") or {}
+        return {"id": match["id"], "score": match.get("score", 0.0), "metadata": md, "namespace": namespace}
+    return {
+        "id": match.id,
+        "score": match.score or 0.0,
+        "metadata": match.metadata or {},
+        "namespace": namespace,
+    }
+
+
+def _matches_of(result) -> list:
+    if isinstance(result, dict):
+        return result.get("matches", [])
+    return getattr(result, "matches", None) or []
+
+
+def merge_top_k(per_namespace: Dict[str, list], limit: int) -> List[Dict[str, Any]]:
+    """Global top-`limit` over per-namespace match lists with a bounded heap."""
+    candidates = (m for matches in per_namespace.values() for m in matches)
+    return heapq.nlargest(limit, candidates, key=lambda m: m["score"])
+
+
+def _collect(queries: List[NamespaceQuery], futures: list, done: set, limit: int) -> Dict[str, Any]:
+    per_namespace: Dict[str, list] = {}
+    status: Dict[str, str] = {}
+    for q, future in zip(queries, futures):
+        if future not in done:
+            status[q.namespace] = "timeout"
+            print(f"⚠️ Namespace '{q.namespace}' timed out; merging without it")
+            continue
+        try:
+            per_namespace[q.namespace] = [_as_match(m, q.namespace) for m in _matches_of(future.result())]
+            status[q.namespace] = "ok"
+        except Exception as e:
+            status[q.namespace] = f"error: {e}"
+            print(f"⚠️ Namespace '{q.namespace}' failed: {e}")
+    return {"matches": merge_top_k(per_namespace, limit), "namespaces": status}
+
+
+def _submit(queries: List[NamespaceQuery], top_k: int) -> list:
+    return [_query_executor.submit(query, q.vector, top_k, q.namespace, q.filter) for q in queries]
+
+
+def query_namespaces(
+    queries: List[NamespaceQuery],
+    top_k: int = 5,
+    limit: int | None = None,
+    timeout: float = QUERY_NAMESPACE_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Query every namespace at once (top_k each) and merge into the global top-`limit`
+    (default top_k). Namespaces that miss the timeout or fail are reported in
+    "namespaces" and left out, so latency tracks the slowest namespace, capped.
+    """
+    futures = _submit(queries, top_k)
+    done, _ = wait(futures, timeout=timeout)
+    return _collect(queries, futures, done, limit or top_k)
+
+
+async def aquery_namespaces(
+    queries: List[NamespaceQuery],
+    top_k: int = 5,
+    limit: int | None = None,
+    timeout: float = QUERY_NAMESPACE_TIMEOUT,
+) -> Dict[str, Any]:
+    """Async counterpart of query_namespaces; waits without blocking the event loop."""
+    futures = _submit(queries, top_k)
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures], timeout=timeout)
+    done = {f for f in futures if f.done()}
+    return _collect(queries, futures, done, limit or top_k)
+
+
+def list_ids(namespace: str, prefix: str | None = None) -> List[str]:
+    """Every vector id in `namespace` (optionally starting with `prefix`)."""
+    index, physical = physical_target(namespace)
+    ids: List[str] = []
+    for id_page in index.list(prefix=prefix, namespace=physical):
+        ids.extend(id_page)
+    return ids
+
+
+def delete_vectors(ids: Sequence[str], namespace: str) -> int:
+    """
+    Delete vectors by id, with their chunk text, lexical entries and coarse
+    rows. Returns the number of ids sent.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    index, physical = physical_target(namespace)
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        call_with_retries("pinecone-delete", index.delete, ids=ids[start:start + DELETE_BATCH_SIZE], namespace=physical)
+    coarse = get_coarse_index(namespace)
+    if coarse is not None:
+        coarse.remove(ids)
+    store = get_chunk_store()
+    if store is not None:
+        store.delete(namespace, ids)
+    lexical = get_lexical_index()
+    if lexical is not None:
+        lexical.delete(namespace, ids)
+    _mirror(namespace, "delete", ids)
+    notify_write(namespace, -len(ids))
+    return len(ids)
+
+
 def delete_namespace(namespace: str) -> int:
     """Delete all vectors from a specific namespace."""
-    pc = _get_pc()
-    index = pc.Index(INDEX_NAME)
-    res = index.delete(delete_all=True, namespace=namespace)
+    index, physical = physical_target(namespace)
+    res = index.delete(delete_all=True, namespace=physical)
+    coarse = get_coarse_index(namespace)
+    if coarse is not None:
+        coarse.clear()
+    store = get_chunk_store()
+    if store is not None:
+        store.delete(namespace)
+    lexical = get_lexical_index()
+    if lexical is not None:
+        lexical.delete(namespace)
+    get_manifest().delete(namespace)
+    _mirror(namespace, "delete", None)
+    notify_write(namespace, None)
     return res
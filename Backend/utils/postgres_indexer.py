@@ -8,12 +8,19 @@ This enables semantic search across structured database data.
 import os
 from typing import List, Dict, Any, Optional
 from utils.postgres import execute_query, get_tables
-from utils.embedding import embed_texts
+from utils.embedding import embed_texts, embed_texts_with_usage
 from utils.pinecone_store import upsert_chunks
+from utils.chunk_store import hydrate
+from utils.chunk_manifest import chunk_hash, get_manifest
 from datetime import datetime, timezone
 import json
 
 
+def table_manifest_key(table_name: str) -> str:
+    """Manifest file_id under which a table's current index run is recorded."""
+    return f"pg_{table_name}"
+
+
 def table_row_to_text(row: Dict[str, Any], table_name: str) -> str:
     """
     Convert a database row to a text representation for embedding.
@@ -119,6 +126,7 @@ def index_table_to_pinecone(
                 'rows_processed': 0,
                 'chunks_created': 0,
                 'vectors_upserted': 0,
+                'tokens_embedded': 0,
                 'message': 'No data found in table'
             }
         
@@ -129,7 +137,7 @@ def index_table_to_pinecone(
         texts = [chunk['text'] for chunk in chunks]
         
         # Generate embeddings
-        embeddings = embed_texts(texts)
+        embeddings, tokens_embedded = embed_texts_with_usage(texts, namespace=namespace)
         
         # Prepare payload for Pinecone
         payload = []
@@ -139,13 +147,19 @@ def index_table_to_pinecone(
             vector_id = f"pg_{table_name}_{i}_{ts.replace(':', '-')}"
             metadata = {
                 **chunk['metadata'],
-                'text': chunk['text'],  # Store full text
+                'text': chunk['text'],  # Full text; kept in the chunk side store, not Pinecone
                 'text_preview': chunk['text'][:300],  # Preview for display
             }
             payload.append((vector_id, embedding, metadata))
         
         # Upsert to Pinecone
         vectors_upserted = upsert_chunks(payload, namespace=namespace)
+        # This run is now the table's live copy; vector_gc deletes earlier runs
+        get_manifest().replace(
+            namespace,
+            table_manifest_key(table_name),
+            [(vid, chunk_hash(md['text'])) for vid, _, md in payload],
+        )
         
         return {
             'status': 'success',
@@ -153,6 +167,7 @@ def index_table_to_pinecone(
             'rows_processed': len(rows),
             'chunks_created': len(chunks),
             'vectors_upserted': vectors_upserted,
+            'tokens_embedded': tokens_embedded,
             'namespace': namespace,
             'message': f'Successfully indexed {len(rows)} rows into {vectors_upserted} vectors'
         }
@@ -201,6 +216,7 @@ def index_all_tables_to_pinecone(
         total_rows = 0
         total_chunks = 0
         total_vectors = 0
+        total_tokens = 0
         
         for table in tables:
             print(f"Indexing table: {table}")
@@ -216,6 +232,7 @@ def index_all_tables_to_pinecone(
                 total_rows += result.get('rows_processed', 0)
                 total_chunks += result.get('chunks_created', 0)
                 total_vectors += result.get('vectors_upserted', 0)
+                total_tokens += result.get('tokens_embedded', 0)
         
         return {
             'status': 'success',
@@ -223,6 +240,7 @@ def index_all_tables_to_pinecone(
             'total_rows': total_rows,
             'total_chunks': total_chunks,
             'total_vectors': total_vectors,
+            'total_tokens_embedded': total_tokens,
             'namespace': namespace,
             'table_results': results
         }
@@ -255,7 +273,7 @@ def search_postgres_data_in_pinecone(
     from utils.pinecone_store import query as pinecone_query
     
     # Embed the query
-    query_vector = embed_texts([query_text])[0]
+    query_vector = embed_texts([query_text], input_type="query", namespace=namespace)[0]
     
     # Build filter
     filter_dict = {"source": {"$eq": "postgresql"}}
@@ -270,4 +288,4 @@ def search_postgres_data_in_pinecone(
         filter=filter_dict
     )
     
-    return result.get("matches", [])
+    return hydrate(result.get("matches", []), namespace)
@@ -4,6 +4,7 @@ import os
 from typing import List, Dict, Any
 from utils.postgres import execute_query, get_tables
 from openai import AzureOpenAI
+from utils.rate_limiter import call_with_retries
 
 def generate_sql_from_query(user_query: str, available_tables: List[str]) -> str:
     """
@@ -12,7 +13,8 @@ def generate_sql_from_query(user_query: str, available_tables: List[str]) -> str
     client = AzureOpenAI(
         api_key=os.getenv("API_KEY"),
         api_version=os.getenv("API_VERSION"),
-        azure_endpoint=os.getenv("API_BASE")
+        azure_endpoint=os.getenv("API_BASE"),
+        max_retries=0
     )
     
     tables_info = ", ".join(available_tables)
@@ -32,7 +34,9 @@ Rules:
 SQL Query:"""
 
     try:
-        response = client.chat.completions.create(
+        response = call_with_retries(
+            "azure-openai-chat",
+            client.chat.completions.create,
             model=os.getenv("ENGINE", "gpt-4-32k"),
             messages=[
                 {"role": "system", "content": "You are a PostgreSQL expert that generates safe SELECT queries."},
@@ -0,0 +1,155 @@
+# utils/query_cache.py
+"""
+In-process cache of query results, invalidated per namespace by generation.
+
+Dashboards and the Streamlit UI repeat the same /pinecone/query requests, and
+each one pays for an embedding, a Pinecone query and an LLM answer. Results
+are cached under (normalised query text, (namespace, canonical filter)
+targets, top_k). Every logical namespace has a generation counter that
+pinecone_store bumps on upsert_chunks / delete_vectors / delete_namespace
+(and on a migration cutover); an entry remembers the generations it was
+computed at and is stale as soon as any of them moves. Writes made by other
+processes (the snapshot and delete scripts, other replicas) are not seen, so
+entries also expire after QUERY_CACHE_TTL seconds.
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils import pinecone_store
+from utils.settings import env_int, env_float, env_flag
+
+
+QUERY_CACHE_ENABLED = env_flag("QUERY_CACHE_ENABLED")
+QUERY_CACHE_TTL = env_float("QUERY_CACHE_TTL", 300.0)
+QUERY_CACHE_MAX_ENTRIES = env_int("QUERY_CACHE_MAX_ENTRIES", 1000, minimum=1)
+
+_SPACE = re.compile(r"\s+")
+
+
+def _canonical(value: Any) -> Any:
+    """Filter with dict keys and list items ($in, $and, ...) in a fixed order."""
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        items = [_canonical(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    return value
+
+
+def normalise_text(text: str) -> str:
+    return _SPACE.sub(" ", text).strip()
+
+
+class QueryCache:
+    """LRU of results, each valid while its namespaces' generations are unchanged and within the TTL."""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[int, ...], Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ---- Generations ----
+
+    def bump(self, namespace: str, delta: int | None = None) -> None:
+        """Mark `namespace`'s data as changed (signature of a pinecone_store write listener)."""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def generations(self, namespaces: Sequence[str]) -> Tuple[int, ...]:
+        """Current generations of `namespaces`; take them before computing a result."""
+        with self._lock:
+            return tuple(self._generations.get(ns, 0) for ns in namespaces)
+
+    # ---- Entries ----
+
+    @staticmethod
+    def key(text: str, targets: Sequence[Tuple[str, Dict[str, Any] | None]], top_k: int, **extra: Any) -> str:
+        payload = {
+            "text": normalise_text(text),
+            "targets": [[ns, _canonical(f or {})] for ns, f in targets],
+            "top_k": top_k,
+            **extra,
+        }
+        blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, namespaces: Sequence[str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, generations, value = entry
+            current = tuple(self._generations.get(ns, 0) for ns in namespaces)
+            if current != generations or expires_at <= time.monotonic():
+                del self._entries[key]
+                if current != generations:
+                    self.stale += 1
+                else:
+                    self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, generations: Tuple[int, ...], value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generations, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "generations": dict(self._generations),
+        }
+
+
+_cache: QueryCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache | None:
+    """Process-wide cache, or None when QUERY_CACHE_ENABLED is off."""
+    global _cache
+    if not QUERY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache()
+                pinecone_store.register_write_listener(_cache.bump)
+    return _cache
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    cache = get_query_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
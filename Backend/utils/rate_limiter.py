@@ -0,0 +1,259 @@
+# utils/rate_limiter.py
+"""
+Adaptive concurrency limits and retries for outbound API calls.
+
+Each upstream (Pinecone Inference, OpenAI embeddings, Azure OpenAI chat,
+Pinecone upserts) gets an AIMD limiter: the number of calls allowed in flight
+grows by about one per round of healthy responses and is halved on a 429, a
+5xx or a timeout. A Retry-After header pauses every caller of that upstream.
+Retryable failures are retried with full-jitter exponential backoff, so bulk
+jobs settle at the highest rate the upstream sustains without manual tuning.
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from utils.settings import env_int, env_float
+
+
+T = TypeVar("T")
+
+
+# Ceiling on in-flight calls per upstream; limits start at the caller's initial value
+RATE_LIMIT_MAX_CONCURRENCY = env_int("RATE_LIMIT_MAX_CONCURRENCY", 16, minimum=1)
+RATE_LIMIT_MAX_RETRIES = env_int("RATE_LIMIT_MAX_RETRIES", 5, minimum=0)
+RATE_LIMIT_BASE_DELAY = env_float("RATE_LIMIT_BASE_DELAY", 0.5)
+RATE_LIMIT_MAX_DELAY = env_float("RATE_LIMIT_MAX_DELAY", 30.0)
+# Recent latency above this multiple of the long-run average counts as congestion
+RATE_LIMIT_LATENCY_TOLERANCE = env_float("RATE_LIMIT_LATENCY_TOLERANCE", 2.0)
+
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+def _status_and_headers(error: BaseException) -> Tuple[Optional[int], Dict[str, str]]:
+    """HTTP status and response headers from requests, openai and pinecone exceptions."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    headers = getattr(error, "headers", None)
+    if headers is None and response is not None:
+        headers = getattr(response, "headers", None)
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    return status, {str(k).lower(): str(v) for k, v in dict(headers or {}).items()}
+
+
+def _retry_after(headers: Dict[str, str]) -> Optional[float]:
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Timeouts and dropped connections, whichever client raised them."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    return any(word in name for word in ("Timeout", "ConnectionError", "APIConnectionError", "ProtocolError", "MaxRetryError"))
+
+
+def classify(error: BaseException) -> Tuple[bool, bool, Optional[float]]:
+    """
+    Returns (retryable, throttled, retry_after). Throttled errors (429/5xx/timeouts)
+    shrink the concurrency limit; other 4xx and non-HTTP errors are not retried.
+    """
+    status, headers = _status_and_headers(error)
+    if status is not None:
+        retryable = status in RETRYABLE_STATUS or status >= 500
+        return retryable, retryable, _retry_after(headers)
+    if _is_transient(error):
+        return True, True, None
+    return False, False, None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one upstream, with Retry-After pauses."""
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = RATE_LIMIT_MAX_CONCURRENCY,
+        latency_tolerance: float = RATE_LIMIT_LATENCY_TOLERANCE,
+    ):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_short: Optional[float] = None
+        self._latency_long: Optional[float] = None
+        self._cond = threading.Condition()
+
+        self.successes = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.latency_sum = 0.0
+        self.peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        with self._cond:
+            self.successes += 1
+            self.latency_sum += latency
+            # Fast and slow moving averages: a short-term spike over the long-run
+            # level means queues are building upstream, whatever the batch sizes are
+            if self._latency_long is None:
+                self._latency_short = self._latency_long = latency
+            else:
+                self._latency_short += 0.3 * (latency - self._latency_short)
+                self._latency_long += 0.02 * (latency - self._latency_long)
+
+            if self._latency_short > self._latency_long * self.latency_tolerance:
+                self._decrease(0.9)
+            else:
+                # Additive increase: about +1 per limit's worth of successes
+                self._limit = min(float(self.maximum), self._limit + 1.0 / self._limit)
+                self.peak_limit = max(self.peak_limit, int(self._limit))
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        with self._cond:
+            self.throttled += 1
+            self._decrease(0.5)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_retry(self) -> None:
+        with self._cond:
+            self.retries += 1
+
+    def on_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+
+    def _decrease(self, factor: float) -> None:
+        # Calls in flight together fail together; shrink once per round trip, not once per call
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency_long or 0.0):
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.minimum), self._limit * factor)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "peak_limit": self.peak_limit,
+                "in_flight": self._in_flight,
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "successes": self.successes,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "failures": self.failures,
+                "avg_latency_ms": round(1000 * self.latency_sum / self.successes, 1) if self.successes else 0.0,
+            }
+
+
+def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(RATE_LIMIT_MAX_DELAY, RATE_LIMIT_BASE_DELAY * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+
+def call_with_retries(
+    upstream: str,
+    fn: Callable[..., T],
+    *args: Any,
+    max_retries: int = RATE_LIMIT_MAX_RETRIES,
+    **kwargs: Any,
+) -> T:
+    """Run fn under `upstream`'s limiter, retrying 429/5xx/timeouts with jittered backoff."""
+    limiter = get_limiter(upstream)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            retryable, throttled, retry_after = classify(e)
+            if throttled:
+                limiter.on_throttle(retry_after)
+            if not retryable or attempt >= max_retries:
+                limiter.on_failure()
+                raise
+            error = e
+        else:
+            limiter.on_success(time.monotonic() - start)
+            return result
+        finally:
+            limiter.release()
+
+        limiter.on_retry()
+        delay = _backoff(attempt, retry_after)
+        print(f"⚠️ {upstream}: {type(error).__name__}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+        time.sleep(delay)
+        attempt += 1
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_lock = threading.Lock()
+
+
+def get_limiter(upstream: str, initial: int = 4) -> AdaptiveLimiter:
+    """Process-wide limiter for `upstream`; `initial` only applies on first use."""
+    limiter = _limiters.get(upstream)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(upstream)
+            if limiter is None:
+                limiter = AdaptiveLimiter(upstream, initial=initial)
+                _limiters[upstream] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: limiter.stats() for name, limiter in list(_limiters.items())}
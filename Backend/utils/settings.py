@@ -0,0 +1,47 @@
+# utils/settings.py
+"""
+Helpers shared by the utils modules: environment parsing, the Pinecone fetch
+batch size and SQLite side-store connections.
+
+Malformed numeric settings fall back to their default rather than failing at
+import time, and flags are on unless set to 0/false/no.
+"""
+import os
+import sqlite3
+
+
+# Ids per Pinecone fetch request (kept well under URL length limits)
+FETCH_BATCH_SIZE = 100
+# Ids bound per SQLite statement; stay well below SQLite's host-parameter limit
+SQLITE_MAX_PARAMS = 500
+
+
+def env_int(name: str, default: int, minimum: int | None = None) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+    except ValueError:
+        value = default
+    return value if minimum is None else max(minimum, value)
+
+
+def env_float(name: str, default: float, minimum: float | None = None) -> float:
+    try:
+        value = float(os.getenv(name, str(default)))
+    except ValueError:
+        value = default
+    return value if minimum is None else max(minimum, value)
+
+
+def env_flag(name: str, default: bool = True) -> bool:
+    return os.getenv(name, "true" if default else "false").lower() not in ("0", "false", "no")
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open (creating its directory) a WAL-mode database shared across threads; callers serialise access."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,150 @@
+# utils/token_budget.py
+"""
+Token accounting for embedding requests.
+
+Counts tokens per input, truncates or splits inputs that exceed the model's
+per-input limit locally, and packs inputs into requests that stay within the
+model's item and token limits. Token counts use tiktoken's cl100k_base as a
+proxy tokenizer when it is available and ~4 characters per token otherwise,
+so limits carry some headroom and the server-side truncate stays as a backstop.
+"""
+import os
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class EmbedLimits(NamedTuple):
+    max_input_tokens: Optional[int]  # None = no per-input limit
+    max_batch_items: int
+    max_batch_tokens: Optional[int]  # None = no per-request token limit
+
+
+# Per-input limits are the providers' documented sequence lengths minus headroom
+# for proxy-tokenizer drift; request budgets keep payloads comfortably sized.
+EMBED_MODEL_LIMITS = {
+    "llama-text-embed-v2": EmbedLimits(1900, 96, 80_000),
+    "multilingual-e5-large": EmbedLimits(480, 96, 40_000),
+    "text-embedding-3-large": EmbedLimits(8000, 2048, 250_000),
+    "text-embedding-3-small": EmbedLimits(8000, 2048, 250_000),
+    "local-hash": EmbedLimits(None, 1024, None),
+}
+DEFAULT_LIMITS = EmbedLimits(None, 96, None)
+
+_CHARS_PER_TOKEN = 4
+
+_encoder = None
+_encoder_loaded = False
+_lock = threading.Lock()
+
+
+def _get_encoder():
+    """tiktoken encoder, or None when tiktoken (or its BPE file) is unavailable."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoder = None
+                _encoder_loaded = True
+    return _encoder
+
+
+def get_limits(model: str) -> EmbedLimits:
+    """Limits for `model`; EMBED_MAX_BATCH_TOKENS overrides the request token budget."""
+    limits = EMBED_MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+    override = os.getenv("EMBED_MAX_BATCH_TOKENS")
+    if override:
+        try:
+            limits = limits._replace(max_batch_tokens=int(override))
+        except ValueError:
+            pass
+    return limits
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder is None:
+        return max(1, -(-len(text) // _CHARS_PER_TOKEN)) if text else 0
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate(text: str, max_tokens: Optional[int]) -> Tuple[str, int]:
+    """Cut `text` to at most max_tokens; returns (text, token_count)."""
+    encoder = _get_encoder()
+    if encoder is None:
+        n = count_tokens(text)
+        if max_tokens is None or n <= max_tokens:
+            return text, n
+        return text[:max_tokens * _CHARS_PER_TOKEN], max_tokens
+
+    tokens = encoder.encode(text, disallowed_special=())
+    if max_tokens is None or len(tokens) <= max_tokens:
+        return text, len(tokens)
+    # Cut at the character offset of the first dropped token so the result is a true prefix
+    _, offsets = encoder.decode_with_offsets(tokens[:max_tokens + 1])
+    return text[:offsets[max_tokens]], max_tokens
+
+
+def split(text: str, max_tokens: Optional[int]) -> List[str]:
+    """Split `text` into consecutive pieces of at most max_tokens, breaking on whitespace where possible."""
+    if max_tokens is None or count_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces: List[str] = []
+    rest = text
+    while rest:
+        head, n = truncate(rest, max_tokens)
+        if len(head) < len(rest):
+            # Back off to the last whitespace so words are not cut in half
+            cut = head.rfind(" ")
+            if cut > len(head) // 2:
+                head = head[:cut]
+        pieces.append(head.strip())
+        rest = rest[len(head):].lstrip()
+    return [p for p in pieces if p]
+
+
+def pack_batches(token_counts: List[int], max_items: int, max_tokens: Optional[int]) -> List[List[int]]:
+    """
+    Greedily group consecutive input indices into batches of at most max_items
+    inputs and max_tokens tokens. Order is preserved across and within batches.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, n in enumerate(token_counts):
+        over_items = len(current) >= max_items
+        over_tokens = max_tokens is not None and bool(current) and current_tokens + n > max_tokens
+        if over_items or over_tokens:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def plan_requests(
+    texts: List[str], model: str, max_items: int
+) -> Tuple[List[List[str]], int]:
+    """
+    Truncate texts to the model's per-input limit and pack them into requests.
+    Returns (batches, total_tokens); concatenating the batches gives the inputs
+    back in their original order.
+    """
+    limits = get_limits(model)
+    items = min(max_items, limits.max_batch_items)
+
+    prepared: List[str] = []
+    counts: List[int] = []
+    for text in texts:
+        t, n = truncate(text, limits.max_input_tokens)
+        prepared.append(t)
+        counts.append(n)
+
+    batches = [[prepared[i] for i in group] for group in pack_batches(counts, items, limits.max_batch_tokens)]
+    return batches, sum(counts)
@@ -0,0 +1,142 @@
+# utils/vector_gc.py
+"""
+Find and delete orphaned vectors: chunks whose source no longer exists.
+
+Vector ids say where a chunk came from:
+
+  * documents: "{file_id}-..." with a 24-hex GridFS ObjectId (positional
+    "{file_id}-{i}" or content-hash ids). Deleting a file from GridFS leaves
+    these behind -> reason "deleted_file".
+  * PostgreSQL: "pg_{table}_{i}_{run timestamp}". Every index run mints new
+    ids, so re-indexing a table adds a full copy. index_table_to_pinecone
+    records its run in the chunk manifest once the upsert succeeds; vectors
+    of older runs are "stale_run" (tables indexed before that keep their newest
+    run). Runs newer than the recorded one are kept, since they may still be
+    in progress. Tables no longer in the database are "dropped_table".
+
+Other ids are counted as unclassified and never touched. A live source that
+cannot be reached (MongoDB, Postgres) disables the checks that depend on it.
+collect_garbage is a dry run unless delete=True; deletion goes through
+pinecone_store.delete_vectors, so chunk text, lexical and coarse entries and
+the query caches follow.
+"""
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from utils import pinecone_store
+from utils.chunk_manifest import get_manifest
+from utils.MangoDB import list_file_ids
+from utils.postgres import get_tables
+from utils.postgres_indexer import table_manifest_key
+
+
+DOCUMENT_ID = re.compile(r"^(?P<file_id>[0-9a-f]{24})-")
+POSTGRES_ID = re.compile(r"^pg_(?P<table>.+)_(?P<chunk>\d+)_(?P<run>\d{4}-\d{2}-\d{2}T[0-9.+\-]+)$")
+
+REASONS = ("deleted_file", "stale_run", "dropped_table")
+# Orphan ids shown per reason in a report
+SAMPLE_IDS = 5
+
+
+class LiveSources(NamedTuple):
+    file_ids: Optional[Set[str]]  # None = GridFS unavailable, skip document checks
+    tables: Optional[Set[str]]  # None = Postgres unavailable, skip dropped-table checks
+
+
+def load_live_sources() -> LiveSources:
+    try:
+        file_ids: Optional[Set[str]] = set(list_file_ids())
+    except Exception as e:
+        print(f"⚠️ Could not list GridFS files; skipping deleted-file checks: {e}")
+        file_ids = None
+    try:
+        tables: Optional[Set[str]] = set(get_tables())
+    except Exception as e:
+        print(f"⚠️ Could not list PostgreSQL tables; skipping dropped-table checks: {e}")
+        tables = None
+    return LiveSources(file_ids, tables)
+
+
+def _run_of(vid: str) -> Optional[str]:
+    m = POSTGRES_ID.match(vid)
+    return m.group("run") if m else None
+
+
+def find_orphans(namespace: str, ids: Iterable[str], live: LiveSources) -> Dict[str, Any]:
+    """
+    Classify `ids` of a namespace. Returns {"scanned", "unclassified",
+    "orphans": {reason: [ids]}, "files": deleted file ids, "tables": dropped tables}.
+    """
+    manifest = get_manifest()
+    orphans: Dict[str, List[str]] = {reason: [] for reason in REASONS}
+    runs: Dict[str, Dict[str, List[str]]] = {}  # table -> run -> ids
+    deleted_files: Set[str] = set()
+    scanned = unclassified = 0
+
+    for vid in ids:
+        scanned += 1
+        m = DOCUMENT_ID.match(vid)
+        if m:
+            if live.file_ids is not None and m.group("file_id") not in live.file_ids:
+                orphans["deleted_file"].append(vid)
+                deleted_files.add(m.group("file_id"))
+            continue
+        m = POSTGRES_ID.match(vid)
+        if m:
+            runs.setdefault(m.group("table"), {}).setdefault(m.group("run"), []).append(vid)
+            continue
+        unclassified += 1
+
+    dropped_tables: Set[str] = set()
+    for table, by_run in runs.items():
+        if live.tables is not None and table not in live.tables:
+            dropped_tables.add(table)
+            for run_ids in by_run.values():
+                orphans["dropped_table"].extend(run_ids)
+            continue
+        recorded = {_run_of(vid) for vid in manifest.entries(namespace, table_manifest_key(table))}
+        current = max(recorded - {None}) if recorded - {None} else max(by_run)
+        for run, run_ids in by_run.items():
+            if run < current:
+                orphans["stale_run"].extend(run_ids)
+
+    return {
+        "scanned": scanned,
+        "unclassified": unclassified,
+        "orphans": orphans,
+        "files": sorted(deleted_files),
+        "tables": sorted(dropped_tables),
+    }
+
+
+def collect_garbage(
+    namespaces: Iterable[str],
+    delete: bool = False,
+    live: LiveSources | None = None,
+) -> List[Dict[str, Any]]:
+    """Report (and with delete=True, remove) orphaned vectors per namespace."""
+    live = live or load_live_sources()
+    manifest = get_manifest()
+    reports = []
+    for namespace in namespaces:
+        found = find_orphans(namespace, pinecone_store.list_ids(namespace), live)
+        orphan_ids = [vid for reason in REASONS for vid in found["orphans"][reason]]
+        deleted = 0
+        if delete and orphan_ids:
+            deleted = pinecone_store.delete_vectors(orphan_ids, namespace)
+            for file_id in found["files"]:
+                manifest.delete(namespace, file_id)
+            for table in found["tables"]:
+                manifest.delete(namespace, table_manifest_key(table))
+        reports.append({
+            "namespace": namespace,
+            "scanned": found["scanned"],
+            "unclassified": found["unclassified"],
+            "reclaimable": len(orphan_ids),
+            "by_reason": {reason: len(found["orphans"][reason]) for reason in REASONS},
+            "sample": {reason: found["orphans"][reason][:SAMPLE_IDS] for reason in REASONS if found["orphans"][reason]},
+            "deleted_files": found["files"],
+            "dropped_tables": found["tables"],
+            "deleted": deleted,
+        })
+    return reports
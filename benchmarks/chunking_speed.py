@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Speed of utils.chunking.naive_chunks against the previous implementation.
+
+The previous version (kept below as _previous_naive_chunks) sliced a 100-char
+window and materialised every boundary match in it on each iteration. The
+current one finds the same boundaries with anchored pos/endpos searches and
+only slices the chunks themselves. Both run on the same multi-megabyte
+synthetic document; the outputs are checked for equality before timing.
+
+    python benchmarks/chunking_speed.py [--megabytes 8] [--chunk-chars 1200] [--overlap 150]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+
+WORDS = [
+    "flight", "booking", "payment", "refund", "health", "check", "endpoint", "login",
+    "session", "token", "timeout", "retry", "seat", "passenger", "baggage", "invoice",
+    "status", "schedule", "gateway", "latency", "error", "cache", "database", "ticket",
+]
+
+
+def _previous_naive_chunks(text: str, chunk_chars: int = 1200, overlap: int = 150) -> List[str]:
+    if not text:
+        return []
+    chunks = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + chunk_chars, n)
+        if end < n:
+            search_start = max(start, end - 100)
+            chunk_text = text[search_start:end]
+            matches = list(re.finditer(r'[\s\n.!?,;:)\]}\-]+', chunk_text))
+            if matches:
+                end = search_start + matches[-1].end()
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end < n:
+            overlap_start = max(end - overlap, start + 1)
+            remaining_text = text[overlap_start:min(overlap_start + 100, n)]
+            match = re.search(r'[\s\n]+', remaining_text)
+            start = overlap_start + match.end() if match else end
+        else:
+            start = end
+    return chunks
+
+
+def _document(megabytes: float, rng: random.Random) -> str:
+    paragraphs, size = [], 0
+    while size < megabytes * 1_000_000:
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + rng.choice(".!?")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--chunk-chars", type=int, default=1200)
+    parser.add_argument("--overlap", type=int, default=150)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from utils.chunking import chunk_spans, naive_chunks
+
+    text = _document(args.megabytes, random.Random(0))
+    expected = _previous_naive_chunks(text, args.chunk_chars, args.overlap)
+    if naive_chunks(text, args.chunk_chars, args.overlap) != expected:
+        sys.exit("❌ naive_chunks output differs from the previous implementation")
+    print(f"{len(text) / 1e6:.1f} MB document, {len(expected)} chunks (outputs identical)\n")
+
+    runs = [
+        ("previous naive_chunks", lambda: _previous_naive_chunks(text, args.chunk_chars, args.overlap)),
+        ("naive_chunks", lambda: naive_chunks(text, args.chunk_chars, args.overlap)),
+        ("chunk_spans (offsets)", lambda: sum(1 for _ in chunk_spans(text, args.chunk_chars, args.overlap))),
+    ]
+    baseline = None
+    print(f"{'implementation':<24} {'seconds':>8} {'MB/s':>8} {'speed-up':>9}")
+    for label, fn in runs:
+        seconds = _best_of(fn, args.repeats)
+        baseline = baseline or seconds
+        print(f"{label:<24} {seconds:>8.3f} {len(text) / 1e6 / seconds:>8.1f} {baseline / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Peak-RSS benchmark for the embed -> payload -> upsert ingest path.
+
+Compares the legacy representation (embeddings as Python lists of floats,
+one list-of-dicts upsert payload) with float32 ndarrays that are only turned
+into lists per upsert request. Each mode runs in a fresh subprocess with the
+offline local-hash embedder and a no-op Pinecone index, so only our own
+memory use is measured.
+
+    python benchmarks/ingest_memory.py [--chunks 10000] [--dim 1024]
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+
+WORDS = [
+    "flight", "booking", "payment", "refund", "health", "check", "endpoint", "login",
+    "session", "token", "timeout", "retry", "seat", "passenger", "baggage", "invoice",
+    "status", "schedule", "gateway", "latency", "error", "cache", "database", "ticket",
+]
+
+
+class _NullIndex:
+    def upsert(self, vectors, namespace=None):
+        return {"upserted_count": len(vectors)}
+
+
+class _NullPinecone:
+    def Index(self, name, **kwargs):
+        return _NullIndex()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _make_chunks(n: int, chunk_chars: int = 1200):
+    rng = random.Random(42)
+    chunks = []
+    for _ in range(n):
+        words = []
+        size = 0
+        while size < chunk_chars:
+            w = rng.choice(WORDS)
+            words.append(w)
+            size += len(w) + 1
+        chunks.append(" ".join(words)[:chunk_chars])
+    return chunks
+
+
+def _metadata(i: int, chunk: str) -> dict:
+    return {"file_id": "bench", "chunk_id": i, "text_preview": chunk[:300], "source": "mongodb"}
+
+
+def run_mode(mode: str, n_chunks: int, dim: int) -> None:
+    os.environ["PINECONE_EMBED_MODEL"] = "local-hash"
+    os.environ["PINECONE_EMBED_DIM"] = str(dim)
+    os.environ.setdefault("PINECONE_INDEX", "bench")
+
+    from utils import pinecone_store
+    from utils.embedding import embed_texts
+
+    pinecone_store._pc = _NullPinecone()
+    chunks = _make_chunks(n_chunks)
+    baseline = _peak_rss_mb()
+
+    if mode == "lists":
+        # Legacy shape: one list of floats per chunk, as decoded from the JSON response
+        embeddings = []
+        for start in range(0, len(chunks), 96):
+            embeddings.extend(embed_texts(chunks[start:start + 96]).tolist())
+        payload = [(f"bench-{i}", vec, _metadata(i, c)) for i, (c, vec) in enumerate(zip(chunks, embeddings))]
+        wire = [{"id": vid, "values": vals, "metadata": md} for vid, vals, md in payload]
+        _NullIndex().upsert(vectors=wire)
+    else:
+        embeddings = embed_texts(chunks)
+        payload = [(f"bench-{i}", vec, _metadata(i, c)) for i, (c, vec) in enumerate(zip(chunks, embeddings))]
+        pinecone_store.upsert_chunks(payload, namespace="bench")
+
+    peak = _peak_rss_mb()
+    print(f"{mode}\t{baseline:.1f}\t{peak:.1f}\t{peak - baseline:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--mode", choices=["lists", "float32"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.chunks, args.dim)
+        return
+
+    print(f"Ingest of {args.chunks} chunks at dim {args.dim}")
+    print(f"{'mode':<10}{'baseline MB':>14}{'peak MB':>12}{'ingest MB':>12}")
+    for mode in ("lists", "float32"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--chunks", str(args.chunks), "--dim", str(args.dim)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+        name, baseline, peak, delta = out.split("\t")
+        print(f"{name:<10}{float(baseline):>14.1f}{float(peak):>12.1f}{float(delta):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
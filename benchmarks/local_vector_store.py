@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of the local vector store: exact scan vs IVF.
+
+Builds a namespace of clustered synthetic embeddings in a temporary
+directory, then runs the same queries with an exact scan (the ground truth)
+and with IVF at several nprobe values, with and without a Jira-style
+$and/$or metadata filter from build_pinecone_filter_from_issue.
+
+    python benchmarks/local_vector_store.py [--vectors 100000] [--dim 384] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+
+PROJECTS = ["AIR", "PAY", "OPS", "WEB"]
+LABELS = ["booking", "payment", "refund", "health", "login", "baggage", "invoice", "schedule"]
+
+
+def _dataset(n: int, dim: int, clusters: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def _metadata(n: int, rng: np.random.Generator) -> list:
+    return [
+        {
+            "source": "mongodb",
+            "jira_project": PROJECTS[rng.integers(len(PROJECTS))],
+            "jira_labels": [LABELS[j] for j in rng.choice(len(LABELS), 2, replace=False)],
+        }
+        for _ in range(n)
+    ]
+
+
+def _run(ns, queries: np.ndarray, top_k: int, mode: str, filter=None):
+    ids, times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        matches = ns.query(q, top_k, filter, mode=mode)
+        times.append(time.perf_counter() - start)
+        ids.append({m["id"] for m in matches})
+    return ids, np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.4, help="spread around cluster centres (higher = harder)")
+    parser.add_argument("--nprobe", default="8,32,64")
+    args = parser.parse_args()
+
+    from utils import local_vector_store
+    from utils.filter import build_pinecone_filter_from_issue
+
+    rng = np.random.default_rng(0)
+    vectors = _dataset(args.vectors, args.dim, args.clusters, args.noise, rng)
+    queries = _dataset(args.queries, args.dim, args.clusters, args.noise, rng)
+    jira_filter = build_pinecone_filter_from_issue("AIR", ["refund", "baggage"], None)
+
+    with tempfile.TemporaryDirectory() as root:
+        ns = local_vector_store.LocalNamespace(os.path.join(root, "bench"))
+        start = time.perf_counter()
+        ns.upsert([f"v{i}" for i in range(args.vectors)], vectors, _metadata(args.vectors, rng))
+        print(f"{args.vectors} x {args.dim} vectors written in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        ns.query(queries[0], args.top_k, mode="ivf")
+        print(f"IVF trained ({int(np.sqrt(args.vectors))} lists) in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'search':<14} {'filter':<7} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, filter in (("none", None), ("jira", jira_filter)):
+            truth, times = _run(ns, queries, args.top_k, "brute", filter)
+            print(f"{'exact':<14} {label:<7} {1.0:>10.3f} {np.percentile(times, 50):>8.2f} {np.percentile(times, 99):>8.2f}")
+            for nprobe in (int(p) for p in args.nprobe.split(",")):
+                local_vector_store.LOCAL_IVF_NPROBE = nprobe
+                found, times = _run(ns, queries, args.top_k, "ivf", filter)
+                recall = np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, truth)])
+                print(
+                    f"{'ivf nprobe=' + str(nprobe):<14} {label:<7} {recall:>10.3f} "
+                    f"{np.percentile(times, 50):>8.2f} {np.percentile(times, 99):>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Per-request Pinecone client overhead: legacy path vs cached handles.
+
+Legacy: every embed-upsert ran ensure_index (list_indexes + describe_index)
+and built a fresh Index handle (new connection pool) for the upsert and for
+each query. Now handles are process-wide and ensure_index trusts a cached
+description for PINECONE_INDEX_DESCRIPTION_TTL seconds.
+
+Handles are real SDK objects built offline from a host URL; the control-plane
+calls are stubs that sleep --rtt-ms, so the numbers are the client-side
+construction cost plus the simulated round trips. TLS handshakes on each new
+connection pool are not included, so the real saving is larger.
+
+    python benchmarks/pinecone_handle_overhead.py [--requests 200] [--rtt-ms 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("PINECONE_INDEX", "bench")
+
+from pinecone import Pinecone  # noqa: E402
+
+FAKE_HOST = "https://bench-abc123.svc.aped-1234.pinecone.io"
+DIMENSION = 1024
+
+
+class _Desc:
+    def __init__(self, name: str):
+        self.name = name
+        self.dimension = DIMENSION
+
+
+class _CountingPinecone:
+    """Real SDK client whose control-plane calls are counted and given a simulated RTT."""
+
+    def __init__(self, rtt_s: float):
+        self._pc = Pinecone(api_key="bench")
+        self.rtt_s = rtt_s
+        self.control_calls = 0
+        self.handles = 0
+
+    def _round_trip(self):
+        self.control_calls += 1
+        time.sleep(self.rtt_s)
+
+    def list_indexes(self):
+        self._round_trip()
+        return [_Desc(os.environ["PINECONE_INDEX"])]
+
+    def describe_index(self, name):
+        self._round_trip()
+        return _Desc(name)
+
+    def Index(self, name, **kwargs):
+        self.handles += 1
+        return self._pc.Index(host=FAKE_HOST, **kwargs)
+
+
+def legacy_request(pc: _CountingPinecone, name: str) -> None:
+    # ensure_index + upsert_chunks + query as they were before handle caching
+    names = [i.name for i in pc.list_indexes()]
+    if name in names:
+        pc.describe_index(name)
+    pc.Index(name)
+    pc.Index(name)
+
+
+def cached_request(pinecone_store, name: str) -> None:
+    pinecone_store.ensure_index(dimension=DIMENSION)
+    pinecone_store.get_index(name)
+    pinecone_store.get_index(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=30.0, help="simulated control-plane round trip")
+    args = parser.parse_args()
+
+    from utils import pinecone_store
+
+    name = os.environ["PINECONE_INDEX"]
+    rows = []
+    for label in ("legacy", "cached"):
+        pc = _CountingPinecone(args.rtt_ms / 1000.0)
+        pinecone_store._pc = pc
+        pinecone_store._indexes.clear()
+        pinecone_store._descriptions.clear()
+
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            if label == "legacy":
+                legacy_request(pc, name)
+            else:
+                cached_request(pinecone_store, name)
+        elapsed = time.perf_counter() - start
+        rows.append((label, 1000 * elapsed / args.requests, pc.control_calls, pc.handles))
+
+    print(f"{args.requests} embed-upsert requests, simulated control-plane RTT {args.rtt_ms:.0f} ms\n")
+    print(f"{'path':<8} {'ms/request':>11} {'control calls':>14} {'handles built':>14}")
+    for label, ms, calls, handles in rows:
+        print(f"{label:<8} {ms:>11.2f} {calls:>14} {handles:>14}")
+    saved = rows[0][1] - rows[1][1]
+    print(f"\nOverhead removed: {saved:.2f} ms per request")
+
+
+if __name__ == "__main__":
+    main()
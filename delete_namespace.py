@@ -9,7 +9,9 @@ from dotenv import load_dotenv, find_dotenv
 # Load environment variables
 load_dotenv(find_dotenv())
 
-from Backend.utils.pinecone_store import delete_namespace
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+
+from utils.pinecone_store import delete_namespace
 
 def main():
     namespace = "mongodb-files"
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Script to find (and optionally delete) orphaned vectors: chunks of files deleted
+from GridFS, earlier index runs of PostgreSQL tables, and dropped tables.
+
+    python gc_vectors.py                    # dry run over every namespace
+    python gc_vectors.py mongodb-files      # dry run over one namespace
+    python gc_vectors.py --delete           # delete what the dry run reports
+"""
+import os
+import sys
+import json
+import argparse
+from dotenv import load_dotenv, find_dotenv
+
+# Load environment variables
+load_dotenv(find_dotenv())
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+
+from utils.namespace_stats import collect as collect_namespace_stats
+from utils.vector_gc import collect_garbage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("namespaces", nargs="*", help="namespaces to scan (default: all)")
+    parser.add_argument("--delete", action="store_true", help="delete orphans instead of only reporting them")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    try:
+        namespaces = args.namespaces or sorted(collect_namespace_stats())
+        print(f"{'🗑️ ' if args.delete else '🔎'} Scanning {len(namespaces)} namespaces"
+              f"{'' if args.delete else ' (dry run)'}")
+        reports = collect_garbage(namespaces, delete=args.delete)
+    except Exception as e:
+        print(f"❌ Garbage collection failed: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    for r in reports:
+        reasons = ", ".join(f"{reason}={n}" for reason, n in r["by_reason"].items() if n) or "none"
+        print(f"   {r['namespace']}: {r['scanned']} scanned, {r['reclaimable']} reclaimable ({reasons}), "
+              f"{r['unclassified']} unclassified" + (f", {r['deleted']} deleted" if args.delete else ""))
+    total = sum(r["reclaimable"] for r in reports)
+    if args.delete:
+        print(f"✅ Deleted {sum(r['deleted'] for r in reports)} orphaned vectors")
+    else:
+        print(f"✅ {total} vectors reclaimable; re-run with --delete to remove them")
+
+if __name__ == "__main__":
+    main()
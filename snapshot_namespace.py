@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script to export a namespace to local Parquet/NPZ files, or restore one from them.
+
+    python snapshot_namespace.py export mongodb-files snapshots/mongodb-files [--format parquet|npz]
+    python snapshot_namespace.py restore snapshots/mongodb-files [--namespace mongodb-files]
+
+Restoring upserts the stored vectors as they are: no parsing, no embedding calls.
+"""
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv, find_dotenv
+
+# Load environment variables
+load_dotenv(find_dotenv())
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+
+from utils.namespace_snapshot import export_namespace, restore_namespace, default_format
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write a namespace to a snapshot directory")
+    export.add_argument("namespace")
+    export.add_argument("directory")
+    export.add_argument("--format", choices=["parquet", "npz"], default=default_format())
+
+    restore = commands.add_parser("restore", help="upsert a snapshot directory into a namespace")
+    restore.add_argument("directory")
+    restore.add_argument("--namespace", help="target namespace (default: the snapshot's own)")
+
+    args = parser.parse_args()
+    start = time.monotonic()
+    try:
+        if args.command == "export":
+            print(f"📦 Exporting namespace '{args.namespace}' to {args.directory} ({args.format})")
+            manifest = export_namespace(
+                args.namespace, args.directory, args.format,
+                on_progress=lambda n: print(f"   {n} vectors written"),
+            )
+            print(f"✅ Exported {manifest['count']} vectors in {len(manifest['parts'])} parts "
+                  f"({time.monotonic() - start:.1f}s)")
+        else:
+            print(f"♻️  Restoring snapshot {args.directory}")
+            restored = restore_namespace(
+                args.directory, args.namespace,
+                on_progress=lambda done, total: print(f"   {done}/{total} vectors upserted"),
+            )
+            print(f"✅ Restored {restored} vectors ({time.monotonic() - start:.1f}s)")
+    except Exception as e:
+        print(f"❌ Snapshot {args.command} failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()